@@ -0,0 +1,76 @@
+import asyncio
+
+from fastapi import APIRouter, Depends, WebSocket, WebSocketDisconnect
+from pydantic import BaseModel, ValidationError
+
+from app.collab.ot import OTError
+from app.collab.session import CollabHub, StaleRevision
+from app.wiring import get_collab_hub
+
+router = APIRouter()
+
+
+class CollabOpMessage(BaseModel):
+    path: str
+    rev: int
+    op: list[int | str]
+
+
+@router.websocket("/{doc_id}/collab")
+async def collab_ws(websocket: WebSocket, doc_id: str, hub: CollabHub = Depends(get_collab_hub)) -> None:
+    """
+    Operational-transform editing of a workspace's text files.
+
+    The server sends {"type": "init", "client_id", "files": {path: {"rev", "content"}}} first.
+    Clients send {"path", "rev", "op"}, where `op` is an ot.js-style operation against that
+    revision; the sender gets {"type": "ack", "path", "rev"} and everyone else
+    {"type": "op", "path", "rev", "op", "client_id"}. A rejected or too-old operation is
+    answered with {"type": "error", ...} and/or {"type": "resync", "path", "rev", "content"}.
+    """
+    try:
+        session, client = await hub.join(doc_id)
+    except LookupError:
+        await websocket.close(code=4404)
+        return
+    except ValueError as exc:
+        await websocket.close(code=4400, reason=str(exc))
+        return
+    try:
+        await websocket.accept()
+        client.send(session.init_message(client))
+
+        async def pump() -> None:
+            while True:
+                message = await client.queue.get()
+                if message is None:
+                    await websocket.close(code=1013, reason="Too far behind; reconnect")
+                    return
+                await websocket.send_text(message)
+
+        async def receive() -> None:
+            try:
+                while True:
+                    raw = await websocket.receive_text()
+                    try:
+                        msg = CollabOpMessage.model_validate_json(raw)
+                    except ValidationError as exc:
+                        client.send(session.error_message(str(exc)))
+                        continue
+                    try:
+                        session.submit(client, msg.path, msg.rev, msg.op)
+                    except StaleRevision:
+                        client.send(session.resync_message(msg.path))
+                    except OTError as exc:
+                        client.send(session.error_message(str(exc), path=msg.path))
+                        client.send(session.resync_message(msg.path))
+            except WebSocketDisconnect:
+                pass
+
+        tasks = [asyncio.create_task(pump()), asyncio.create_task(receive())]
+        try:
+            await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            for task in tasks:
+                task.cancel()
+    finally:
+        await hub.leave(session, client)
@@ -0,0 +1,34 @@
+from fastapi import HTTPException
+
+
+def etag_for(version: int) -> str:
+    return f'"{version}"'
+
+
+def etag_matches(if_none_match: str | None, etag: str) -> bool:
+    """Weak comparison as used by If-None-Match: any listed tag (or `*`) matching `etag`."""
+    if not if_none_match:
+        return False
+    for tag in if_none_match.split(","):
+        tag = tag.strip()
+        if tag == "*":
+            return True
+        if tag.startswith("W/"):
+            tag = tag[2:]
+        if tag == etag:
+            return True
+    return False
+
+
+def expected_version(if_match: str | None) -> int | None:
+    """
+    Version named by an If-Match header; None when absent or `*` (any current version).
+
+    Raises 412 for tags this API never issued, since they can never match.
+    """
+    if not if_match or if_match.strip() == "*":
+        return None
+    tag = if_match.strip()
+    if len(tag) >= 2 and tag[0] == '"' and tag[-1] == '"' and tag[1:-1].isdigit():
+        return int(tag[1:-1])
+    raise HTTPException(status_code=412, detail="Document version mismatch")
@@ -1,10 +1,15 @@
 from typing import Any
 
-from fastapi import APIRouter
+from fastapi import APIRouter, Depends, HTTPException
 from pydantic import BaseModel, Field, model_validator
 from pydantic.config import ConfigDict
 
 from app.context.extract import build_structured_context_with_limits, parse_latex_to_ast
+from app.context.project import build_project_context
+from app.modeling.models import ModelConfig
+from app.modeling.tokenizers import TokenizerRegistry
+from app.persistence.store import DocStore
+from app.wiring import get_doc_store, get_tokenizer_registry
 
 router = APIRouter()
 
@@ -16,11 +21,18 @@ class ContextBuildRequest(BaseModel):
     selectionEnd: int | None = None
     maxContextChars: int = 4000
     maxContextTokens: int = 1000
+    # Tokens are counted with this model's tokenizer when one is available.
+    modelConfig: ModelConfig | None = None
+    # A stored multi-file document and the file being edited, instead of `sourceLatex`; offsets
+    # are then into that file.
+    docId: str | None = None
+    activePath: str | None = None
     model_config = ConfigDict(
         json_schema_extra={
             "examples": [
                 {"sourceLatex": "\\\\section{Intro}\\nText", "cursorIndex": 10, "maxContextChars": 2000, "maxContextTokens": 500},
                 {"sourceLatex": "AAA BBB CCC", "selectionStart": 4, "selectionEnd": 11},
+                {"docId": "d1", "activePath": "chapters/method.tex", "cursorIndex": 120},
             ]
         }
     )
@@ -32,6 +44,11 @@ class ContextBuildRequest(BaseModel):
             raise ValueError("maxContextChars and maxContextTokens must be > 0")
         if (self.selectionStart is None) != (self.selectionEnd is None):
             raise ValueError("selectionStart and selectionEnd must be provided together")
+        if (self.docId is None) != (self.activePath is None):
+            raise ValueError("docId and activePath must be provided together")
+        if self.docId is not None:
+            # Offsets into a stored file are clamped to it when it is read.
+            return self
         if self.cursorIndex is not None and not (0 <= self.cursorIndex <= n):
             raise ValueError("cursorIndex out of bounds")
         if self.selectionStart is not None and self.selectionEnd is not None:
@@ -52,7 +69,36 @@ def _slice_window(source: str, center: int, window: int) -> str:
 
 
 @router.post("/build", response_model=ContextBuildResponse)
-def build(req: ContextBuildRequest) -> ContextBuildResponse:
+def build(
+    req: ContextBuildRequest,
+    tokenizers: TokenizerRegistry = Depends(get_tokenizer_registry),
+    store: DocStore = Depends(get_doc_store),
+) -> ContextBuildResponse:
+    tokenizer = tokenizers.get(req.modelConfig)
+    if req.docId is not None and req.activePath is not None:
+        center = req.cursorIndex
+        if req.selectionStart is not None and req.selectionEnd is not None:
+            center = (req.selectionStart + req.selectionEnd) // 2
+        try:
+            built = build_project_context(
+                store,
+                req.docId,
+                req.activePath,
+                center_index=center,
+                max_chars=req.maxContextChars,
+                max_tokens=req.maxContextTokens,
+                tokenizer=tokenizer,
+            )
+        except ValueError as exc:
+            raise HTTPException(status_code=400, detail=str(exc)) from exc
+        if built is None:
+            raise HTTPException(status_code=404, detail="Document not found")
+        ctx, structured = built
+        return ContextBuildResponse(
+            context=ctx,
+            metadata={"mode": "project", "tokenizer": tokenizer.name, **structured},
+        )
+
     ast = parse_latex_to_ast(req.sourceLatex)
 
     if req.selectionStart is not None and req.selectionEnd is not None:
@@ -67,12 +113,14 @@ def build(req: ContextBuildRequest) -> ContextBuildResponse:
             center_index=center,
             max_chars=req.maxContextChars,
             max_tokens=req.maxContextTokens,
+            tokenizer=tokenizer,
         )
         return ContextBuildResponse(
             context=ctx,
             metadata={
                 "mode": "selection",
                 "selection": selection,
+                "tokenizer": tokenizer.name,
                 **structured,
                 "ast": {
                     "sections": ast.sections,
@@ -89,12 +137,14 @@ def build(req: ContextBuildRequest) -> ContextBuildResponse:
         center_index=cursor,
         max_chars=req.maxContextChars,
         max_tokens=req.maxContextTokens,
+        tokenizer=tokenizer,
     )
     return ContextBuildResponse(
         context=ctx,
         metadata={
             "mode": "cursor",
             "cursorIndex": cursor,
+            "tokenizer": tokenizer.name,
             **structured,
             "ast": {
                 "sections": ast.sections,
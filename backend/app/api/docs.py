@@ -1,9 +1,22 @@
-from fastapi import APIRouter, Depends, HTTPException, Query
+from typing import Literal
+
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Response
 from pydantic import BaseModel, Field
 
-from app.persistence.models import DocCreateRequest, DocResponse, DocUpdateRequest
-from app.persistence.store import DocStore
-from app.wiring import get_doc_store
+from app.api.conditional import etag_for, etag_matches, expected_version
+from app.persistence.models import (
+    DocCreateRequest,
+    DocFilesPatchRequest,
+    DocFilesPatchResponse,
+    DocResponse,
+    DocSummary,
+    DocSummaryPage,
+    DocUpdateRequest,
+)
+from app.persistence.store import SEARCH_COUNT_CAP, DocStore, DocVersionConflict
+from app.events.bus import EventBus
+from app.retrieval.index import VectorIndex
+from app.wiring import get_doc_store, get_event_bus, get_vector_index
 from app.modeling.models import ModelConfig
 
 router = APIRouter()
@@ -14,31 +27,114 @@ def list_docs(store: DocStore = Depends(get_doc_store)) -> list[DocResponse]:
     return store.list()
 
 
+@router.get("/summaries", response_model=DocSummaryPage)
+def list_doc_summaries(
+    limit: int = Query(default=50, ge=1, le=500),
+    cursor: str | None = Query(default=None),
+    store: DocStore = Depends(get_doc_store),
+) -> DocSummaryPage:
+    try:
+        items, next_cursor = store.list_summaries(limit=limit, cursor=cursor)
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc)) from exc
+    return DocSummaryPage(items=[DocSummary(**item) for item in items], nextCursor=next_cursor)
+
+
 @router.get("/{doc_id}", response_model=DocResponse)
-def get_doc(doc_id: str, store: DocStore = Depends(get_doc_store)) -> DocResponse:
+def get_doc(
+    doc_id: str,
+    response: Response,
+    if_none_match: str | None = Header(default=None),
+    store: DocStore = Depends(get_doc_store),
+):
+    meta = store.get_meta(doc_id)
+    if meta is None:
+        raise HTTPException(status_code=404, detail="Document not found")
+    if etag_matches(if_none_match, etag_for(meta["version"])):
+        return Response(status_code=304, headers={"ETag": etag_for(meta["version"])})
     doc = store.get(doc_id)
     if doc is None:
         raise HTTPException(status_code=404, detail="Document not found")
+    response.headers["ETag"] = etag_for(doc.version)
     return doc
 
 
 @router.post("", response_model=DocResponse)
 def create_doc(
-    req: DocCreateRequest, store: DocStore = Depends(get_doc_store)
+    req: DocCreateRequest, response: Response, store: DocStore = Depends(get_doc_store)
 ) -> DocResponse:
-    return store.create(req)
+    doc = store.create(req)
+    response.headers["ETag"] = etag_for(doc.version)
+    return doc
 
 
 @router.put("/{doc_id}", response_model=DocResponse)
 def update_doc(
-    doc_id: str, req: DocUpdateRequest, store: DocStore = Depends(get_doc_store)
+    doc_id: str,
+    req: DocUpdateRequest,
+    response: Response,
+    if_match: str | None = Header(default=None),
+    x_edit_session: str | None = Header(default=None),
+    store: DocStore = Depends(get_doc_store),
+    bus: EventBus = Depends(get_event_bus),
 ) -> DocResponse:
-    updated = store.update(doc_id, title=req.title, content=req.content, settings=req.settings)
+    try:
+        updated = store.update(
+            doc_id,
+            title=req.title,
+            content=req.content,
+            settings=req.settings,
+            expected_version=expected_version(if_match),
+            session_id=x_edit_session,
+        )
+    except DocVersionConflict as exc:
+        raise HTTPException(status_code=412, detail="Document version mismatch") from exc
     if updated is None:
         raise HTTPException(status_code=404, detail="Document not found")
+    bus.publish(doc_id, "version", {"version": updated.version, "session": x_edit_session})
+    response.headers["ETag"] = etag_for(updated.version)
     return updated
 
 
+@router.patch("/{doc_id}/files", response_model=DocFilesPatchResponse)
+def patch_doc_files(
+    doc_id: str,
+    req: DocFilesPatchRequest,
+    response: Response,
+    if_match: str | None = Header(default=None),
+    x_edit_session: str | None = Header(default=None),
+    store: DocStore = Depends(get_doc_store),
+    bus: EventBus = Depends(get_event_bus),
+) -> DocFilesPatchResponse:
+    upsert = {path: entry.model_dump(exclude_none=True) for path, entry in req.upsert.items()}
+    try:
+        result = store.patch_files(
+            doc_id,
+            upsert=upsert,
+            delete=req.delete,
+            expected_version=expected_version(if_match),
+            session_id=x_edit_session,
+        )
+    except DocVersionConflict as exc:
+        raise HTTPException(status_code=412, detail="Document version mismatch") from exc
+    except ValueError as exc:
+        raise HTTPException(status_code=409, detail=str(exc)) from exc
+    if result is None:
+        raise HTTPException(status_code=404, detail="Document not found")
+    bus.publish(
+        doc_id,
+        "version",
+        {
+            "version": result["version"],
+            "session": x_edit_session,
+            "upserted": result["upserted"],
+            "deleted": result["deleted"],
+        },
+    )
+    response.headers["ETag"] = etag_for(result["version"])
+    return DocFilesPatchResponse(**result)
+
+
 class DocModelsEnvelopeRequest(BaseModel):
     models: list[ModelConfig]
 
@@ -84,22 +180,166 @@ class SearchHit(BaseModel):
 
 class SearchResponse(BaseModel):
     results: list[SearchHit]
+    total: int = 0
+    total_exact: bool = True
+    next_offset: int | None = None
+    index: str = "words"
 
 
 @router.get("/{doc_id}/search", response_model=SearchResponse)
 def search_doc(
     doc_id: str,
     q: str = Query(default=""),
+    limit: int = Query(default=20, ge=1, le=100),
+    offset: int = Query(default=0, ge=0, le=SEARCH_COUNT_CAP),
+    mode: Literal["auto", "words", "substring"] = Query(default="auto"),
+    # Search-as-you-type: the last word also matches longer words it begins.
+    prefix: bool = Query(default=False),
     store: DocStore = Depends(get_doc_store),
 ) -> SearchResponse:
-    doc = store.get(doc_id)
-    if doc is None:
+    if not store.exists(doc_id):
         raise HTTPException(status_code=404, detail="Document not found")
-    query = (q or "").strip().lower()
-    if not query:
+    # Trailing whitespace is kept: it tells a prefix search the last word is finished.
+    query = (q or "").lstrip().lower()
+    if not query.strip():
         return SearchResponse(results=[])
-    rows = store.search(doc_id, query)
-    return SearchResponse(results=[SearchHit(path=r["path"], snippet=r.get("snippet")) for r in rows])
+    try:
+        page = store.search_page(doc_id, query, limit, offset, mode=mode, prefix=prefix)
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc)) from exc
+    end = offset + len(page["results"])
+    return SearchResponse(
+        results=[SearchHit(path=r["path"], snippet=r["snippet"]) for r in page["results"]],
+        total=page["total"],
+        total_exact=page["total_exact"],
+        next_offset=end if end < page["total"] else None,
+        index=page["index"],
+    )
+
+
+class SemanticHit(BaseModel):
+    path: str
+    start: int
+    end: int
+    score: float
+    text: str
+
+
+class SemanticSearchResponse(BaseModel):
+    results: list[SemanticHit]
+    embedder: str
+
+
+@router.get("/{doc_id}/semantic", response_model=SemanticSearchResponse)
+def semantic_search_doc(
+    doc_id: str,
+    q: str = Query(default=""),
+    k: int = Query(default=8, ge=1, le=50),
+    store: DocStore = Depends(get_doc_store),
+    index: VectorIndex = Depends(get_vector_index),
+) -> SemanticSearchResponse:
+    """Passages of the document's files closest in meaning to `q`, best first (cosine score)."""
+    if not store.exists(doc_id):
+        raise HTTPException(status_code=404, detail="Document not found")
+    query = (q or "").strip()
+    if not query:
+        return SemanticSearchResponse(results=[], embedder=index.embedder.name)
+    try:
+        hits = index.search(doc_id, query, k)
+    except RuntimeError as exc:
+        raise HTTPException(status_code=501, detail=str(exc)) from exc
+    if hits is None:
+        raise HTTPException(status_code=404, detail="Document not found")
+    return SemanticSearchResponse(results=[SemanticHit(**hit) for hit in hits], embedder=index.embedder.name)
+
+
+SymbolKind = Literal["label", "cite", "macro", "section", "file"]
+
+
+class SymbolLocation(BaseModel):
+    path: str
+    kind: str
+    name: str
+    # "def" or "use".
+    role: str
+    start: int
+    end: int
+    line: int
+
+
+class SymbolLookupResponse(BaseModel):
+    # The symbol looked up: the one at the given position, or the given kind and name.
+    symbol: SymbolLocation | None = None
+    results: list[SymbolLocation]
+
+
+@router.get("/{doc_id}/symbols", response_model=list[SymbolLocation])
+def list_symbols(
+    doc_id: str,
+    kind: SymbolKind | None = Query(default=None),
+    name: str | None = Query(default=None),
+    role: Literal["def", "use"] | None = Query(default=None),
+    store: DocStore = Depends(get_doc_store),
+) -> list[SymbolLocation]:
+    rows = store.find_symbols(doc_id, kind, name, role)
+    if rows is None:
+        raise HTTPException(status_code=404, detail="Document not found")
+    return [SymbolLocation(**row) for row in rows]
+
+
+def _lookup_symbol(
+    store: DocStore, doc_id: str, role: str, path: str | None, offset: int | None, kind: str | None, name: str | None
+) -> SymbolLookupResponse:
+    if not store.exists(doc_id):
+        raise HTTPException(status_code=404, detail="Document not found")
+    if path is not None and offset is not None:
+        symbol = store.symbol_at(doc_id, path, offset)
+    elif kind is not None and name is not None:
+        symbol = {"kind": kind, "name": name}
+    else:
+        raise HTTPException(status_code=400, detail="Give path and offset, or kind and name")
+    if symbol is None:
+        return SymbolLookupResponse(results=[])
+    rows = store.find_symbols(doc_id, symbol["kind"], symbol["name"], role) or []
+    return SymbolLookupResponse(
+        symbol=SymbolLocation(**symbol) if "path" in symbol else None,
+        results=[SymbolLocation(**row) for row in rows],
+    )
+
+
+@router.get("/{doc_id}/symbols/definition", response_model=SymbolLookupResponse)
+def symbol_definition(
+    doc_id: str,
+    path: str | None = Query(default=None),
+    offset: int | None = Query(default=None, ge=0),
+    kind: SymbolKind | None = Query(default=None),
+    name: str | None = Query(default=None),
+    store: DocStore = Depends(get_doc_store),
+) -> SymbolLookupResponse:
+    """Where the symbol at `path`/`offset` (or `kind`/`name`) is defined."""
+    return _lookup_symbol(store, doc_id, "def", path, offset, kind, name)
+
+
+@router.get("/{doc_id}/symbols/references", response_model=SymbolLookupResponse)
+def symbol_references(
+    doc_id: str,
+    path: str | None = Query(default=None),
+    offset: int | None = Query(default=None, ge=0),
+    kind: SymbolKind | None = Query(default=None),
+    name: str | None = Query(default=None),
+    store: DocStore = Depends(get_doc_store),
+) -> SymbolLookupResponse:
+    """Every use of the symbol at `path`/`offset` (or `kind`/`name`)."""
+    return _lookup_symbol(store, doc_id, "use", path, offset, kind, name)
+
+
+@router.get("/{doc_id}/symbols/undefined", response_model=list[SymbolLocation])
+def undefined_symbols(doc_id: str, store: DocStore = Depends(get_doc_store)) -> list[SymbolLocation]:
+    """\\ref-style and \\cite-style uses whose label or key no file of the project defines."""
+    rows = store.undefined_references(doc_id)
+    if rows is None:
+        raise HTTPException(status_code=404, detail="Document not found")
+    return [SymbolLocation(**row) for row in rows]
 
 
 class CommentRequest(BaseModel):
@@ -129,11 +369,15 @@ def list_comments(doc_id: str, store: DocStore = Depends(get_doc_store)) -> list
 
 @router.post("/{doc_id}/comments", response_model=CommentResponse)
 def add_comment(
-    doc_id: str, req: CommentRequest, store: DocStore = Depends(get_doc_store)
+    doc_id: str,
+    req: CommentRequest,
+    store: DocStore = Depends(get_doc_store),
+    bus: EventBus = Depends(get_event_bus),
 ) -> CommentResponse:
     row = store.add_comment(doc_id, req.body, req.path, req.selection_start, req.selection_end)
     if row is None:
         raise HTTPException(status_code=404, detail="Document not found")
+    bus.publish(doc_id, "comment", row)
     return CommentResponse(**row)
 
 
@@ -157,10 +401,16 @@ def list_logs(doc_id: str, store: DocStore = Depends(get_doc_store)) -> list[Log
 
 
 @router.post("/{doc_id}/logs", response_model=LogResponse)
-def add_log(doc_id: str, req: LogRequest, store: DocStore = Depends(get_doc_store)) -> LogResponse:
+def add_log(
+    doc_id: str,
+    req: LogRequest,
+    store: DocStore = Depends(get_doc_store),
+    bus: EventBus = Depends(get_event_bus),
+) -> LogResponse:
     row = store.add_log(doc_id, req.body)
     if row is None:
         raise HTTPException(status_code=404, detail="Document not found")
+    bus.publish(doc_id, "log", row)
     return LogResponse(**row)
 
 
@@ -168,6 +418,16 @@ class RevisionResponse(BaseModel):
     id: str
     doc_id: str
     created_at: str
+    checkpoint: bool = False
+    label: str | None = None
+
+
+class CheckpointRequest(BaseModel):
+    label: str | None = None
+
+
+class ThinRevisionsResponse(BaseModel):
+    removed: int
 
 
 class RevisionDetailResponse(BaseModel):
@@ -185,6 +445,24 @@ def list_revisions(doc_id: str, store: DocStore = Depends(get_doc_store)) -> lis
     return [RevisionResponse(**r) for r in rows]
 
 
+@router.post("/{doc_id}/revisions/checkpoint", response_model=RevisionResponse)
+def create_checkpoint(
+    doc_id: str, req: CheckpointRequest | None = None, store: DocStore = Depends(get_doc_store)
+) -> RevisionResponse:
+    row = store.create_checkpoint(doc_id, label=req.label if req else None)
+    if row is None:
+        raise HTTPException(status_code=404, detail="Document not found")
+    return RevisionResponse(**row)
+
+
+@router.post("/{doc_id}/revisions/thin", response_model=ThinRevisionsResponse)
+def thin_revisions(doc_id: str, store: DocStore = Depends(get_doc_store)) -> ThinRevisionsResponse:
+    removed = store.thin_revisions(doc_id)
+    if removed is None:
+        raise HTTPException(status_code=404, detail="Document not found")
+    return ThinRevisionsResponse(removed=removed)
+
+
 @router.get("/{doc_id}/revisions/{rev_id}", response_model=RevisionDetailResponse)
 def get_revision(doc_id: str, rev_id: str, store: DocStore = Depends(get_doc_store)) -> RevisionDetailResponse:
     row = store.get_revision(doc_id, rev_id)
@@ -194,8 +472,16 @@ def get_revision(doc_id: str, rev_id: str, store: DocStore = Depends(get_doc_sto
 
 
 @router.post("/{doc_id}/revisions/{rev_id}/restore", response_model=DocResponse)
-def restore_revision(doc_id: str, rev_id: str, store: DocStore = Depends(get_doc_store)) -> DocResponse:
+def restore_revision(
+    doc_id: str,
+    rev_id: str,
+    response: Response,
+    store: DocStore = Depends(get_doc_store),
+    bus: EventBus = Depends(get_event_bus),
+) -> DocResponse:
     doc = store.restore_revision(doc_id, rev_id)
     if doc is None:
         raise HTTPException(status_code=404, detail="Revision not found")
+    bus.publish(doc_id, "version", {"version": doc.version, "session": None})
+    response.headers["ETag"] = etag_for(doc.version)
     return doc
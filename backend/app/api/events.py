@@ -0,0 +1,99 @@
+import asyncio
+import json
+
+from fastapi import APIRouter, Depends, HTTPException, Request, WebSocket, WebSocketDisconnect
+from fastapi.responses import StreamingResponse
+from starlette.concurrency import run_in_threadpool
+
+from app.events.bus import Event, EventBus, Subscription
+from app.persistence.store import DocStore
+from app.wiring import get_doc_store, get_event_bus
+
+router = APIRouter()
+
+# SSE comment lines sent while idle keep proxies from closing the stream.
+KEEPALIVE_S = 15.0
+
+
+def _ready(doc_id: str, version: int) -> str:
+    return json.dumps({"id": 0, "type": "ready", "doc_id": doc_id, "data": {"version": version}}, separators=(",", ":"))
+
+
+def _sse_frame(event: Event) -> str:
+    # No `event:` field, so EventSource.onmessage sees every type; the type is in the payload.
+    return f"id: {event.id}\ndata: {event.payload}\n\n"
+
+
+async def _subscribe(doc_id: str, store: DocStore, bus: EventBus) -> tuple[Subscription, str] | None:
+    meta = await run_in_threadpool(store.get_meta, doc_id)
+    if meta is None:
+        return None
+    return bus.subscribe(doc_id), _ready(doc_id, meta["version"])
+
+
+@router.get("/{doc_id}/events")
+async def stream_events(
+    doc_id: str,
+    request: Request,
+    store: DocStore = Depends(get_doc_store),
+    bus: EventBus = Depends(get_event_bus),
+) -> StreamingResponse:
+    """Server-sent events: presence, comment, log, compile and version changes for one document."""
+    subscribed = await _subscribe(doc_id, store, bus)
+    if subscribed is None:
+        raise HTTPException(status_code=404, detail="Document not found")
+    sub, ready = subscribed
+
+    async def body():
+        try:
+            yield f"data: {ready}\n\n"
+            while not await request.is_disconnected():
+                event = await sub.get(timeout=KEEPALIVE_S)
+                yield _sse_frame(event) if event is not None else ": keepalive\n\n"
+        finally:
+            sub.close()
+
+    return StreamingResponse(
+        body(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@router.websocket("/{doc_id}/events/ws")
+async def events_ws(
+    websocket: WebSocket,
+    doc_id: str,
+    store: DocStore = Depends(get_doc_store),
+    bus: EventBus = Depends(get_event_bus),
+) -> None:
+    """The same events as /events, one JSON message each."""
+    subscribed = await _subscribe(doc_id, store, bus)
+    if subscribed is None:
+        await websocket.close(code=4404)
+        return
+    sub, ready = subscribed
+    await websocket.accept()
+
+    async def pump() -> None:
+        await websocket.send_text(ready)
+        while True:
+            event = await sub.get()
+            await websocket.send_text(event.payload)
+
+    async def drain() -> None:
+        # Incoming messages are ignored; receiving is how a disconnect is noticed while idle.
+        try:
+            while True:
+                await websocket.receive_text()
+        except WebSocketDisconnect:
+            pass
+
+    tasks = [asyncio.create_task(pump()), asyncio.create_task(drain())]
+    try:
+        await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        # Not awaited: the server may already be cancelling this handler, and the tasks hold nothing to release.
+        for task in tasks:
+            task.cancel()
+        sub.close()
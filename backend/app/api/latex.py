@@ -7,7 +7,8 @@ from pydantic import BaseModel, Field
 from app.latex.compile import LatexCompiler, LatexCompileError
 from app.latex.extract_image import LatexImageExtractor
 from app.latex.validate import validate_latex
-from app.wiring import get_latex_compiler, get_latex_image_extractor
+from app.events.bus import EventBus
+from app.wiring import get_event_bus, get_latex_compiler, get_latex_image_extractor
 
 router = APIRouter()
 
@@ -29,19 +30,31 @@ def validate(req: LatexValidateRequest) -> LatexValidateResponse:
 
 class LatexCompileRequest(BaseModel):
     sourceLatex: str = Field(min_length=0)
+    # When set, compile status is published to the document's event stream.
+    docId: str | None = None
 
 
 @router.post("/compile")
 def compile_pdf(
-    req: LatexCompileRequest, compiler: LatexCompiler = Depends(get_latex_compiler)
+    req: LatexCompileRequest,
+    compiler: LatexCompiler = Depends(get_latex_compiler),
+    bus: EventBus = Depends(get_event_bus),
 ) -> Response:
+    def status(state: str, **extra: Any) -> None:
+        if req.docId:
+            bus.publish(req.docId, "compile", {"status": state, **extra})
+
+    status("running")
     try:
         pdf_bytes = compiler.compile_pdf(req.sourceLatex)
-        return Response(content=pdf_bytes, media_type="application/pdf")
     except LatexCompileError as exc:
+        status("failed", error=str(exc))
         raise HTTPException(status_code=400, detail=str(exc)) from exc
     except RuntimeError as exc:
+        status("failed", error=str(exc))
         raise HTTPException(status_code=501, detail=str(exc)) from exc
+    status("succeeded", bytes=len(pdf_bytes))
+    return Response(content=pdf_bytes, media_type="application/pdf")
 
 
 class LatexExtractImageResponse(BaseModel):
@@ -1,11 +1,15 @@
 from fastapi import APIRouter, Depends, HTTPException
+from starlette.concurrency import run_in_threadpool
 
 from app.context.extract import build_structured_context_with_limits
+from app.context.project import build_project_context
 from app.local_models.manager import ModelManager
 from app.modeling.models import CompletionRequest, CompletionResponse
 from app.modeling.router import ModelRouter
+from app.modeling.tokenizers import TokenizerRegistry
 from app.persistence.local_models import LocalModelStore
-from app.wiring import get_local_model_store, get_model_manager, get_model_router
+from app.persistence.store import DocStore
+from app.wiring import get_doc_store, get_local_model_store, get_model_manager, get_model_router, get_tokenizer_registry
 
 router = APIRouter()
 
@@ -16,13 +20,34 @@ async def completion(
     model_router: ModelRouter = Depends(get_model_router),
     local_models: LocalModelStore = Depends(get_local_model_store),
     mgr: ModelManager = Depends(get_model_manager),
+    tokenizers: TokenizerRegistry = Depends(get_tokenizer_registry),
+    store: DocStore = Depends(get_doc_store),
 ) -> CompletionResponse:
-    if (not req.context) and req.sourceLatex:
+    if (not req.context) and req.docId and req.activePath:
+        try:
+            # Blocking SQLite reads; keep them off the event loop.
+            built = await run_in_threadpool(
+                build_project_context,
+                store,
+                req.docId,
+                req.activePath,
+                center_index=req.cursorIndex,
+                max_chars=req.maxContextChars,
+                max_tokens=req.maxContextTokens,
+                tokenizer=tokenizers.get(req.modelConfig),
+            )
+        except ValueError as exc:
+            raise HTTPException(status_code=400, detail=str(exc)) from exc
+        if built is None:
+            raise HTTPException(status_code=404, detail="Document not found")
+        req.context, _meta = built
+    elif (not req.context) and req.sourceLatex:
         req.context, _meta = build_structured_context_with_limits(
             req.sourceLatex,
             center_index=len(req.sourceLatex),
             max_chars=req.maxContextChars,
             max_tokens=req.maxContextTokens,
+            tokenizer=tokenizers.get(req.modelConfig),
         )
     if (
         req.modelConfig.type == "local"
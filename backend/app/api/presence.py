@@ -1,8 +1,8 @@
 from fastapi import APIRouter, Depends
 from pydantic import BaseModel
 
-from app.persistence.store import DocStore
-from app.wiring import get_doc_store
+from app.persistence.presence import PresenceRegistry
+from app.wiring import get_presence_registry
 
 router = APIRouter()
 
@@ -22,12 +22,12 @@ class PresenceResponse(BaseModel):
 
 
 @router.post("/heartbeat", response_model=PresenceResponse)
-def heartbeat(req: PresenceRequest, store: DocStore = Depends(get_doc_store)) -> PresenceResponse:
-    row = store.heartbeat_presence(req.doc_id, req.user_id, req.display_name)
+def heartbeat(req: PresenceRequest, registry: PresenceRegistry = Depends(get_presence_registry)) -> PresenceResponse:
+    row = registry.heartbeat(req.doc_id, req.user_id, req.display_name)
     return PresenceResponse(**row)
 
 
 @router.get("/list", response_model=list[PresenceResponse])
-def list_presence(doc_id: str, store: DocStore = Depends(get_doc_store)) -> list[PresenceResponse]:
-    rows = store.list_presence(doc_id)
+def list_presence(doc_id: str, registry: PresenceRegistry = Depends(get_presence_registry)) -> list[PresenceResponse]:
+    rows = registry.list(doc_id)
     return [PresenceResponse(**r) for r in rows]
@@ -1,10 +1,11 @@
 import os
+from typing import Literal
 
 import httpx
 from fastapi import APIRouter, Depends, HTTPException, Query
 from pydantic import BaseModel
 
-from app.persistence.store import DocStore
+from app.persistence.store import SEARCH_COUNT_CAP, DocStore
 from app.wiring import get_doc_store
 
 router = APIRouter()
@@ -18,15 +19,44 @@ class SearchHit(BaseModel):
 
 class SearchResponse(BaseModel):
     results: list[SearchHit]
+    # At most SEARCH_COUNT_CAP; total_exact is false when there are more.
+    total: int = 0
+    total_exact: bool = True
+    next_offset: int | None = None
+    # Which index answered: "words" or "substring".
+    index: str = "words"
+
+
+def next_offset(offset: int, page: dict) -> int | None:
+    end = offset + len(page["results"])
+    return end if end < page["total"] else None
 
 
 @router.get("", response_model=SearchResponse)
-def search_all(q: str = Query(default=""), store: DocStore = Depends(get_doc_store)) -> SearchResponse:
-    query = (q or "").strip().lower()
-    if not query:
+def search_all(
+    q: str = Query(default=""),
+    limit: int = Query(default=20, ge=1, le=100),
+    offset: int = Query(default=0, ge=0, le=SEARCH_COUNT_CAP),
+    mode: Literal["auto", "words", "substring"] = Query(default="auto"),
+    # Search-as-you-type: the last word also matches longer words it begins.
+    prefix: bool = Query(default=False),
+    store: DocStore = Depends(get_doc_store),
+) -> SearchResponse:
+    # Trailing whitespace is kept: it tells a prefix search the last word is finished.
+    query = (q or "").lstrip().lower()
+    if not query.strip():
         return SearchResponse(results=[])
-    rows = store.search(None, query)
-    return SearchResponse(results=[SearchHit(**r) for r in rows])
+    try:
+        page = store.search_page(None, query, limit, offset, mode=mode, prefix=prefix)
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc)) from exc
+    return SearchResponse(
+        results=[SearchHit(**r) for r in page["results"]],
+        total=page["total"],
+        total_exact=page["total_exact"],
+        next_offset=next_offset(offset, page),
+        index=page["index"],
+    )
 
 
 class WebSearchHit(BaseModel):
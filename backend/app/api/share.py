@@ -1,6 +1,7 @@
-from fastapi import APIRouter, HTTPException, Depends
+from fastapi import APIRouter, Depends, Header, HTTPException, Response
 from pydantic import BaseModel
 
+from app.api.conditional import etag_for, etag_matches
 from app.persistence.store import DocStore
 from app.wiring import get_doc_store
 
@@ -14,11 +15,22 @@ class ShareDocResponse(BaseModel):
 
 
 @router.get("/{token}", response_model=ShareDocResponse)
-def get_shared_doc(token: str, store: DocStore = Depends(get_doc_store)) -> ShareDocResponse:
+def get_shared_doc(
+    token: str,
+    response: Response,
+    if_none_match: str | None = Header(default=None),
+    store: DocStore = Depends(get_doc_store),
+):
     share = store.get_share(token)
     if share is None:
         raise HTTPException(status_code=404, detail="Share not found")
+    meta = store.get_meta(share["doc_id"])
+    if meta is None:
+        raise HTTPException(status_code=404, detail="Document not found")
+    if etag_matches(if_none_match, etag_for(meta["version"])):
+        return Response(status_code=304, headers={"ETag": etag_for(meta["version"])})
     doc = store.get(share["doc_id"])
     if doc is None:
         raise HTTPException(status_code=404, detail="Document not found")
+    response.headers["ETag"] = etag_for(doc.version)
     return ShareDocResponse(doc_id=doc.id, title=doc.title, content=doc.content)
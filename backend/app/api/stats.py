@@ -0,0 +1,11 @@
+from fastapi import APIRouter, Depends
+
+from app.persistence.store import DocStore
+from app.wiring import get_doc_store
+
+router = APIRouter()
+
+
+@router.get("/store")
+def store_stats(store: DocStore = Depends(get_doc_store)) -> dict:
+    return store.stats()
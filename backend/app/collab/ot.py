@@ -0,0 +1,143 @@
+from __future__ import annotations
+
+# Text operations in the ot.js format, so a browser client can share the wire format:
+# a list of components, each a retain (positive int), insert (str) or delete (negative int),
+# that together span the whole base text. Lengths count UTF-16 code units, as JavaScript
+# string indices do, so editor offsets can be sent as-is even around emoji.
+
+Op = list  # list[int | str]
+
+
+class OTError(ValueError):
+    """Raised for a malformed operation or one that does not fit the text it is applied to."""
+
+
+def _units(text: str) -> int:
+    return len(text.encode("utf-16-le")) // 2
+
+
+def _retain(ops: Op, n: int) -> None:
+    if n == 0:
+        return
+    if ops and isinstance(ops[-1], int) and ops[-1] > 0:
+        ops[-1] += n
+    else:
+        ops.append(n)
+
+
+def _insert(ops: Op, text: str) -> None:
+    if not text:
+        return
+    if ops and isinstance(ops[-1], str):
+        ops[-1] += text
+    elif ops and isinstance(ops[-1], int) and ops[-1] < 0:
+        # Inserts go before an adjacent delete so equal edits have one spelling.
+        if len(ops) > 1 and isinstance(ops[-2], str):
+            ops[-2] += text
+        else:
+            ops.insert(len(ops) - 1, text)
+    else:
+        ops.append(text)
+
+
+def _delete(ops: Op, n: int) -> None:
+    if n == 0:
+        return
+    if ops and isinstance(ops[-1], int) and ops[-1] < 0:
+        ops[-1] -= n
+    else:
+        ops.append(-n)
+
+
+def normalize(op) -> Op:
+    """Validate `op` and return it with adjacent components merged; raises OTError."""
+    if not isinstance(op, list):
+        raise OTError("Operation must be a list")
+    out: Op = []
+    for component in op:
+        if isinstance(component, bool):
+            raise OTError("Operation components are ints or strings")
+        if isinstance(component, str):
+            _insert(out, component)
+        elif isinstance(component, int):
+            if component > 0:
+                _retain(out, component)
+            else:
+                _delete(out, -component)
+        else:
+            raise OTError("Operation components are ints or strings")
+    return out
+
+
+def base_length(op: Op) -> int:
+    return sum(abs(c) for c in op if isinstance(c, int))
+
+
+def target_length(op: Op) -> int:
+    return sum(_units(c) if isinstance(c, str) else c for c in op if isinstance(c, str) or c > 0)
+
+
+def apply(text: str, op: Op) -> str:
+    units = text.encode("utf-16-le")
+    if base_length(op) * 2 != len(units):
+        raise OTError(f"Operation spans {base_length(op)} units but the text has {len(units) // 2}")
+    out: list[bytes] = []
+    pos = 0
+    for c in op:
+        if isinstance(c, str):
+            out.append(c.encode("utf-16-le"))
+        elif c > 0:
+            out.append(units[pos * 2:(pos + c) * 2])
+            pos += c
+        else:
+            pos -= c
+    try:
+        return b"".join(out).decode("utf-16-le")
+    except UnicodeDecodeError:
+        raise OTError("Operation splits a surrogate pair") from None
+
+
+def transform(a: Op, b: Op) -> tuple[Op, Op]:
+    """
+    Given `a` and `b` made against the same text, return (a', b') such that applying a then b'
+    gives the same text as b then a'. When both insert at one position, a's text comes first.
+    """
+    if base_length(a) != base_length(b):
+        raise OTError("Concurrent operations must share a base length")
+    a_prime: Op = []
+    b_prime: Op = []
+    i = j = 0
+    x = a[0] if a else None
+    y = b[0] if b else None
+    while x is not None or y is not None:
+        if isinstance(x, str):
+            _insert(a_prime, x)
+            _retain(b_prime, _units(x))
+            i += 1
+            x = a[i] if i < len(a) else None
+            continue
+        if isinstance(y, str):
+            _retain(a_prime, _units(y))
+            _insert(b_prime, y)
+            j += 1
+            y = b[j] if j < len(b) else None
+            continue
+        # Equal base lengths mean neither runs out while the other has retains or deletes left.
+        n = min(abs(x), abs(y))
+        if x > 0 and y > 0:
+            _retain(a_prime, n)
+            _retain(b_prime, n)
+        elif x < 0 and y > 0:
+            _delete(a_prime, n)
+        elif x > 0 and y < 0:
+            _delete(b_prime, n)
+        # Both deleting the same span: it is already gone for each.
+        x = x - n if x > 0 else x + n
+        y = y - n if y > 0 else y + n
+        if x == 0:
+            i += 1
+            x = a[i] if i < len(a) else None
+        if y == 0:
+            j += 1
+            y = b[j] if j < len(b) else None
+    return a_prime, b_prime
@@ -0,0 +1,265 @@
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+import uuid
+from collections import deque
+from typing import Any
+
+from starlette.concurrency import run_in_threadpool
+
+from app.collab.ot import Op, OTError, apply, normalize, transform
+from app.events.bus import EventBus
+from app.persistence.store import DocStore
+from app.persistence.workspace import split_workspace
+
+logger = logging.getLogger(__name__)
+
+
+def _message(**fields: Any) -> str:
+    return json.dumps(fields, separators=(",", ":"), ensure_ascii=False)
+
+
+class StaleRevision(Exception):
+    """The client's base revision is older than the history kept for the file."""
+
+
+class _File:
+    __slots__ = ("text", "rev", "history", "meta")
+
+    def __init__(self, text: str, meta: dict, history_limit: int):
+        self.text = text
+        self.rev = 0
+        self.history: deque[Op] = deque(maxlen=history_limit)
+        self.meta = meta
+
+    def snapshot(self) -> dict:
+        return {"rev": self.rev, "content": self.text}
+
+
+class CollabClient:
+    """One connection's outbound queue; a client that falls too far behind is told to reconnect."""
+
+    def __init__(self, max_pending: int):
+        self.id = uuid.uuid4().hex[:12]
+        self.queue: asyncio.Queue[str | None] = asyncio.Queue()
+        self._max_pending = max_pending
+        self.dropped = False
+
+    def send(self, message: str) -> None:
+        if self.dropped:
+            return
+        if self.queue.qsize() >= self._max_pending:
+            # Skipping an operation would desync the client, so it is cut off instead (None ends the writer).
+            self.dropped = True
+            self.queue.put_nowait(None)
+            return
+        self.queue.put_nowait(message)
+
+
+class CollabSession:
+    """
+    The live text of one document's files while anyone is editing it.
+
+    Every file has its own revision counter and a bounded history of applied operations.
+    An operation made against an older revision is transformed past the ones applied since,
+    applied, acknowledged to its sender and broadcast to everyone else. Changed files are
+    written back with DocStore.patch_files every `flush_interval_s` and when the last client
+    leaves, so storage sees one upsert per file per interval instead of one save per keystroke.
+
+    All state is touched only from the event loop, and submit() never awaits, so operations
+    are applied one at a time in arrival order.
+    """
+
+    def __init__(self, hub: CollabHub, doc_id: str):
+        self.hub = hub
+        self.doc_id = doc_id
+        self.files: dict[str, _File] = {}
+        self.clients: dict[str, CollabClient] = {}
+        self._fixed: set[str] = set()
+        self._dirty: set[str] = set()
+        loop = asyncio.get_running_loop()
+        self._loaded = loop.create_future()
+        self._wake = asyncio.Event()
+        # Resolved when the next flush round to start has finished.
+        self._round = loop.create_future()
+        self._runner: asyncio.Task | None = None
+
+    async def _load(self) -> None:
+        doc = await run_in_threadpool(self.hub.store.get, self.doc_id)
+        if doc is None:
+            raise LookupError(self.doc_id)
+        split = split_workspace(doc.content)
+        if split is None:
+            if doc.content.strip():
+                raise ValueError("Document is not a file workspace")
+            entries: list[tuple[str, Any]] = []
+        else:
+            entries = split[1]
+        for path, entry in entries:
+            if isinstance(entry, dict) and isinstance(entry.get("content"), str):
+                meta = {k: v for k, v in entry.items() if k != "content"}
+                self.files[path] = _File(entry["content"], meta, self.hub.history_limit)
+            else:
+                # Folders and non-text entries are listed but not editable here.
+                self._fixed.add(path)
+        self._runner = asyncio.create_task(self._run())
+
+    def init_message(self, client: CollabClient) -> str:
+        return _message(
+            type="init",
+            client_id=client.id,
+            files={path: f.snapshot() for path, f in self.files.items()},
+        )
+
+    def resync_message(self, path: str) -> str:
+        f = self.files.get(path)
+        return _message(type="resync", path=path, **(f.snapshot() if f else {"rev": 0, "content": ""}))
+
+    @staticmethod
+    def error_message(message: str, path: str | None = None) -> str:
+        if path is None:
+            return _message(type="error", message=message)
+        return _message(type="error", path=path, message=message)
+
+    def submit(self, client: CollabClient, path: str, rev: int, op: Any) -> int:
+        """
+        Apply `op`, made against revision `rev` of `path`, and fan it out; returns the new revision.
+
+        Raises OTError for an invalid operation and StaleRevision if `rev` is no longer in history.
+        A path not yet in the workspace is created as an empty file by an operation against rev 0.
+        """
+        if path in self._fixed:
+            raise OTError(f"{path} is not a text file")
+        op = normalize(op)
+        f = self.files.get(path)
+        if f is None:
+            if rev != 0:
+                raise StaleRevision(path)
+            f = _File("", {"type": "file"}, self.hub.history_limit)
+        if rev < 0 or rev > f.rev:
+            raise OTError(f"Unknown revision {rev} for {path}")
+        missed = f.rev - rev
+        if missed > len(f.history):
+            raise StaleRevision(path)
+        for concurrent in list(f.history)[len(f.history) - missed:]:
+            op, _ = transform(op, concurrent)
+        text = apply(f.text, op)
+        self.files[path] = f
+        f.text = text
+        f.rev += 1
+        f.history.append(op)
+        self._dirty.add(path)
+        client.send(_message(type="ack", path=path, rev=f.rev))
+        broadcast = _message(type="op", path=path, rev=f.rev, op=op, client_id=client.id)
+        for other in self.clients.values():
+            if other is not client:
+                other.send(broadcast)
+        return f.rev
+
+    async def _run(self) -> None:
+        # The only caller of flush(), so two saves of one file never overlap. Ends the session
+        # once nobody is connected and everything is saved.
+        while True:
+            try:
+                await asyncio.wait_for(self._wake.wait(), self.hub.flush_interval_s)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            finished, self._round = self._round, asyncio.get_running_loop().create_future()
+            await self.flush()
+            finished.set_result(None)
+            if not self.clients and not self._dirty:
+                self.hub._end(self)
+                return
+
+    async def flush(self) -> None:
+        if not self._dirty:
+            return
+        paths, self._dirty = self._dirty, set()
+        upsert = {path: {**self.files[path].meta, "content": self.files[path].text} for path in paths}
+        try:
+            result = await run_in_threadpool(
+                self.hub.store.patch_files, self.doc_id, upsert, [], session_id=f"collab:{self.doc_id}"
+            )
+        except Exception:
+            logger.exception("Saving collaborative edits to %s failed", self.doc_id)
+            self._dirty |= paths
+            return
+        if result is not None and self.hub.bus is not None:
+            self.hub.bus.publish(self.doc_id, "version", {"version": result["version"], "session": "collab"})
+
+    async def wait_saved(self) -> None:
+        """Save now rather than at the next interval, and wait until that is done."""
+        pending = self._round
+        self._wake.set()
+        await asyncio.shield(pending)
+
+
+class CollabHub:
+    """
+    Collaborative sessions by document id, opened by the first client and closed after the last.
+
+    Sessions live in this process: run a single worker (or route each document to one) when
+    collaborative editing is in use. While a session is open its files are authoritative, so
+    whole-document saves to the same paths are overwritten by the next flush.
+    """
+
+    def __init__(
+        self,
+        store: DocStore,
+        bus: EventBus | None = None,
+        *,
+        flush_interval_s: float = 2.0,
+        history_limit: int = 1000,
+        max_pending: int = 1000,
+    ):
+        self.store = store
+        self.bus = bus
+        self.flush_interval_s = flush_interval_s
+        self.history_limit = history_limit
+        self.max_pending = max_pending
+        self._sessions: dict[str, CollabSession] = {}
+
+    async def join(self, doc_id: str) -> tuple[CollabSession, CollabClient]:
+        """Raises LookupError if the document does not exist and ValueError if it is not a workspace."""
+        while True:
+            session = self._sessions.get(doc_id)
+            if session is None:
+                session = CollabSession(self, doc_id)
+                self._sessions[doc_id] = session
+                try:
+                    await session._load()
+                except Exception as exc:
+                    del self._sessions[doc_id]
+                    session._loaded.set_exception(exc)
+                    # Waiters see the same error; mark it retrieved in case there are none.
+                    session._loaded.exception()
+                    raise
+                except BaseException:
+                    del self._sessions[doc_id]
+                    session._loaded.cancel()
+                    raise
+                session._loaded.set_result(None)
+            elif not session._loaded.done():
+                await asyncio.shield(session._loaded)
+                if self._sessions.get(doc_id) is not session:
+                    # It ended while this caller waited; start over.
+                    continue
+            client = CollabClient(self.max_pending)
+            session.clients[client.id] = client
+            return session, client
+
+    async def leave(self, session: CollabSession, client: CollabClient) -> None:
+        """Drop `client`; the last one out waits for the session's edits to be saved."""
+        session.clients.pop(client.id, None)
+        if not session.clients:
+            await session.wait_saved()
+
+    def _end(self, session: CollabSession) -> None:
+        if self._sessions.get(session.doc_id) is session:
+            del self._sessions[session.doc_id]
+
+    def session_count(self) -> int:
+        return len(self._sessions)
@@ -1,5 +1,12 @@
-import re
+from __future__ import annotations
+
+from bisect import bisect_left, bisect_right
 from dataclasses import dataclass
+from functools import lru_cache
+
+from app.context.incremental import IncrementalParser
+from app.context.scanner import HEADINGS, REF_COMMANDS, Event, scan_latex
+from app.modeling.tokenizers import HEURISTIC, Tokenizer
 
 
 @dataclass(frozen=True)
@@ -9,26 +16,155 @@ class LatexAst:
     equations: list[str]
 
 
-_SECTION_RE = re.compile(r"\\section\{([^}]*)\}")
-_LABEL_RE = re.compile(r"\\label\{([^}]*)\}")
-_EQUATION_RE = re.compile(
-    r"\\begin\{equation\}(.*?)\\end\{equation\}", re.DOTALL | re.MULTILINE
-)
+# Parses kept for recently seen sources. lru_cache keys on the source text itself, so a
+# request for an unchanged document costs one hash and one compare instead of a parse. A
+# changed document is parsed chunk by chunk, and only chunks whose text changed are parsed
+# again (see app.context.incremental).
+_PARSE_CACHE_SIZE = 32
 
 
-def parse_latex_to_ast(source: str) -> LatexAst:
-    try:
-        return _parse_with_pylatexenc(source)
-    except Exception:
+@dataclass(frozen=True)
+class _Span:
+    pos: int
+    end: int
+    text: str
+    # The heading command for sections ("section", "subsection", ...).
+    kind: str = ""
+
+
+class _Table:
+    """Spans of one kind in source order, with their start offsets for bisecting."""
+
+    def __init__(self, spans: list[_Span]):
+        self.spans = spans
+        self.starts = [s.pos for s in spans]
+        self.longest = max((s.end - s.pos for s in spans), default=0)
+
+    def overlapping(self, start: int, end: int) -> list[_Span]:
+        lo = bisect_left(self.starts, start - self.longest)
+        hi = bisect_right(self.starts, end)
+        return [s for s in self.spans[lo:hi] if s.end >= start]
+
+    def contained(self, start: int, end: int) -> list[_Span]:
+        lo = bisect_left(self.starts, start)
+        hi = bisect_right(self.starts, end)
+        return [s for s in self.spans[lo:hi] if s.end <= end]
+
+
+@dataclass(frozen=True)
+class _ChunkParse:
+    nodes: list | None
+    sections: list[_Span]
+    labels: list[_Span]
+    citations: list[_Span]
+    refs: list[_Span]
+    equations: list[_Span]
+
+
+@dataclass(frozen=True)
+class ParsedLatex:
+    """
+    One parse of a source: the pylatexenc node trees of its chunks as (chunk offset, nodes),
+    None when the scanner fallback was used, and position tables of the headings (every level),
+    labels, citation keys, referenced labels and equations found in it.
+    """
+
+    nodes: list[tuple[int, list]] | None
+    sections: _Table
+    labels: _Table
+    citations: _Table
+    refs: _Table
+    equations: _Table
+
+    @classmethod
+    def join(cls, chunks: list[tuple[int, _ChunkParse]]) -> ParsedLatex:
+        def table(kind: str) -> _Table:
+            return _Table([
+                _Span(s.pos + offset, s.end + offset, s.text, s.kind) for offset, c in chunks for s in getattr(c, kind)
+            ])
+
+        nodes = [(offset, c.nodes) for offset, c in chunks if c.nodes is not None]
+        return cls(
+            nodes=nodes or None,
+            sections=table("sections"),
+            labels=table("labels"),
+            citations=table("citations"),
+            refs=table("refs"),
+            equations=table("equations"),
+        )
+
+    def ast(self) -> LatexAst:
         return LatexAst(
-            sections=_SECTION_RE.findall(source),
-            labels=_LABEL_RE.findall(source),
-            equations=[eq.strip() for eq in _EQUATION_RE.findall(source)],
+            sections=[s.text for s in self.sections.spans if s.kind == "section"],
+            labels=[s.text for s in self.labels.spans],
+            equations=[s.text for s in self.equations.spans],
         )
 
+    def window_ast(self, start: int, end: int) -> LatexAst:
+        """The AST of `source[start:end]`, read from the tables instead of parsing the slice."""
+        return LatexAst(
+            sections=[s.text for s in self.sections.contained(start, end) if s.kind == "section"],
+            labels=[s.text for s in self.labels.contained(start, end)],
+            equations=[s.text for s in self.equations.contained(start, end)],
+        )
+
+
+@lru_cache(maxsize=_PARSE_CACHE_SIZE)
+def parse_latex(source: str) -> ParsedLatex:
+    return ParsedLatex.join(_chunk_parser.parse(source))
+
+
+def clear_parse_cache() -> None:
+    parse_latex.cache_clear()
+    _chunk_parser.clear()
+
+
+def _parse_chunk(text: str) -> _ChunkParse:
+    try:
+        return _parse_with_pylatexenc(text)
+    except Exception:
+        return _parse_with_scanner(text)
+
+
+_chunk_parser: IncrementalParser[_ChunkParse] = IncrementalParser(_parse_chunk)
+
+
+def parse_latex_to_ast(source: str) -> LatexAst:
+    return parse_latex(source).ast()
+
+
+def _parse_with_scanner(source: str) -> _ChunkParse:
+    sections: list[_Span] = []
+    labels: list[_Span] = []
+    citations: list[_Span] = []
+    refs: list[_Span] = []
+    equations: list[_Span] = []
+    opened: list[Event] = []
+    for e in scan_latex(source):
+        if e.kind == "heading":
+            sections.append(_Span(e.pos, e.end, e.text, e.name))
+        elif e.kind == "label":
+            labels.append(_Span(e.pos, e.end, e.text))
+        elif e.kind == "cite":
+            citations.extend(_keys(e.pos, e.end, e.text))
+        elif e.kind == "ref":
+            refs.extend(_keys(e.pos, e.end, e.text))
+        elif e.kind == "begin" and e.name == "equation":
+            opened.append(e)
+        elif e.kind == "end" and e.name == "equation" and opened:
+            begin = opened.pop()
+            equations.append(_Span(begin.pos, e.end, source[begin.end:e.pos].strip()))
+    return _ChunkParse(
+        nodes=None, sections=sections, labels=labels, citations=citations, refs=refs, equations=equations
+    )
+
+
+def _keys(pos: int, end: int, text: str) -> list[_Span]:
+    return [_Span(pos, end, k.strip()) for k in text.split(",") if k.strip()]
+
 
-def _parse_with_pylatexenc(source: str) -> LatexAst:
-    # Optional dependency; if unavailable or parsing fails, caller falls back to regex parsing.
+def _parse_with_pylatexenc(source: str) -> _ChunkParse:
+    # Optional dependency; if unavailable or parsing fails, caller falls back to the scanner.
     from pylatexenc.latexwalker import LatexWalker  # type: ignore
     from pylatexenc.latexwalker import LatexMacroNode  # type: ignore
     from pylatexenc.latexwalker import LatexEnvironmentNode  # type: ignore
@@ -36,25 +172,31 @@ def _parse_with_pylatexenc(source: str) -> LatexAst:
     walker = LatexWalker(source)
     nodes, _, _ = walker.get_latex_nodes(pos=0)
 
-    sections: list[str] = []
-    labels: list[str] = []
-    equations: list[str] = []
+    sections: list[_Span] = []
+    labels: list[_Span] = []
+    citations: list[_Span] = []
+    refs: list[_Span] = []
+    equations: list[_Span] = []
 
     def walk(ns):
         for n in ns:
             if isinstance(n, LatexMacroNode):
                 name = n.macroname
-                if name == "section" and n.nodeargd and n.nodeargd.argnlist:
-                    arg = n.nodeargd.argnlist[0]
-                    sections.append(arg.latex_verbatim())
-                if name == "label" and n.nodeargd and n.nodeargd.argnlist:
-                    arg = n.nodeargd.argnlist[0]
-                    labels.append(arg.latex_verbatim())
+                arg = _mandatory_arg(n)
+                if arg is not None:
+                    if name in HEADINGS:
+                        sections.append(_Span(n.pos, n.pos + n.len, arg, name))
+                    if name == "label":
+                        labels.append(_Span(n.pos, n.pos + n.len, arg))
+                    if name.startswith("cite"):
+                        citations.extend(_keys(n.pos, n.pos + n.len, arg))
+                    if name in REF_COMMANDS:
+                        refs.extend(_keys(n.pos, n.pos + n.len, arg))
                 if getattr(n, "nodelist", None):
                     walk(n.nodelist)
             elif isinstance(n, LatexEnvironmentNode):
                 if n.environmentname == "equation":
-                    equations.append((n.latex_verbatim() or "").strip())
+                    equations.append(_Span(n.pos, n.pos + n.len, (n.latex_verbatim() or "").strip()))
                 if getattr(n, "nodelist", None):
                     walk(n.nodelist)
             else:
@@ -63,7 +205,21 @@ def _parse_with_pylatexenc(source: str) -> LatexAst:
                     walk(child)
 
     walk(nodes)
-    return LatexAst(sections=sections, labels=labels, equations=equations)
+    return _ChunkParse(
+        nodes=nodes, sections=sections, labels=labels, citations=citations, refs=refs, equations=equations
+    )
+
+
+def _mandatory_arg(n) -> str | None:
+    # argnlist holds None for optional arguments that were not given (`*`, `[...]`); the
+    # braced argument is the last one, returned without its braces.
+    args = [a for a in (n.nodeargd.argnlist if n.nodeargd else []) if a is not None]
+    if not args:
+        return None
+    text = args[-1].latex_verbatim()
+    if text.startswith("{") and text.endswith("}"):
+        text = text[1:-1]
+    return text
 
 
 def extract_structured_context(
@@ -75,95 +231,25 @@ def extract_structured_context(
     """
     Best-effort extraction of "nearby" semantic items around a cursor index.
 
-    Uses pylatexenc when available; otherwise falls back to regex heuristics.
+    Uses pylatexenc when available; otherwise falls back to a single-pass scanner.
     """
     start = max(0, center_index - window_chars)
     end = min(len(source), center_index + window_chars)
-    window = source[start:end]
-
-    try:
-        return _extract_structured_with_pylatexenc(source, center_index=center_index, window=(start, end))
-    except Exception:
-        # Fallback: use regex within the window, and approximate "current section" as last section header in window.
-        sections = _SECTION_RE.findall(window)
-        current_section = sections[-1] if sections else None
-        labels = _LABEL_RE.findall(window)
-        equations = [eq.strip() for eq in _EQUATION_RE.findall(window)]
-        citations = re.findall(r"\\cite[a-zA-Z]*\{([^}]*)\}", window)
-        flat_cites: list[str] = []
-        for c in citations:
-            flat_cites.extend([x.strip() for x in c.split(",") if x.strip()])
-        return {
-            "currentSection": current_section,
-            "labelsNear": labels[:50],
-            "citationsNear": flat_cites[:50],
-            "equationsNear": equations[:10],
-            "window": {"start": start, "end": end},
-        }
-
-
-def _extract_structured_with_pylatexenc(source: str, *, center_index: int, window: tuple[int, int]) -> dict:
-    from pylatexenc.latexwalker import LatexWalker  # type: ignore
-    from pylatexenc.latexwalker import LatexEnvironmentNode  # type: ignore
-    from pylatexenc.latexwalker import LatexMacroNode  # type: ignore
-
-    start, end = window
-    walker = LatexWalker(source)
-    nodes, _, _ = walker.get_latex_nodes(pos=0)
-
-    current_section: str | None = None
-    labels: list[str] = []
-    citations: list[str] = []
-    equations: list[str] = []
-
-    def within(n) -> bool:
-        pos = getattr(n, "pos", None)
-        length = getattr(n, "len", None)
-        if pos is None or length is None:
-            return False
-        n_end = pos + length
-        return not (n_end < start or pos > end)
-
-    def before_center(n) -> bool:
-        pos = getattr(n, "pos", None)
-        return pos is not None and pos <= center_index
-
-    def walk(ns):
-        nonlocal current_section
-        for n in ns:
-            if isinstance(n, LatexMacroNode):
-                name = n.macroname
-                if name == "section" and before_center(n) and n.nodeargd and n.nodeargd.argnlist:
-                    arg = n.nodeargd.argnlist[0]
-                    current_section = arg.latex_verbatim()
-                if within(n) and n.nodeargd and n.nodeargd.argnlist:
-                    arg0 = n.nodeargd.argnlist[0]
-                    if name == "label":
-                        labels.append(arg0.latex_verbatim())
-                    if name.startswith("cite"):
-                        raw = arg0.latex_verbatim()
-                        for item in raw.split(","):
-                            item = item.strip()
-                            if item:
-                                citations.append(item)
-                if getattr(n, "nodelist", None):
-                    walk(n.nodelist)
-            elif isinstance(n, LatexEnvironmentNode):
-                if within(n) and n.environmentname == "equation":
-                    equations.append((n.latex_verbatim() or "").strip())
-                if getattr(n, "nodelist", None):
-                    walk(n.nodelist)
-            else:
-                child = getattr(n, "nodelist", None)
-                if child:
-                    walk(child)
-
-    walk(nodes)
+    parsed = parse_latex(source)
+
+    # The current section is the last heading, of any level, starting at or before the cursor;
+    # everything else is the items touching the window.
+    before = bisect_right(parsed.sections.starts, center_index)
+    labels = parsed.labels.overlapping(start, end)
+    citations = parsed.citations.overlapping(start, end)
+    refs = parsed.refs.overlapping(start, end)
+    equations = parsed.equations.overlapping(start, end)
     return {
-        "currentSection": current_section,
-        "labelsNear": labels[:50],
-        "citationsNear": citations[:50],
-        "equationsNear": equations[:10],
+        "currentSection": parsed.sections.spans[before - 1].text if before else None,
+        "labelsNear": [s.text for s in labels[:50]],
+        "citationsNear": [s.text for s in citations[:50]],
+        "refsNear": [s.text for s in refs[:50]],
+        "equationsNear": [s.text for s in equations[:10]],
         "window": {"start": start, "end": end},
     }
 
@@ -174,6 +260,7 @@ def build_structured_context_with_limits(
     center_index: int,
     max_chars: int,
     max_tokens: int,
+    tokenizer: Tokenizer = HEURISTIC,
 ) -> tuple[str, dict]:
     meta = extract_structured_context(source, center_index=center_index)
     header_lines = [
@@ -189,14 +276,16 @@ def build_structured_context_with_limits(
     w = meta["window"]
     snippet = source[w["start"] : w["end"]]
     combined = header + snippet
-    ctx = build_context_with_limits(combined, max_chars=max_chars, max_tokens=max_tokens)
+    ast = parse_latex(source).window_ast(w["start"], w["end"])
+    ctx = build_context_with_limits(combined, max_chars=max_chars, max_tokens=max_tokens, ast=ast, tokenizer=tokenizer)
     return ctx, meta
 
 
-def build_context(source: str, max_chars: int) -> str:
+def build_context(source: str, max_chars: int, *, ast: LatexAst | None = None) -> str:
     if max_chars <= 0:
         return ""
-    ast = parse_latex_to_ast(source)
+    if ast is None:
+        ast = parse_latex_to_ast(source)
     header = (
         "LaTeX Context\n"
         f"Sections: {', '.join(ast.sections[:10])}\n"
@@ -210,15 +299,33 @@ def build_context(source: str, max_chars: int) -> str:
 
 def estimate_tokens(text: str) -> int:
     # Heuristic: ~4 chars per token for English-ish text.
-    if not text:
-        return 0
-    return max(1, (len(text) + 3) // 4)
+    return HEURISTIC.count(text)
+
 
+def fit_to_tokens(text: str, max_tokens: int, tokenizer: Tokenizer = HEURISTIC) -> str:
+    """The longest prefix of `text` that is at most `max_tokens` tokens, in O(log n) counts."""
+    if tokenizer.count(text) <= max_tokens:
+        return text
+    # Invariant: text[:lo] fits and text[:hi] does not.
+    lo, hi = 0, len(text)
+    while hi - lo > 1:
+        mid = (lo + hi) // 2
+        if tokenizer.count(text[:mid]) <= max_tokens:
+            lo = mid
+        else:
+            hi = mid
+    return text[:lo]
 
-def build_context_with_limits(source: str, max_chars: int, max_tokens: int) -> str:
+
+def build_context_with_limits(
+    source: str,
+    max_chars: int,
+    max_tokens: int,
+    *,
+    ast: LatexAst | None = None,
+    tokenizer: Tokenizer = HEURISTIC,
+) -> str:
     if max_chars <= 0 or max_tokens <= 0:
         return ""
-    ctx = build_context(source, max_chars=max_chars)
-    while ctx and estimate_tokens(ctx) > max_tokens:
-        ctx = ctx[: max(0, len(ctx) - 100)]
-    return ctx
+    ctx = build_context(source, max_chars=max_chars, ast=ast)
+    return fit_to_tokens(ctx, max_tokens, tokenizer)
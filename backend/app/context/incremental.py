@@ -0,0 +1,145 @@
+from __future__ import annotations
+
+import re
+from collections import OrderedDict
+from dataclasses import dataclass
+from threading import Lock
+from typing import Callable, Generic, TypeVar
+
+# Incremental parsing: a document is split at paragraph boundaries that sit outside every
+# brace group and environment (other than `document`, which spans the whole file), and each
+# chunk is parsed on its own. Chunk results are cached by chunk text, so after an edit only
+# the chunks whose text changed are parsed again, wherever the edit moved them to.
+
+T = TypeVar("T")
+
+# Escapes and comments come first so their braces and `\begin`s are skipped.
+_TOKEN_RE = re.compile(
+    r"\\[\\{}%]"
+    r"|%[^\n]*"
+    r"|\\begin\s*\{([^{}]*)\}"
+    r"|\\end\s*\{([^{}]*)\}"
+    r"|[{}]"
+    r"|\n[ \t]*\n\s*"
+)
+_SPANNING_ENVS = frozenset({"document"})
+DEFAULT_MAX_CHUNKS = 16384
+
+
+def split_chunks(
+    source: str, previous: tuple[str, list[tuple[int, int]]] | None = None
+) -> list[tuple[int, int]]:
+    """
+    (start, end) of each chunk, covering `source` end to end; blank lines stay with the chunk
+    before. With `previous` (an earlier source and its chunks), only the text between the
+    unchanged leading and trailing chunks is scanned again.
+    """
+    if previous is None:
+        return _scan(source, 0, {})[0]
+    old, old_chunks = previous
+    delta = len(source) - len(old)
+    front = 0
+    while front < len(old_chunks):
+        a, b = old_chunks[front]
+        if b > len(source) or not source.startswith(old[a:b], a):
+            break
+        front += 1
+    if front == len(old_chunks) and delta == 0:
+        return list(old_chunks)
+    # The last unchanged leading chunk is scanned again: an edit right after it can move its end.
+    keep = max(0, front - 1)
+    resume = old_chunks[keep - 1][1] if keep else 0
+    back = len(old_chunks)
+    while back > keep + 1:
+        a, b = old_chunks[back - 1]
+        if a + delta <= resume or not source.startswith(old[a:b], a + delta):
+            break
+        back -= 1
+    stops = {old_chunks[i][0] + delta: i for i in range(back, len(old_chunks))}
+    scanned, stop = _scan(source, resume, stops)
+    out = old_chunks[:keep] + scanned
+    if stop is not None:
+        out.extend((a + delta, b + delta) for a, b in old_chunks[stop:])
+    return out
+
+
+def _scan(source: str, start: int, stops: dict[int, int]) -> tuple[list[tuple[int, int]], int | None]:
+    # Chunks from `start`, which must itself be a boundary. Stops at the first boundary found in
+    # `stops`, returning its value, since the rest of the source is then known to match.
+    out: list[tuple[int, int]] = []
+    braces = 0
+    envs: list[str] = []
+    for m in _TOKEN_RE.finditer(source, start):
+        token = m.group()
+        if m.group(1) is not None:
+            if m.group(1).strip() not in _SPANNING_ENVS:
+                envs.append(m.group(1).strip())
+        elif m.group(2) is not None:
+            name = m.group(2).strip()
+            if name in envs:
+                # Unbalanced \end: close back to the matching \begin, as the parser would.
+                del envs[len(envs) - 1 - envs[::-1].index(name):]
+        elif token == "{":
+            braces += 1
+        elif token == "}":
+            braces = max(0, braces - 1)
+        elif token[0] == "\n" and braces == 0 and not envs:
+            out.append((start, m.end()))
+            start = m.end()
+            if start in stops:
+                return out, stops[start]
+    if start < len(source) or not out:
+        out.append((start, len(source)))
+    return out, None
+
+
+@dataclass(frozen=True)
+class ChunkStats:
+    chunks: int
+    parsed: int
+
+
+class IncrementalParser(Generic[T]):
+    """
+    Parses a source chunk by chunk with `parse_chunk`, reusing the results for chunk texts seen
+    in recent versions. Positions in a chunk result are relative to the chunk.
+    """
+
+    def __init__(self, parse_chunk: Callable[[str], T], max_chunks: int = DEFAULT_MAX_CHUNKS):
+        self._parse_chunk = parse_chunk
+        self._max_chunks = max_chunks
+        self._cache: OrderedDict[str, T] = OrderedDict()
+        self._lock = Lock()
+        # The last source parsed and its chunks, so the next version only rescans what changed.
+        self._previous: tuple[str, list[tuple[int, int]]] | None = None
+        self.last = ChunkStats(0, 0)
+
+    def parse(self, source: str) -> list[tuple[int, T]]:
+        out: list[tuple[int, T]] = []
+        parsed = 0
+        with self._lock:
+            previous = self._previous
+        chunks = split_chunks(source, previous)
+        with self._lock:
+            self._previous = (source, chunks)
+        for start, end in chunks:
+            text = source[start:end]
+            with self._lock:
+                result = self._cache.get(text)
+                if result is not None:
+                    self._cache.move_to_end(text)
+            if result is None:
+                result = self._parse_chunk(text)
+                parsed += 1
+                with self._lock:
+                    self._cache[text] = result
+                    while len(self._cache) > self._max_chunks:
+                        self._cache.popitem(last=False)
+            out.append((start, result))
+        self.last = ChunkStats(len(out), parsed)
+        return out
+
+    def clear(self) -> None:
+        with self._lock:
+            self._cache.clear()
+            self._previous = None
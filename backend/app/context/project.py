@@ -0,0 +1,170 @@
+from __future__ import annotations
+
+import posixpath
+from dataclasses import dataclass, field
+
+from app.context.extract import build_structured_context_with_limits, extract_structured_context, fit_to_tokens
+from app.context.symbols import DEF
+from app.modeling.tokenizers import HEURISTIC, Tokenizer
+from app.persistence.store import DocStore
+
+# Context for one file of a multi-file project. The project graph comes from the "file"
+# symbols (\input / \include / \subfile) and the per-file summaries from the section, label
+# and citation definitions of the symbol index, both kept up to date file by file on save,
+# so a request reads only the active file and the few files it links to.
+
+# Share of the character budget that definitions from other files may take.
+_DEFINITIONS_SHARE = 4
+_DEFINITION_LINES = 3
+_SUMMARY_ITEMS = 8
+
+
+@dataclass
+class FileSummary:
+    sections: list[str] = field(default_factory=list)
+    labels: list[str] = field(default_factory=list)
+    bib_keys: list[str] = field(default_factory=list)
+
+    def describe(self) -> str:
+        parts = []
+        for title, items in (("Sections", self.sections), ("Labels", self.labels), ("Bibliography", self.bib_keys)):
+            if items:
+                more = f" (+{len(items) - _SUMMARY_ITEMS})" if len(items) > _SUMMARY_ITEMS else ""
+                parts.append(f"{title}: {', '.join(items[:_SUMMARY_ITEMS])}{more}")
+        return "; ".join(parts)
+
+
+class ProjectGraph:
+    """Which files include which, resolved against the project's paths like LaTeX would."""
+
+    def __init__(self, paths: list[str], uses: list[dict]):
+        known = set(paths)
+        self.includes: dict[str, list[str]] = {}
+        self.included_from: dict[str, list[str]] = {}
+        for use in uses:
+            target = resolve_input(use["name"], use["path"], known)
+            if target is not None and target != use["path"] and target not in self.includes.get(use["path"], []):
+                self.includes.setdefault(use["path"], []).append(target)
+                self.included_from.setdefault(target, []).append(use["path"])
+
+    def ancestors(self, path: str) -> list[str]:
+        """The chain of files that include `path`, from the root down to its parent."""
+        chain: list[str] = []
+        seen = {path}
+        while self.included_from.get(path):
+            path = self.included_from[path][0]
+            if path in seen:
+                break
+            seen.add(path)
+            chain.append(path)
+        return chain[::-1]
+
+    def root(self, path: str) -> str:
+        chain = self.ancestors(path)
+        return chain[0] if chain else path
+
+
+def resolve_input(name: str, from_path: str, paths: set[str]) -> str | None:
+    # \input paths are relative to the main file's directory, \subfile ones to the including
+    # file's; the project root and the including file's directory are tried, with and
+    # without the implied ".tex".
+    for base in dict.fromkeys(("", posixpath.dirname(from_path))):
+        for suffix in ("", ".tex"):
+            candidate = posixpath.normpath(posixpath.join(base, name + suffix))
+            if candidate in paths:
+                return candidate
+    return None
+
+
+def _summaries(store: DocStore, doc_id: str) -> tuple[dict[str, FileSummary], dict[tuple[str, str], dict]]:
+    summaries: dict[str, FileSummary] = {}
+    definitions: dict[tuple[str, str], dict] = {}
+    for kind, attr in (("section", "sections"), ("label", "labels"), ("cite", "bib_keys")):
+        for row in store.find_symbols(doc_id, kind=kind, role=DEF) or []:
+            getattr(summaries.setdefault(row["path"], FileSummary()), attr).append(row["name"])
+            definitions.setdefault((kind, row["name"]), row)
+    return summaries, definitions
+
+
+def _excerpt(text: str, line: int) -> str:
+    lines = text.split("\n")
+    first = max(0, line - 1 - _DEFINITION_LINES)
+    return "\n".join(lines[first:line + _DEFINITION_LINES]).strip("\n")
+
+
+def build_project_context(
+    store: DocStore,
+    doc_id: str,
+    active_path: str,
+    *,
+    center_index: int | None = None,
+    max_chars: int,
+    max_tokens: int,
+    tokenizer: Tokenizer = HEURISTIC,
+) -> tuple[str, dict] | None:
+    """
+    Context around a cursor in `active_path`, preceded by an outline of the files linked to it
+    and followed by excerpts of the definitions it refers to in other files. None if `doc_id`
+    does not exist; ValueError if `active_path` is not one of its files.
+    """
+    paths = store.file_paths(doc_id)
+    if paths is None:
+        return None
+    if active_path not in paths:
+        raise ValueError(f"{active_path!r} is not a file of this document")
+    text = store.read_files(doc_id, [active_path]).get(active_path, "")
+    center = len(text) if center_index is None else max(0, min(center_index, len(text)))
+
+    graph = ProjectGraph(paths, store.find_symbols(doc_id, kind="file") or [])
+    summaries, definitions = _summaries(store, doc_id)
+    ancestors = graph.ancestors(active_path)
+    includes = graph.includes.get(active_path, [])
+    near = extract_structured_context(text, center_index=center)
+
+    # Definitions made in other files of what the text around the cursor refers to.
+    wanted = [("label", n) for n in near["refsNear"]] + [("cite", n) for n in near["citationsNear"]]
+    found = [definitions[k] for k in dict.fromkeys(wanted) if k in definitions and definitions[k]["path"] != active_path]
+    linked = list(dict.fromkeys([*ancestors, *includes, *(row["path"] for row in found)]))
+
+    outline = [
+        "Project Context",
+        f"Active File: {active_path}",
+        f"Root File: {graph.root(active_path)}",
+        f"Included From: {' > '.join(ancestors)}",
+        f"Includes: {', '.join(includes)}",
+        "Linked Files:",
+        *(f"- {p}: {summaries[p].describe()}" for p in linked if p in summaries),
+        "---",
+    ]
+    header = "\n".join(outline) + "\n"
+
+    excerpts: list[str] = []
+    sources = store.read_files(doc_id, sorted({row["path"] for row in found}))
+    budget = max_chars // _DEFINITIONS_SHARE
+    for row in found:
+        excerpt = _excerpt(sources.get(row["path"], ""), row["line"])
+        entry = f"% {row['path']}:{row['line']} ({row['kind']} {row['name']})\n{excerpt}"
+        if len(entry) + 1 > budget:
+            break
+        excerpts.append(entry)
+        budget -= len(entry) + 1
+    footer = "\n---\nReferenced Definitions\n" + "\n".join(excerpts) if excerpts else ""
+
+    reserved = header + footer
+    active, meta = build_structured_context_with_limits(
+        text,
+        center_index=center,
+        max_chars=max(1, max_chars - len(reserved)),
+        max_tokens=max(1, max_tokens - tokenizer.count(reserved)),
+        tokenizer=tokenizer,
+    )
+    ctx = fit_to_tokens((header + active + footer)[:max_chars], max_tokens, tokenizer)
+    meta["project"] = {
+        "activePath": active_path,
+        "root": graph.root(active_path),
+        "includedFrom": ancestors,
+        "includes": includes,
+        "linkedFiles": linked,
+        "definitions": [{"path": r["path"], "kind": r["kind"], "name": r["name"], "line": r["line"]} for r in found],
+    }
+    return ctx, meta
@@ -0,0 +1,51 @@
+from __future__ import annotations
+
+import re
+from dataclasses import dataclass
+
+# A single-pass scanner for LaTeX that needs no parser: one regex alternation walks the text
+# once and emits positioned events in source order. Comments and escaped characters are
+# consumed as tokens of their own so nothing inside them is reported.
+
+HEADINGS = ("part", "chapter", "section", "subsection", "subsubsection", "paragraph", "subparagraph")
+REF_COMMANDS = frozenset("ref eqref pageref autoref nameref vref cref Cref labelcref cpageref".split())
+
+_EVENT_RE = re.compile(
+    r"%[^\n]*"
+    r"|\\(?:[\\%{}]"
+    r"|(?P<heading>" + "|".join(HEADINGS) + r")\*?\s*(?:\[[^\]]*\])?\s*\{(?P<title>(?:[^{}]|\{[^{}]*\})*)\}"
+    r"|label\s*\{(?P<label>[^{}]*)\}"
+    r"|(?:" + "|".join(sorted(REF_COMMANDS)) + r")\*?\s*\{(?P<ref>[^{}]*)\}"
+    r"|cite[a-zA-Z]*\*?(?:\s*\[[^\]]*\]){0,2}\s*\{(?P<cite>[^{}]*)\}"
+    r"|begin\s*\{(?P<begin>[^{}]*)\}"
+    r"|end\s*\{(?P<end>[^{}]*)\}"
+    r")"
+)
+
+
+@dataclass(frozen=True)
+class Event:
+    # "heading" (name is the command, text the title), "label", "ref", "cite" (text is the
+    # key list as written), "begin" / "end" (name is the environment).
+    kind: str
+    name: str
+    text: str
+    # The whole command's span.
+    pos: int
+    end: int
+
+
+def scan_latex(text: str) -> list[Event]:
+    """Every heading, label, ref, cite and environment boundary in `text`, in order of position."""
+    out: list[Event] = []
+    for m in _EVENT_RE.finditer(text):
+        kind = m.lastgroup
+        if kind is None:
+            continue
+        if kind == "title":
+            out.append(Event("heading", m.group("heading"), m.group("title"), m.start(), m.end()))
+        elif kind in ("begin", "end"):
+            out.append(Event(kind, m.group(kind).strip(), "", m.start(), m.end()))
+        else:
+            out.append(Event(kind, "", m.group(kind), m.start(), m.end()))
+    return out
@@ -0,0 +1,143 @@
+from __future__ import annotations
+
+import re
+from bisect import bisect_right
+from dataclasses import dataclass
+from typing import Collection
+
+# Symbols a project defines and uses, found by scanning each file on its own so one file's
+# symbols can be replaced when it is saved. Kinds: "label" (\label / \ref-style uses), "cite"
+# (.bib entries and \bibitem / \cite-style uses), "macro" (\newcommand-style definitions / uses
+# of macros the project defines), "section" (headings, definitions only, named by their title)
+# and "file" (\input / \include / \subfile uses, named by their target as written).
+
+DEF = "def"
+USE = "use"
+
+
+@dataclass(frozen=True)
+class Symbol:
+    kind: str
+    name: str
+    role: str
+    # The name's span in the file (the key inside the braces, or `\name` for macros).
+    start: int
+    end: int
+    line: int
+
+
+_COMMENT_RE = re.compile(r"(?<!\\)%[^\n]*")
+_LABEL_RE = re.compile(r"\\label\s*\{([^{}]*)\}")
+_REF_RE = re.compile(r"\\(?:ref|eqref|pageref|autoref|nameref|vref|cref|Cref|labelcref|cpageref)\*?\s*\{([^{}]*)\}")
+_CITE_RE = re.compile(r"\\(?:[a-zA-Z]*cite[a-zA-Z]*|nocite)\*?(?:\s*\[[^\]]*\]){0,2}\s*\{([^{}]*)\}")
+_BIBITEM_RE = re.compile(r"\\bibitem\s*(?:\[[^\]]*\])?\s*\{([^{}]*)\}")
+_INPUT_RE = re.compile(r"\\(?:input|include|subfile)\s*\{([^{}]*)\}")
+_BIB_ENTRY_RE = re.compile(r"@([a-zA-Z]+)\s*[{(]\s*([^,\s{}()]+)\s*,")
+_MACRO_DEF_RE = re.compile(
+    r"\\(?:(?:re)?newcommand|providecommand|DeclareRobustCommand|DeclareMathOperator)\*?\s*\{?\s*(\\[a-zA-Z@]+)"
+    r"|\\(?:[gex]?def|let)\s*(\\[a-zA-Z@]+)"
+)
+_CONTROL_WORD_RE = re.compile(r"\\[a-zA-Z@]+")
+_HEADING_RE = re.compile(
+    r"\\(?:part|chapter|section|subsection|subsubsection|paragraph|subparagraph)\*?\s*(?:\[[^\]]*\])?\s*\{"
+)
+# Commands whose arguments are indexed as labels, citations or headings above.
+_STRUCTURAL = frozenset(
+    "label ref eqref pageref autoref nameref vref cref Cref labelcref cpageref bibitem nocite "
+    "part chapter section subsection subsubsection paragraph subparagraph "
+    "newcommand renewcommand providecommand DeclareRobustCommand DeclareMathOperator def gdef edef xdef let "
+    "input include subfile".split()
+)
+
+
+def macro_definitions(text: str, path: str = "") -> set[str]:
+    """Names of the macros one file defines."""
+    if path.lower().endswith(".bib"):
+        return set()
+    source = _COMMENT_RE.sub(lambda m: " " * len(m.group()), text)
+    return {(m.group(1) or m.group(2))[1:] for m in _MACRO_DEF_RE.finditer(source)}
+
+
+def extract_symbols(text: str, path: str = "", macros: Collection[str] = ()) -> list[Symbol]:
+    """
+    Every symbol defined or used in one file, in order of position; `path` picks .bib parsing.
+    Macro uses are recorded only for macros defined in this file or named in `macros` (those
+    defined elsewhere in the project), so built-in and package commands are left out.
+    """
+    lines = [m.start() for m in re.finditer("\n", text)]
+
+    def symbol(kind: str, name: str, role: str, start: int) -> Symbol:
+        return Symbol(kind, name, role, start, start + len(name), bisect_right(lines, start - 1) + 1)
+
+    if path.lower().endswith(".bib"):
+        return [
+            symbol("cite", m.group(2), DEF, m.start(2))
+            for m in _BIB_ENTRY_RE.finditer(text)
+            if m.group(1).lower() not in ("string", "preamble", "comment")
+        ]
+
+    # Commented-out text is blanked, keeping offsets, so it defines and uses nothing.
+    source = _COMMENT_RE.sub(lambda m: " " * len(m.group()), text)
+    out: list[Symbol] = []
+
+    def keys(match: re.Match, kind: str, role: str) -> None:
+        pos = match.start(1)
+        for part in match.group(1).split(","):
+            key = part.strip()
+            if key and key != "*":
+                out.append(symbol(kind, key, role, pos + part.index(key)))
+            pos += len(part) + 1
+
+    for m in _LABEL_RE.finditer(source):
+        keys(m, "label", DEF)
+    for m in _REF_RE.finditer(source):
+        keys(m, "label", USE)
+    for m in _CITE_RE.finditer(source):
+        keys(m, "cite", USE)
+    for m in _BIBITEM_RE.finditer(source):
+        keys(m, "cite", DEF)
+    for m in _INPUT_RE.finditer(source):
+        target = m.group(1).strip()
+        if target:
+            out.append(symbol("file", target, USE, m.start(1) + m.group(1).index(target)))
+
+    defined_at: set[int] = set()
+    known = set(macros)
+    for m in _MACRO_DEF_RE.finditer(source):
+        group = 1 if m.group(1) else 2
+        defined_at.add(m.start(group))
+        known.add(m.group(group)[1:])
+        out.append(symbol("macro", m.group(group)[1:], DEF, m.start(group) + 1))
+    known -= _STRUCTURAL
+    if known:
+        for m in _CONTROL_WORD_RE.finditer(source):
+            name = m.group()[1:]
+            if name in known and m.start() not in defined_at:
+                out.append(symbol("macro", name, USE, m.start() + 1))
+
+    for m in _HEADING_RE.finditer(source):
+        end = _closing_brace(source, m.end())
+        title = " ".join(text[m.end():end].split())
+        if title:
+            out.append(Symbol("section", title, DEF, m.end(), end, bisect_right(lines, m.end() - 1) + 1))
+
+    out.sort(key=lambda s: (s.start, s.kind))
+    return out
+
+
+def _closing_brace(text: str, pos: int) -> int:
+    depth = 1
+    i = pos
+    while i < len(text):
+        c = text[i]
+        if c == "\\":
+            i += 2
+            continue
+        if c == "{":
+            depth += 1
+        elif c == "}":
+            depth -= 1
+            if depth == 0:
+                return i
+        i += 1
+    return pos
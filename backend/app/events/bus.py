@@ -0,0 +1,137 @@
+from __future__ import annotations
+
+import asyncio
+import itertools
+import json
+import threading
+from collections import deque
+
+
+class Event:
+    """One published event, serialized once and shared by every subscriber."""
+
+    __slots__ = ("id", "type", "payload")
+
+    def __init__(self, id: int, type: str, payload: str):
+        self.id = id
+        self.type = type
+        self.payload = payload
+
+
+def _encode(id: int, type: str, doc_id: str, data: dict) -> str:
+    return json.dumps({"id": id, "type": type, "doc_id": doc_id, "data": data}, separators=(",", ":"))
+
+
+class Subscription:
+    """
+    A subscriber's bounded queue of events for one document.
+
+    Publishers never wait on a subscriber: when `max_pending` events are queued the oldest is
+    dropped, and the consumer next receives an "overflow" event with the number lost so it can
+    refetch whatever it missed.
+    """
+
+    def __init__(self, bus: EventBus, doc_id: str, max_pending: int, loop: asyncio.AbstractEventLoop):
+        self._bus = bus
+        self.doc_id = doc_id
+        self._max_pending = max_pending
+        self._loop = loop
+        self._pending: deque[Event] = deque()
+        self._lock = threading.Lock()
+        self._dropped = 0
+        self._waiting = False
+        self._ready = asyncio.Event()
+        self.closed = False
+
+    def _offer(self, event: Event) -> None:
+        with self._lock:
+            if len(self._pending) >= self._max_pending:
+                self._pending.popleft()
+                self._dropped += 1
+            self._pending.append(event)
+            wake = self._waiting
+            # One wakeup per wait, not one per event.
+            self._waiting = False
+        if wake:
+            self._loop.call_soon_threadsafe(self._ready.set)
+
+    def get_nowait(self) -> Event | None:
+        with self._lock:
+            return self._take_locked()
+
+    def _take_locked(self) -> Event | None:
+        if self._dropped:
+            dropped, self._dropped = self._dropped, 0
+            return Event(0, "overflow", _encode(0, "overflow", self.doc_id, {"dropped": dropped}))
+        if self._pending:
+            return self._pending.popleft()
+        return None
+
+    async def get(self, timeout: float | None = None) -> Event | None:
+        """Wait for the next event; None if `timeout` seconds pass without one."""
+        while True:
+            with self._lock:
+                event = self._take_locked()
+                if event is not None:
+                    return event
+                self._ready.clear()
+                self._waiting = True
+            try:
+                await asyncio.wait_for(self._ready.wait(), timeout)
+            except asyncio.TimeoutError:
+                with self._lock:
+                    self._waiting = False
+                    event = self._take_locked()
+                return event
+
+    def close(self) -> None:
+        if not self.closed:
+            self.closed = True
+            self._bus._unsubscribe(self)
+
+
+class EventBus:
+    """
+    In-process pub/sub keyed by document id.
+
+    publish() may be called from any thread (sync endpoints run in a thread pool); subscribers
+    consume on their event loop. Each document's subscriber list is replaced on (un)subscribe,
+    so publishing only takes the bus lock long enough to read it.
+    """
+
+    def __init__(self, max_pending: int = 256):
+        self._max_pending = max_pending
+        self._lock = threading.Lock()
+        self._subs: dict[str, tuple[Subscription, ...]] = {}
+        self._ids = itertools.count(1)
+
+    def subscribe(self, doc_id: str, max_pending: int | None = None) -> Subscription:
+        """Subscribe from a coroutine; events are delivered on the running loop."""
+        sub = Subscription(self, doc_id, max_pending or self._max_pending, asyncio.get_running_loop())
+        with self._lock:
+            self._subs[doc_id] = self._subs.get(doc_id, ()) + (sub,)
+        return sub
+
+    def _unsubscribe(self, sub: Subscription) -> None:
+        with self._lock:
+            remaining = tuple(s for s in self._subs.get(sub.doc_id, ()) if s is not sub)
+            if remaining:
+                self._subs[sub.doc_id] = remaining
+            else:
+                self._subs.pop(sub.doc_id, None)
+
+    def publish(self, doc_id: str, type: str, data: dict) -> int:
+        """Deliver an event to the document's current subscribers; returns how many there were."""
+        with self._lock:
+            subs = self._subs.get(doc_id)
+            if not subs:
+                return 0
+            event_id = next(self._ids)
+        event = Event(event_id, type, _encode(event_id, type, doc_id, data))
+        for sub in subs:
+            sub._offer(event)
+        return len(subs)
+
+    def subscriber_count(self, doc_id: str) -> int:
+        with self._lock:
+            return len(self._subs.get(doc_id, ()))
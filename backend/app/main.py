@@ -13,6 +13,9 @@ from app.api.auth import router as auth_router
 from app.api.presence import router as presence_router
 from app.api.share import router as share_router
 from app.api.ollama import router as ollama_router
+from app.api.stats import router as stats_router
+from app.api.events import router as events_router
+from app.api.collab import router as collab_router
 
 app = FastAPI(title="Verta Backend", version="0.1.0")
 
@@ -20,6 +23,8 @@ app.add_exception_handler(HTTPException, http_exception_handler)
 
 app.include_router(model_router, prefix="/api/model", tags=["model"])
 app.include_router(docs_router, prefix="/api/doc", tags=["doc"])
+app.include_router(events_router, prefix="/api/doc", tags=["events"])
+app.include_router(collab_router, prefix="/api/doc", tags=["collab"])
 app.include_router(latex_router, prefix="/api/latex", tags=["latex"])
 app.include_router(context_router, prefix="/api/context", tags=["context"])
 app.include_router(local_models_router, prefix="/api/local-models", tags=["local-models"])
@@ -29,3 +34,4 @@ app.include_router(auth_router, prefix="/api/auth", tags=["auth"])
 app.include_router(presence_router, prefix="/api/presence", tags=["presence"])
 app.include_router(share_router, prefix="/share", tags=["share"])
 app.include_router(ollama_router, prefix="/api/ollama", tags=["ollama"])
+app.include_router(stats_router, prefix="/api/stats", tags=["stats"])
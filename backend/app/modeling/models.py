@@ -31,6 +31,10 @@ class CompletionRequest(BaseModel):
     sourceLatex: str | None = None
     maxContextChars: int = 4000
     maxContextTokens: int = 1000
+    # Build the context from a stored multi-file document around a cursor in one of its files.
+    docId: str | None = None
+    activePath: str | None = None
+    cursorIndex: int | None = None
     prompt: str
     options: CompletionOptions = Field(default_factory=CompletionOptions)
 
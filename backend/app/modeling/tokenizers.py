@@ -0,0 +1,114 @@
+from __future__ import annotations
+
+from pathlib import Path
+from threading import Lock
+from typing import Protocol
+
+from app.modeling.models import ModelConfig
+
+
+class Tokenizer(Protocol):
+    name: str
+
+    def count(self, text: str) -> int:
+        """Number of tokens the model would see for `text`."""
+        ...
+
+
+class HeuristicTokenizer:
+    """~4 chars per token for English-ish text; the default when no vocabulary is on disk."""
+
+    name = "heuristic"
+
+    def count(self, text: str) -> int:
+        if not text:
+            return 0
+        return max(1, (len(text) + 3) // 4)
+
+
+class HuggingFaceTokenizer:
+    """A BPE / WordPiece / Unigram vocabulary saved as a Hugging Face `tokenizer.json`."""
+
+    def __init__(self, path: str | Path):
+        try:
+            from tokenizers import Tokenizer as _Tokenizer  # type: ignore
+        except ImportError:
+            raise RuntimeError("A tokenizer.json vocabulary requires the tokenizers package") from None
+        self._tokenizer = _Tokenizer.from_file(str(path))
+        self.name = f"hf:{Path(path).name}"
+
+    def count(self, text: str) -> int:
+        return len(self._tokenizer.encode(text, add_special_tokens=False).ids)
+
+
+class SentencePieceTokenizer:
+    """A SentencePiece `.model` file."""
+
+    def __init__(self, path: str | Path):
+        try:
+            import sentencepiece  # type: ignore
+        except ImportError:
+            raise RuntimeError("A SentencePiece vocabulary requires the sentencepiece package") from None
+        self._processor = sentencepiece.SentencePieceProcessor(model_file=str(path))
+        self.name = f"spm:{Path(path).name}"
+
+    def count(self, text: str) -> int:
+        return len(self._processor.encode(text))
+
+
+HEURISTIC = HeuristicTokenizer()
+
+
+class TokenizerRegistry:
+    """
+    Tokenizers for model configs, loaded from vocabulary files in `vocab_dir`. A config uses
+    `settings["tokenizer"]` if given, else its model id, as the name of `<name>.json`,
+    `<name>.model`, `<name>/tokenizer.json` or `<name>/tokenizer.model`. Models without a
+    vocabulary on disk, or whose vocabulary cannot be loaded, get the heuristic.
+    """
+
+    def __init__(self, vocab_dir: str | Path | None = None):
+        self._dir = Path(vocab_dir) if vocab_dir else None
+        self._loaded: dict[Path, Tokenizer] = {}
+        self._registered: dict[str, Tokenizer] = {}
+        self._lock = Lock()
+
+    def register(self, name: str, tokenizer: Tokenizer) -> None:
+        with self._lock:
+            self._registered[name] = tokenizer
+
+    def get(self, config: ModelConfig | None) -> Tokenizer:
+        if config is None:
+            return HEURISTIC
+        name = str(config.settings.get("tokenizer") or config.id)
+        with self._lock:
+            registered = self._registered.get(name)
+        if registered is not None:
+            return registered
+        path = self._find(name)
+        if path is None:
+            return HEURISTIC
+        with self._lock:
+            tokenizer = self._loaded.get(path)
+        if tokenizer is None:
+            try:
+                tokenizer = SentencePieceTokenizer(path) if path.suffix == ".model" else HuggingFaceTokenizer(path)
+            except Exception:
+                tokenizer = HEURISTIC
+            with self._lock:
+                tokenizer = self._loaded.setdefault(path, tokenizer)
+        return tokenizer
+
+    def _find(self, name: str) -> Path | None:
+        # Names are plain file names; anything with a path separator is ignored.
+        if self._dir is None or not name or Path(name).name != name or name in (".", ".."):
+            return None
+        for candidate in (
+            self._dir / f"{name}.json",
+            self._dir / f"{name}.model",
+            self._dir / name / "tokenizer.json",
+            self._dir / name / "tokenizer.model",
+        ):
+            if candidate.is_file():
+                return candidate
+        return None
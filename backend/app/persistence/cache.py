@@ -0,0 +1,109 @@
+from __future__ import annotations
+
+import threading
+from collections import OrderedDict
+
+from app.persistence.models import DocResponse
+
+
+def _utf8_len(text: str) -> int:
+    # isascii() is a flag check on CPython strings, so ASCII sources skip the encode.
+    return len(text) if text.isascii() else len(text.encode("utf-8"))
+
+
+class DocCache:
+    """
+    LRU of decoded documents, bounded by entry count and total UTF-8 size of their content.
+
+    Each doc id holds at most one entry tagged with the version it was read at; a lookup with
+    any other version is a miss, so a stale entry can never be served.
+    """
+
+    def __init__(self, max_entries: int = 512, max_bytes: int = 64 * 1024 * 1024):
+        self._max_entries = max_entries
+        self._max_bytes = max_bytes
+        self._entries: OrderedDict[str, tuple[int, DocResponse, int]] = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+
+    def get(self, doc_id: str, version: int) -> DocResponse | None:
+        with self._lock:
+            entry = self._entries.get(doc_id)
+            if entry is None or entry[0] != version:
+                self._misses += 1
+                return None
+            self._entries.move_to_end(doc_id)
+            self._hits += 1
+            return entry[1]
+
+    def put(self, doc_id: str, version: int, doc: DocResponse) -> None:
+        size = _utf8_len(doc.content)
+        if size > self._max_bytes:
+            return
+        with self._lock:
+            self._discard(doc_id)
+            self._entries[doc_id] = (version, doc, size)
+            self._bytes += size
+            while len(self._entries) > self._max_entries or self._bytes > self._max_bytes:
+                _, (_, _, evicted) = self._entries.popitem(last=False)
+                self._bytes -= evicted
+                self._evictions += 1
+
+    def invalidate(self, doc_id: str) -> None:
+        with self._lock:
+            self._discard(doc_id)
+
+    def _discard(self, doc_id: str) -> None:
+        entry = self._entries.pop(doc_id, None)
+        if entry is not None:
+            self._bytes -= entry[2]
+
+    def stats(self) -> dict[str, int]:
+        with self._lock:
+            return {
+                "hits": self._hits,
+                "misses": self._misses,
+                "evictions": self._evictions,
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+            }
+
+
+class SearchCache:
+    """
+    LRU of recent search results.
+
+    Keys include the index generation the result was computed at, so after a reindex the old
+    entries can no longer be looked up and simply age out; nothing stale is ever returned.
+    """
+
+    def __init__(self, max_entries: int = 256):
+        self._max_entries = max_entries
+        self._entries: OrderedDict[tuple, dict] = OrderedDict()
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+
+    def get(self, key: tuple) -> dict | None:
+        with self._lock:
+            value = self._entries.get(key)
+            if value is None:
+                self._misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self._hits += 1
+            return value
+
+    def put(self, key: tuple, value: dict) -> None:
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self._max_entries:
+                self._entries.popitem(last=False)
+
+    def stats(self) -> dict[str, int]:
+        with self._lock:
+            return {"hits": self._hits, "misses": self._misses, "entries": len(self._entries)}
@@ -0,0 +1,110 @@
+from __future__ import annotations
+
+import hashlib
+from abc import ABC, abstractmethod
+from pathlib import Path
+
+from app.persistence.pool import ConnectionPool, get_pool
+
+
+class StorageEngine(ABC):
+    """
+    Where DocStore keeps its tables.
+
+    Per-document data (content, files, revisions, index, comments, logs) lives in the
+    pool returned by `pool_for(doc_id)`. Users, sessions and share tokens, which are looked up
+    without a doc id, live in `global_pool`.
+    """
+
+    @property
+    @abstractmethod
+    def global_pool(self) -> ConnectionPool: ...
+
+    @abstractmethod
+    def shards(self) -> list[ConnectionPool]:
+        """Pools holding documents, in a stable order."""
+
+    @abstractmethod
+    def shard_index(self, doc_id: str) -> int: ...
+
+    def pool_for(self, doc_id: str) -> ConnectionPool:
+        return self.shards()[self.shard_index(doc_id)]
+
+    def pools(self) -> list[ConnectionPool]:
+        """Every distinct pool, global first."""
+        out = [self.global_pool]
+        for pool in self.shards():
+            if pool is not self.global_pool:
+                out.append(pool)
+        return out
+
+
+def _check_layout(pool: ConnectionPool, shards: int, *, holds_docs: bool) -> None:
+    """
+    Record `shards` as `pool`'s layout on first use, and raise ValueError if it was created with
+    another one, or if it keeps documents itself but is opened as a sharded layout's global file.
+    """
+    with pool.write() as conn:
+        conn.execute("CREATE TABLE IF NOT EXISTS storage_layout (shards INTEGER NOT NULL)")
+        row = conn.execute("SELECT shards FROM storage_layout").fetchone()
+        has_table = conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'docs'").fetchone()
+        has_docs = bool(has_table and conn.execute("SELECT 1 FROM docs LIMIT 1").fetchone())
+        if has_docs and not holds_docs:
+            raise ValueError(
+                f"{pool.db_path.name} already holds documents in a single file; a {shards}-shard layout would hide them"
+            )
+        # A single file with no documents yet can still become sharded.
+        if row is not None and row[0] != shards and (row[0] != 1 or has_docs):
+            raise ValueError(f"database was created with {row[0]} shard(s), not {shards}")
+        conn.execute("DELETE FROM storage_layout")
+        conn.execute("INSERT INTO storage_layout (shards) VALUES (?)", (shards,))
+
+
+class SingleFileEngine(StorageEngine):
+    """Everything in one database file; all writes share one write lock."""
+
+    def __init__(self, db_path: Path, pool: ConnectionPool | None = None):
+        self._pool = pool or get_pool(db_path)
+        _check_layout(self._pool, 1, holds_docs=True)
+
+    @property
+    def global_pool(self) -> ConnectionPool:
+        return self._pool
+
+    def shards(self) -> list[ConnectionPool]:
+        return [self._pool]
+
+    def shard_index(self, doc_id: str) -> int:
+        return 0
+
+
+class ShardedEngine(StorageEngine):
+    """
+    Documents spread over `shards` database files by a hash of their id, each with its own
+    writer, so saves to different documents can commit in parallel. Unproven: in
+    benchmarks/bench_store_shards.py it ties with a single file (saves are CPU-bound and
+    group commit already batches concurrent writers), so SingleFileEngine stays the default.
+
+    The shard count is recorded in the global database on first use; reopening with another
+    count, or opening a single-file database that already holds documents, raises ValueError
+    rather than silently routing documents to the wrong file.
+    """
+
+    def __init__(self, root: Path, shards: int, name: str = "verta"):
+        if shards < 1:
+            raise ValueError("shards must be at least 1")
+        self._global = get_pool(root / f"{name}.sqlite3")
+        self._shards = [get_pool(root / f"{name}-shard-{i}.sqlite3") for i in range(shards)]
+        _check_layout(self._global, shards, holds_docs=False)
+
+    @property
+    def global_pool(self) -> ConnectionPool:
+        return self._global
+
+    def shards(self) -> list[ConnectionPool]:
+        return self._shards
+
+    def shard_index(self, doc_id: str) -> int:
+        # Stable across processes, unlike hash().
+        digest = hashlib.blake2b(doc_id.encode("utf-8"), digest_size=8).digest()
+        return int.from_bytes(digest, "big") % len(self._shards)
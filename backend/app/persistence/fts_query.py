@@ -0,0 +1,30 @@
+from __future__ import annotations
+
+import re
+
+# Runs of letters and digits: what FTS5's unicode61 tokenizer keeps as one token. Everything
+# else (":", "-", "\", "_", quotes, operators) separates tokens, as it does in the index.
+_WORD = re.compile(r"[^\W_]+")
+# A "quoted phrase" (closing quote optional while typing) or a bare whitespace-separated term.
+_TERM = re.compile(r'"([^"]*)"?|(\S+)')
+
+
+def compile_query(text: str, prefix: bool = False) -> str | None:
+    """
+    Turn what a user typed into an FTS5 MATCH expression that cannot be a syntax error.
+
+    Each term or quoted phrase becomes a quoted phrase of its words, so `sec:intro` matches the
+    words sec and intro in sequence, and AND/OR/NOT, `*` and `-` are ordinary text. Terms are
+    ANDed. With `prefix` the last term also matches words it begins, unless the input ends in
+    whitespace or a closing quote: search-as-you-type. Returns None if nothing is searchable.
+    """
+    phrases = []
+    for quoted, bare in _TERM.findall(text):
+        words = _WORD.findall(quoted or bare)
+        if words:
+            phrases.append('"' + " ".join(words) + '"')
+    if not phrases:
+        return None
+    if prefix and not text[-1].isspace() and not (text.endswith('"') and text.count('"') % 2 == 0):
+        phrases[-1] += " *"
+    return " ".join(phrases)
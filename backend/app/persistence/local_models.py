@@ -6,6 +6,9 @@ from dataclasses import dataclass
 from pathlib import Path
 from typing import Any
 
+from app.persistence.migrations import Migration, add_column, migrate
+from app.persistence.pool import ConnectionPool, get_pool
+
 
 @dataclass(frozen=True)
 class LocalModel:
@@ -18,47 +21,35 @@ class LocalModel:
 
 
 class LocalModelStore:
-    def __init__(self, db_path: Path):
+    def __init__(self, db_path: Path, pool: ConnectionPool | None = None):
         self._db_path = db_path
+        self._pool = pool or get_pool(db_path)
         self._init()
 
-    def _connect(self) -> sqlite3.Connection:
-        conn = sqlite3.connect(self._db_path)
-        conn.row_factory = sqlite3.Row
-        return conn
-
     def _init(self) -> None:
-        self._db_path.parent.mkdir(parents=True, exist_ok=True)
-        with self._connect() as conn:
-            conn.execute(
-                """
-                CREATE TABLE IF NOT EXISTS local_models (
-                  id TEXT PRIMARY KEY,
-                  runtime TEXT NOT NULL,
-                  file_name TEXT NOT NULL,
-                  sha256 TEXT,
-                  source_url TEXT,
-                  settings_json TEXT NOT NULL
-                )
-                """
-            )
-            self._ensure_columns(conn)
-            conn.commit()
+        with self._pool.write() as conn:
+            migrate(conn, "local_models", [Migration(1, "baseline schema", self._create_baseline)])
 
-    def _ensure_columns(self, conn: sqlite3.Connection) -> None:
+    def _create_baseline(self, conn: sqlite3.Connection) -> None:
+        conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS local_models (
+              id TEXT PRIMARY KEY,
+              runtime TEXT NOT NULL,
+              file_name TEXT NOT NULL,
+              sha256 TEXT,
+              source_url TEXT,
+              settings_json TEXT NOT NULL
+            )
+            """
+        )
+        # Tables from before versioning may predate these columns.
+        add_column(conn, "local_models", "file_name", "TEXT NOT NULL DEFAULT ''")
+        add_column(conn, "local_models", "sha256", "TEXT")
+        add_column(conn, "local_models", "source_url", "TEXT")
         cols = {r["name"] for r in conn.execute("PRAGMA table_info(local_models)").fetchall()}
-        if "file_name" not in cols:
-            conn.execute("ALTER TABLE local_models ADD COLUMN file_name TEXT NOT NULL DEFAULT ''")
-        if "sha256" not in cols:
-            conn.execute("ALTER TABLE local_models ADD COLUMN sha256 TEXT")
-        if "source_url" not in cols:
-            conn.execute("ALTER TABLE local_models ADD COLUMN source_url TEXT")
-        if "model_path" in cols and "file_name" in cols:
-            # Best-effort migration from older schema; ignore errors if column doesn't exist.
-            try:
-                conn.execute("UPDATE local_models SET file_name = model_path WHERE file_name = ''")
-            except sqlite3.Error:
-                pass
+        if "model_path" in cols:
+            conn.execute("UPDATE local_models SET file_name = model_path WHERE file_name = ''")
 
     def upsert(
         self,
@@ -70,16 +61,15 @@ class LocalModelStore:
         settings: dict[str, Any],
     ) -> LocalModel:
         settings_json = json.dumps(settings or {})
-        with self._connect() as conn:
+        with self._pool.write() as conn:
             conn.execute(
                 "INSERT OR REPLACE INTO local_models (id, runtime, file_name, sha256, source_url, settings_json) VALUES (?, ?, ?, ?, ?, ?)",
                 (id, runtime, file_name, sha256, source_url, settings_json),
             )
-            conn.commit()
         return self.get(id)
 
     def get(self, id: str) -> LocalModel | None:
-        with self._connect() as conn:
+        with self._pool.read() as conn:
             row = conn.execute("SELECT * FROM local_models WHERE id = ?", (id,)).fetchone()
             if row is None:
                 return None
@@ -93,7 +83,7 @@ class LocalModelStore:
             )
 
     def list(self) -> list[LocalModel]:
-        with self._connect() as conn:
+        with self._pool.read() as conn:
             rows = conn.execute("SELECT * FROM local_models ORDER BY id ASC").fetchall()
             return [
                 LocalModel(
@@ -108,7 +98,6 @@ class LocalModelStore:
             ]
 
     def delete(self, id: str) -> bool:
-        with self._connect() as conn:
+        with self._pool.write() as conn:
             cur = conn.execute("DELETE FROM local_models WHERE id = ?", (id,))
-            conn.commit()
             return cur.rowcount > 0
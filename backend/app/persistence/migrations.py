@@ -0,0 +1,106 @@
+from __future__ import annotations
+
+import logging
+import sqlite3
+import time
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Callable, Sequence
+
+logger = logging.getLogger(__name__)
+
+# Stores sharing a database file each own a namespace in schema_versions, so DocStore and
+# LocalModelStore can evolve their tables independently.
+
+
+@dataclass(frozen=True)
+class Migration:
+    version: int
+    description: str
+    apply: Callable[[sqlite3.Connection], None]
+
+
+def schema_version(conn: sqlite3.Connection, namespace: str) -> int:
+    _ensure_versions_table(conn)
+    row = conn.execute("SELECT version FROM schema_versions WHERE namespace = ?", (namespace,)).fetchone()
+    return row[0] if row is not None else 0
+
+
+def migrate(conn: sqlite3.Connection, namespace: str, migrations: Sequence[Migration]) -> int:
+    """
+    Apply the migrations newer than the recorded version, in order, and record each one.
+
+    Run inside the caller's write transaction: a failing step rolls back with everything before
+    it, and concurrent processes serialize on the write lock instead of migrating twice.
+    """
+    current = schema_version(conn, namespace)
+    for migration in sorted(migrations, key=lambda m: m.version):
+        if migration.version <= current:
+            continue
+        logger.info("Migrating %s schema to v%d: %s", namespace, migration.version, migration.description)
+        migration.apply(conn)
+        conn.execute(
+            """
+            INSERT INTO schema_versions (namespace, version, applied_at) VALUES (?, ?, ?)
+            ON CONFLICT(namespace) DO UPDATE SET version = excluded.version, applied_at = excluded.applied_at
+            """,
+            (namespace, migration.version, int(time.time() * 1000)),
+        )
+        current = migration.version
+    return current
+
+
+def _ensure_versions_table(conn: sqlite3.Connection) -> None:
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS schema_versions (
+          namespace TEXT PRIMARY KEY,
+          version INTEGER NOT NULL,
+          applied_at INTEGER NOT NULL
+        )
+        """
+    )
+
+
+def add_column(conn: sqlite3.Connection, table: str, column: str, decl: str) -> bool:
+    """Add a column unless it exists; databases from before versioning may already have it."""
+    cols = {r[1] for r in conn.execute(f"PRAGMA table_info({table})").fetchall()}
+    if column in cols:
+        return False
+    conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {decl}")
+    return True
+
+
+def rebuild_table(conn: sqlite3.Connection, table: str, create_sql: str, select: dict[str, str]) -> None:
+    """
+    Recreate `table` from `create_sql` (with `{table}` as the name placeholder), copying rows
+    through the `select` column -> expression mapping. Indexes on the table must be recreated.
+    """
+    tmp = f"{table}__new"
+    conn.execute(f"DROP TABLE IF EXISTS {tmp}")
+    conn.execute(create_sql.format(table=tmp))
+    conn.execute(
+        f"INSERT INTO {tmp} ({', '.join(select)}) SELECT {', '.join(select.values())} FROM {table}"
+    )
+    conn.execute(f"DROP TABLE {table}")
+    conn.execute(f"ALTER TABLE {tmp} RENAME TO {table}")
+
+
+def iso_to_epoch_ms(value: str | int | None) -> int | None:
+    """Convert an ISO-8601 timestamp (naive means UTC) to epoch milliseconds."""
+    if value is None or isinstance(value, int):
+        return value
+    if value.isdigit():
+        # Already epoch milliseconds, written into a TEXT column by an earlier step.
+        return int(value)
+    try:
+        dt = datetime.fromisoformat(value)
+    except ValueError:
+        return None
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return int(dt.timestamp() * 1000)
+
+
+def register_functions(conn: sqlite3.Connection) -> None:
+    conn.create_function("iso_to_epoch_ms", 1, iso_to_epoch_ms, deterministic=True)
@@ -1,6 +1,7 @@
 from typing import Any
 
 from pydantic import BaseModel, Field
+from pydantic.config import ConfigDict
 
 
 class DocCreateRequest(BaseModel):
@@ -21,3 +22,43 @@ class DocResponse(BaseModel):
     title: str | None = None
     content: str = ""
     settings: dict[str, Any] = Field(default_factory=dict)
+    version: int = 0
+
+
+class DocFileEntry(BaseModel):
+    type: str = "file"
+    content: str | None = None
+
+    model_config = ConfigDict(extra="allow")
+
+
+class DocFilesPatchRequest(BaseModel):
+    upsert: dict[str, DocFileEntry] = Field(default_factory=dict)
+    delete: list[str] = Field(default_factory=list)
+
+    model_config = ConfigDict(
+        json_schema_extra={
+            "examples": [
+                {"upsert": {"chapters/intro.tex": {"type": "file", "content": "\\section{Intro}"}}, "delete": ["old.tex"]},
+            ]
+        }
+    )
+
+
+class DocFilesPatchResponse(BaseModel):
+    id: str
+    upserted: list[str]
+    deleted: list[str]
+    version: int = 0
+
+
+class DocSummary(BaseModel):
+    id: str
+    title: str | None = None
+    size: int = 0
+    updated_at: str | None = None
+
+
+class DocSummaryPage(BaseModel):
+    items: list[DocSummary]
+    nextCursor: str | None = None
@@ -0,0 +1,250 @@
+from __future__ import annotations
+
+import sqlite3
+import threading
+import time
+import weakref
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Iterator
+
+
+class ConnectionPool:
+    """
+    Long-lived SQLite connections for one database file.
+
+    Reads use one connection per thread, so concurrent requests never share a cursor, and
+    each read block is one transaction over a single snapshot.
+    Writes go through a single connection serialized by a lock. The database runs in
+    WAL mode, so readers keep reading the last committed snapshot while a write is open.
+
+    Concurrent writes are group-committed: each write block runs in a savepoint of a shared
+    transaction, and a block that finishes while other writers are queued leaves the
+    transaction open for them instead of committing. The last writer in line (or the
+    `max_batch`-th, or a waiter after `max_batch_delay_ms`) commits for everyone. write()
+    returns only once the block's changes are committed.
+    """
+
+    def __init__(
+        self,
+        db_path: Path,
+        *,
+        cache_size_kib: int = 16_384,
+        mmap_size: int = 256 * 1024 * 1024,
+        busy_timeout_ms: int = 5_000,
+        max_batch: int = 64,
+        max_batch_delay_ms: float = 5.0,
+        synchronous: str = "NORMAL",
+    ):
+        self._db_path = db_path
+        self._cache_size_kib = cache_size_kib
+        self._mmap_size = mmap_size
+        self._busy_timeout_ms = busy_timeout_ms
+        if synchronous.upper() not in ("OFF", "NORMAL", "FULL", "EXTRA"):
+            raise ValueError(f"unknown synchronous mode: {synchronous}")
+        self._synchronous = synchronous.upper()
+        self._max_batch = max(1, max_batch)
+        self._max_batch_delay = max(0.0, max_batch_delay_ms) / 1000
+        self._local = threading.local()
+        # Held weakly: a reader is closed when its thread exits and drops its thread-locals.
+        self._readers: weakref.WeakSet[_Reader] = weakref.WeakSet()
+        self._readers_lock = threading.Lock()
+        self._write_lock = threading.RLock()
+        # Group-commit state. Batches are numbered; `_batch` is the open (or last) one.
+        self._commit_cond = threading.Condition(threading.Lock())
+        self._queued = 0
+        self._batch = 0
+        self._pending = 0
+        self._committed = 0
+        self._failed: dict[int, BaseException] = {}
+        self._writes = 0
+        self._commits = 0
+        self._db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._writer = self._open(check_same_thread=False)
+        self._writer.execute("PRAGMA journal_mode=WAL")
+
+    @property
+    def db_path(self) -> Path:
+        return self._db_path
+
+    def _open(self, *, check_same_thread: bool = True) -> sqlite3.Connection:
+        # isolation_level=None: transactions are opened explicitly by write().
+        conn = sqlite3.connect(self._db_path, isolation_level=None, check_same_thread=check_same_thread)
+        conn.row_factory = sqlite3.Row
+        conn.execute(f"PRAGMA busy_timeout={int(self._busy_timeout_ms)}")
+        conn.execute(f"PRAGMA synchronous={self._synchronous}")
+        conn.execute(f"PRAGMA cache_size=-{int(self._cache_size_kib)}")
+        conn.execute(f"PRAGMA mmap_size={int(self._mmap_size)}")
+        conn.execute("PRAGMA temp_store=MEMORY")
+        return conn
+
+    def _reader(self) -> sqlite3.Connection:
+        reader = getattr(self._local, "reader", None)
+        if reader is None:
+            # check_same_thread=False only so the connection can be closed from whichever
+            # thread finalizes it; it is used by its own thread alone.
+            conn = self._open(check_same_thread=False)
+            conn.execute("PRAGMA query_only=1")
+            reader = _Reader(conn)
+            self._local.reader = reader
+            with self._readers_lock:
+                self._readers.add(reader)
+        return reader.conn
+
+    @contextmanager
+    def read(self) -> Iterator[sqlite3.Connection]:
+        """
+        Yield this thread's read-only connection inside a read transaction, so every statement
+        in the block sees the same committed snapshot. Nested calls join the outer block.
+        """
+        conn = self._reader()
+        if conn.in_transaction:
+            yield conn
+            return
+        conn.execute("BEGIN")
+        try:
+            yield conn
+        finally:
+            if conn.in_transaction:
+                conn.execute("COMMIT")
+
+    @contextmanager
+    def write(self) -> Iterator[sqlite3.Connection]:
+        """
+        Yield the writer connection inside a transaction.
+
+        Returns once the block's changes are committed (possibly together with other
+        writers' blocks) and rolls back only this block on error. Nested calls from the
+        same thread join the outer block.
+        """
+        depth = getattr(self._local, "write_depth", 0)
+        if depth:
+            self._local.write_depth = depth + 1
+            try:
+                yield self._writer
+            finally:
+                self._local.write_depth = depth
+            return
+
+        with self._commit_cond:
+            self._queued += 1
+        self._write_lock.acquire()
+        with self._commit_cond:
+            self._queued -= 1
+        self._local.write_depth = 1
+        try:
+            if not self._writer.in_transaction:
+                self._writer.execute("BEGIN IMMEDIATE")
+                self._batch += 1
+            batch = self._batch
+            self._writer.execute("SAVEPOINT write_block")
+            try:
+                yield self._writer
+            except BaseException as exc:
+                if self._writer.in_transaction:
+                    self._writer.execute("ROLLBACK TO write_block")
+                    self._writer.execute("RELEASE write_block")
+                elif self._pending:
+                    # SQLite abandoned the whole transaction, other blocks' changes included.
+                    self._settle_locked(batch, exc)
+                raise
+            self._writer.execute("RELEASE write_block")
+            self._pending += 1
+            self._writes += 1
+        finally:
+            self._local.write_depth = 0
+            try:
+                with self._commit_cond:
+                    queued = self._queued
+                if self._writer.in_transaction and (queued == 0 or self._pending >= self._max_batch):
+                    self._commit_locked()
+            finally:
+                self._write_lock.release()
+        self._await_commit(batch)
+
+    def _commit_locked(self) -> None:
+        error: BaseException | None = None
+        try:
+            self._writer.execute("COMMIT")
+        except sqlite3.Error as exc:
+            error = exc
+            if self._writer.in_transaction:
+                self._writer.execute("ROLLBACK")
+        self._settle_locked(self._batch, error)
+
+    def _settle_locked(self, batch: int, error: BaseException | None) -> None:
+        with self._commit_cond:
+            if error is not None:
+                self._failed = {b: e for b, e in self._failed.items() if b > batch - 64}
+                self._failed[batch] = error
+            else:
+                self._commits += 1
+            self._committed = batch
+            self._pending = 0
+            self._commit_cond.notify_all()
+
+    def _await_commit(self, batch: int) -> None:
+        deadline = time.monotonic() + self._max_batch_delay
+        with self._commit_cond:
+            while self._committed < batch:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._commit_cond.wait(remaining)
+        if self._committed < batch:
+            # Whoever was next in line is taking too long; commit what is there.
+            with self._write_lock:
+                if self._committed < batch:
+                    self._commit_locked()
+        with self._commit_cond:
+            error = self._failed.get(batch)
+        if error is not None:
+            raise sqlite3.OperationalError(f"group commit failed: {error}") from error
+
+    def stats(self) -> dict[str, int]:
+        with self._commit_cond:
+            return {"writes": self._writes, "commits": self._commits}
+
+    def close(self) -> None:
+        with self._readers_lock:
+            readers = list(self._readers)
+            self._readers.clear()
+        for reader in readers:
+            reader.close()
+        with self._write_lock:
+            if self._writer.in_transaction:
+                self._commit_locked()
+            self._writer.close()
+
+
+class _Reader:
+    """One thread's read connection, closed when the thread's locals are dropped."""
+
+    __slots__ = ("conn", "__weakref__")
+
+    def __init__(self, conn: sqlite3.Connection):
+        self.conn = conn
+
+    def close(self) -> None:
+        try:
+            self.conn.close()
+        except sqlite3.Error:
+            pass
+
+    def __del__(self) -> None:
+        self.close()
+
+
+_POOLS: dict[Path, ConnectionPool] = {}
+_POOLS_LOCK = threading.Lock()
+
+
+def get_pool(db_path: Path) -> ConnectionPool:
+    """Return the process-wide pool for `db_path`, so stores sharing a file share a writer."""
+    key = db_path.resolve()
+    with _POOLS_LOCK:
+        pool = _POOLS.get(key)
+        if pool is None:
+            pool = ConnectionPool(db_path)
+            _POOLS[key] = pool
+        return pool
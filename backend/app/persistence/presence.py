@@ -0,0 +1,202 @@
+from __future__ import annotations
+
+import atexit
+import heapq
+import json
+import logging
+import os
+import threading
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Callable
+
+logger = logging.getLogger(__name__)
+
+
+class _Entry:
+    __slots__ = ("doc_id", "user_id", "display_name", "last_seen", "expires")
+
+    def __init__(self, doc_id: str, user_id: str, display_name: str, last_seen: float, expires: float):
+        self.doc_id = doc_id
+        self.user_id = user_id
+        self.display_name = display_name
+        self.last_seen = last_seen
+        self.expires = expires
+
+    def as_dict(self) -> dict:
+        return {
+            "id": f"{self.doc_id}:{self.user_id}",
+            "doc_id": self.doc_id,
+            "user_id": self.user_id,
+            "display_name": self.display_name,
+            "last_seen": datetime.fromtimestamp(self.last_seen, tz=timezone.utc).isoformat(),
+        }
+
+
+class PresenceRegistry:
+    """
+    Who is looking at which document, kept in memory and forgotten `ttl_s` after the last heartbeat.
+
+    Each entry has one item in an expiry heap. A heartbeat only moves the entry's own deadline;
+    when its heap item comes due with a later deadline it is pushed back rather than evicted,
+    so heartbeats allocate nothing once an entry exists. Expired entries are evicted on every
+    call. With `snapshot_path`, entries are written there every `snapshot_interval_s` and on
+    exit, and reloaded on start so a restart does not blank everyone's presence.
+
+    `on_change(doc_id, entries)` is called, outside the registry lock, whenever someone joins,
+    leaves or changes their display name, with the document's current entries.
+    """
+
+    def __init__(
+        self,
+        ttl_s: float = 45.0,
+        *,
+        snapshot_path: Path | None = None,
+        snapshot_interval_s: float = 30.0,
+        clock: Callable[[], float] = time.time,
+        on_change: Callable[[str, list[dict]], None] | None = None,
+    ):
+        self._ttl = ttl_s
+        self._clock = clock
+        self._on_change = on_change
+        self._lock = threading.Lock()
+        self._docs: dict[str, dict[str, _Entry]] = {}
+        self._heap: list[tuple[float, int, _Entry]] = []
+        self._seq = 0
+        self._snapshot_path = snapshot_path
+        self._stop = threading.Event()
+        if snapshot_path is not None:
+            self._load()
+            if snapshot_interval_s > 0:
+                threading.Thread(
+                    target=self._snapshot_loop, args=(snapshot_interval_s,), name="presence-snapshot", daemon=True
+                ).start()
+            atexit.register(self.close)
+
+    def heartbeat(self, doc_id: str, user_id: str, display_name: str) -> dict:
+        now = self._clock()
+        with self._lock:
+            changed = self._expire_locked(now)
+            users = self._docs.get(doc_id)
+            entry = users.get(user_id) if users else None
+            if entry is None or entry.display_name != display_name:
+                changed.add(doc_id)
+            entry = self._touch_locked(doc_id, user_id, display_name, now)
+            result = entry.as_dict()
+            notices = self._notices_locked(changed)
+        self._notify(notices)
+        return result
+
+    def list(self, doc_id: str) -> list[dict]:
+        now = self._clock()
+        with self._lock:
+            notices = self._notices_locked(self._expire_locked(now))
+            result = [entry.as_dict() for entry in self._docs.get(doc_id, {}).values()]
+        self._notify(notices)
+        return result
+
+    def sweep(self) -> None:
+        """Evict expired entries now rather than on the next call."""
+        with self._lock:
+            notices = self._notices_locked(self._expire_locked(self._clock()))
+        self._notify(notices)
+
+    def _notices_locked(self, doc_ids: set[str]) -> list[tuple[str, list[dict]]]:
+        if self._on_change is None:
+            return []
+        return [(d, [e.as_dict() for e in self._docs.get(d, {}).values()]) for d in doc_ids]
+
+    def _notify(self, notices: list[tuple[str, list[dict]]]) -> None:
+        for doc_id, entries in notices:
+            try:
+                self._on_change(doc_id, entries)
+            except Exception:
+                logger.exception("Presence change listener failed")
+
+    def __len__(self) -> int:
+        with self._lock:
+            return sum(len(users) for users in self._docs.values())
+
+    def _touch_locked(self, doc_id: str, user_id: str, display_name: str, last_seen: float) -> _Entry:
+        users = self._docs.setdefault(doc_id, {})
+        entry = users.get(user_id)
+        expires = last_seen + self._ttl
+        if entry is None:
+            entry = _Entry(doc_id, user_id, display_name, last_seen, expires)
+            users[user_id] = entry
+            self._push_locked(entry)
+        else:
+            entry.display_name = display_name
+            entry.last_seen = last_seen
+            entry.expires = expires
+        return entry
+
+    def _push_locked(self, entry: _Entry) -> None:
+        # The sequence number breaks deadline ties so entries are never compared.
+        self._seq += 1
+        heapq.heappush(self._heap, (entry.expires, self._seq, entry))
+
+    def _expire_locked(self, now: float) -> set[str]:
+        """Evict entries past their deadline; returns the documents that lost someone."""
+        changed: set[str] = set()
+        heap = self._heap
+        while heap and heap[0][0] <= now:
+            _, _, entry = heapq.heappop(heap)
+            if entry.expires > now:
+                self._push_locked(entry)
+                continue
+            users = self._docs.get(entry.doc_id)
+            if users is not None and users.get(entry.user_id) is entry:
+                del users[entry.user_id]
+                changed.add(entry.doc_id)
+                if not users:
+                    del self._docs[entry.doc_id]
+        return changed
+
+    def snapshot(self) -> None:
+        if self._snapshot_path is None:
+            return
+        now = self._clock()
+        with self._lock:
+            rows = [
+                [e.doc_id, e.user_id, e.display_name, e.last_seen]
+                for users in self._docs.values()
+                for e in users.values()
+                if e.expires > now
+            ]
+        tmp = self._snapshot_path.with_suffix(self._snapshot_path.suffix + ".tmp")
+        tmp.parent.mkdir(parents=True, exist_ok=True)
+        tmp.write_text(json.dumps(rows), encoding="utf-8")
+        os.replace(tmp, self._snapshot_path)
+
+    def _load(self) -> None:
+        try:
+            rows = json.loads(self._snapshot_path.read_text(encoding="utf-8"))
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError):
+            logger.warning("Ignoring unreadable presence snapshot %s", self._snapshot_path)
+            return
+        now = self._clock()
+        with self._lock:
+            for doc_id, user_id, display_name, last_seen in rows:
+                if last_seen + self._ttl > now:
+                    self._touch_locked(doc_id, user_id, display_name, last_seen)
+
+    def _snapshot_loop(self, interval: float) -> None:
+        while not self._stop.wait(interval):
+            self.sweep()
+            try:
+                self.snapshot()
+            except OSError:
+                logger.exception("Presence snapshot failed")
+
+    def close(self) -> None:
+        if self._stop.is_set():
+            return
+        self._stop.set()
+        try:
+            self.snapshot()
+        except OSError:
+            logger.exception("Presence snapshot failed")
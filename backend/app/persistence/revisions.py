@@ -0,0 +1,160 @@
+from __future__ import annotations
+
+import difflib
+import json
+import zlib
+from dataclasses import dataclass
+from typing import Any
+
+from app.persistence.workspace import dumps, split_workspace
+
+# Revision payloads are zlib-compressed. A keyframe holds the full content; a delta holds the
+# changes needed to turn the previous revision's content into this one.
+
+KEYFRAME = "key"
+DELTA = "delta"
+
+
+@dataclass(frozen=True)
+class RevisionPolicy:
+    """
+    When saves become revisions and which revisions survive thinning.
+
+    Saves from the same edit session within `coalesce_window_s` of the previous one fold into the
+    revision that session already opened, until that revision is `coalesce_max_span_s` old; the
+    next save then opens a new one, so a session that never pauses still leaves periodic
+    revisions behind. `thinning` lists (max_age_s, bucket_s) tiers from newest
+    to oldest: revisions younger than max_age_s keep the newest one per bucket_s (0 keeps all).
+    Checkpoints and the latest revision are never thinned. Thinning runs automatically every
+    `thin_every` new revisions per document (0 disables it).
+    """
+
+    coalesce_window_s: float = 60.0
+    coalesce_max_span_s: float = 600.0
+    thinning: tuple[tuple[float, float], ...] = (
+        (3600.0, 0.0),
+        (86400.0, 600.0),
+        (7 * 86400.0, 3600.0),
+        (float("inf"), 86400.0),
+    )
+    thin_every: int = 50
+
+    def kept(self, revisions: list[tuple[float, bool]], now: float) -> list[bool]:
+        """For (created_at_ts, is_checkpoint) pairs in chronological order, which to keep."""
+        keep = [False] * len(revisions)
+        seen: set[tuple[int, int]] = set()
+        for i in range(len(revisions) - 1, -1, -1):
+            ts, checkpoint = revisions[i]
+            age = max(0.0, now - ts)
+            for tier, (max_age, bucket) in enumerate(self.thinning):
+                if age < max_age:
+                    if bucket <= 0:
+                        keep[i] = True
+                    else:
+                        key = (tier, int(ts // bucket))
+                        if key not in seen:
+                            seen.add(key)
+                            keep[i] = True
+                    break
+            if checkpoint or i == len(revisions) - 1:
+                keep[i] = True
+        return keep
+
+
+def encode_keyframe(content: str) -> bytes:
+    return zlib.compress((content or "").encode("utf-8"), 6)
+
+
+def encode_delta(old: str, new: str) -> bytes:
+    return zlib.compress(dumps(_delta(old or "", new or "")).encode("utf-8"), 6)
+
+
+def decode(kind: str, payload: bytes, base: str | None) -> str:
+    """Return the content of a revision given its payload and, for deltas, the previous content."""
+    raw = zlib.decompress(payload).decode("utf-8")
+    if kind == KEYFRAME:
+        return raw
+    if base is None:
+        raise ValueError("delta revision has no base")
+    return _apply(base, json.loads(raw))
+
+
+def _line_delta(old: str, new: str) -> list:
+    # Copy ranges of old lines as [i1, i2]; inserted text as strings.
+    a = old.splitlines(keepends=True)
+    b = new.splitlines(keepends=True)
+    ops: list = []
+    for tag, i1, i2, j1, j2 in difflib.SequenceMatcher(None, a, b).get_opcodes():
+        if tag == "equal":
+            ops.append([i1, i2])
+        elif j2 > j1:
+            ops.append("".join(b[j1:j2]))
+    return ops
+
+
+def _apply_lines(old: str, ops: list) -> str:
+    a = old.splitlines(keepends=True)
+    return "".join("".join(a[op[0] : op[1]]) if isinstance(op, list) else op for op in ops)
+
+
+def _delta(old: str, new: str) -> dict:
+    old_ws = split_workspace(old)
+    new_ws = split_workspace(new)
+    if old_ws is None or new_ws is None:
+        return {"t": _line_delta(old, new)}
+
+    old_shell, old_items = old_ws
+    new_shell, new_items = new_ws
+    old_entries = dict(old_items)
+    new_entries = dict(new_items)
+    changes: dict[str, Any] = {}
+    for path, entry in new_items:
+        prev = old_entries.get(path)
+        if path in old_entries and prev == entry:
+            continue
+        if _content_only_change(prev, entry):
+            changes[path] = {"c": _line_delta(prev["content"], entry["content"])}
+        else:
+            changes[path] = {"e": entry}
+    removed = [path for path in old_entries if path not in new_entries]
+
+    out: dict[str, Any] = {"w": changes}
+    if removed:
+        out["del"] = removed
+    if new_shell != old_shell:
+        out["shell"] = new_shell
+    order = [p for p in old_entries if p in new_entries] + [p for p in new_entries if p not in old_entries]
+    if order != list(new_entries):
+        out["order"] = list(new_entries)
+    return out
+
+
+def _content_only_change(prev: Any, entry: Any) -> bool:
+    if not (isinstance(prev, dict) and isinstance(entry, dict)):
+        return False
+    if not (isinstance(prev.get("content"), str) and isinstance(entry.get("content"), str)):
+        return False
+    return {k: v for k, v in prev.items() if k != "content"} == {k: v for k, v in entry.items() if k != "content"}
+
+
+def _apply(base: str, delta: dict) -> str:
+    if "t" in delta:
+        return _apply_lines(base, delta["t"])
+
+    base_ws = split_workspace(base)
+    if base_ws is None:
+        raise ValueError("workspace delta applied to non-workspace content")
+    shell_json, items = base_ws
+    entries = dict(items)
+    for path in delta.get("del", []):
+        entries.pop(path, None)
+    for path, change in delta["w"].items():
+        if "c" in change:
+            entries[path] = {**entries[path], "content": _apply_lines(entries[path]["content"], change["c"])}
+        else:
+            entries[path] = change["e"]
+    if "order" in delta:
+        entries = {path: entries[path] for path in delta["order"]}
+    shell = json.loads(delta.get("shell", shell_json))
+    shell["entries"] = entries
+    return dumps(shell)
@@ -1,189 +1,1096 @@
 from __future__ import annotations
 
 import json
+import logging
 import sqlite3
+import threading
 import uuid
 import secrets
 import hashlib
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
 from datetime import datetime, timezone
 from pathlib import Path
+from typing import Any, Callable, TypeVar
 
+from app.context.symbols import DEF, USE, Symbol, extract_symbols, macro_definitions
 from app.persistence.models import DocCreateRequest, DocResponse
+from app.persistence import revisions
+from app.persistence.cache import DocCache, SearchCache
+from app.persistence.engine import SingleFileEngine, StorageEngine
+from app.persistence.fts_query import compile_query
+from app.persistence.migrations import Migration, add_column, migrate, rebuild_table, register_functions
+from app.persistence.pool import ConnectionPool
+from app.persistence.workspace import entry_columns, join_workspace, split_workspace
+
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# bm25 weights for the doc_files_fts columns (doc_id, path, content): a match in a file's path
+# outranks one in its body, and document ids never count.
+_SEARCH_RANK = "bm25(0.0, 4.0, 1.0)"
+# Hits counted beyond this are reported as "more than", not an exact total.
+SEARCH_COUNT_CAP = 1000
+# Characters the word tokenizer splits on but LaTeX searches are made of: macros, label keys,
+# arguments and subscripts. A query containing one goes to the trigram index.
+_CODE_CHARS = frozenset("\\{}[]:_^$@=/.-")
+_SYMBOL_COLUMNS = "path, kind, name, role, start, end, line"
+
+
+class DocVersionConflict(Exception):
+    """Raised when a conditional write names a version that is no longer current."""
+
+    def __init__(self, doc_id: str, expected: int, current: int):
+        super().__init__(f"Document {doc_id} is at version {current}, not {expected}")
+        self.expected = expected
+        self.current = current
+
+
+@dataclass(frozen=True)
+class IndexStats:
+    reindexed: int
+    skipped: int
+    removed: int
+
+
+class _IndexTotals:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._totals = {"updates": 0, "reindexed": 0, "skipped": 0, "removed": 0}
+
+    def add(self, stats: IndexStats) -> None:
+        with self._lock:
+            self._totals["updates"] += 1
+            self._totals["reindexed"] += stats.reindexed
+            self._totals["skipped"] += stats.skipped
+            self._totals["removed"] += stats.removed
+
+    def as_dict(self) -> dict[str, int]:
+        with self._lock:
+            return dict(self._totals)
+
+
+def _now_ms() -> int:
+    return int(datetime.now(timezone.utc).timestamp() * 1000)
+
+
+def _iso(ms: int | None) -> str | None:
+    # Timestamps are stored as epoch milliseconds and returned as ISO-8601 (UTC).
+    if ms is None:
+        return None
+    return datetime.fromtimestamp(ms / 1000, tz=timezone.utc).isoformat()
+
+
+def _with_iso(row: sqlite3.Row, *columns: str) -> dict:
+    out = dict(row)
+    for column in columns:
+        out[column] = _iso(out[column])
+    return out
+
+
+def _byte_len(text: str | None) -> int:
+    return len(text.encode("utf-8")) if text else 0
+
+
+def _entry_size(content: str | None, meta_json: str) -> int:
+    return _byte_len(meta_json) + _byte_len(content)
+
+
+def _changed_files(before: dict[str, tuple], after: dict[str, tuple]) -> dict[str, str | None]:
+    """
+    Files whose text a write changed, from (type, content) by path around it: the new text,
+    or None for a file that was removed or is no longer a file.
+    """
+    changed: dict[str, str | None] = {}
+    for path, (kind, content) in after.items():
+        if kind == "file" and before.get(path) != (kind, content):
+            changed[path] = content or ""
+    for path, (kind, _) in before.items():
+        if kind == "file" and (path not in after or after[path][0] != "file"):
+            changed[path] = None
+    return changed
+
+
+def _create_symbol_index(conn: sqlite3.Connection) -> None:
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS doc_symbols (
+          doc_id TEXT NOT NULL,
+          path TEXT NOT NULL,
+          kind TEXT NOT NULL,
+          name TEXT NOT NULL,
+          role TEXT NOT NULL,
+          start INTEGER NOT NULL,
+          end INTEGER NOT NULL,
+          line INTEGER NOT NULL
+        )
+        """
+    )
+    # Lookups by name (definitions, references) and by position (what is under the cursor).
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_doc_symbols_name ON doc_symbols(doc_id, kind, name, role)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_doc_symbols_path ON doc_symbols(doc_id, path, start)")
+    conn.execute("DELETE FROM doc_symbols")
+    files: dict[str, list[tuple[str, str]]] = {}
+    for row in conn.execute("SELECT doc_id, path, content FROM doc_files WHERE type = 'file'").fetchall():
+        files.setdefault(row["doc_id"], []).append((row["path"], row["content"] or ""))
+    for doc_id, texts in files.items():
+        # Macro uses are indexed only for the project's own macros, so find those first.
+        macros = set().union(*(macro_definitions(text, path) for path, text in texts))
+        for path, text in texts:
+            _insert_symbols(conn, doc_id, path, extract_symbols(text, path, macros))
+
+
+def _insert_symbols(conn: sqlite3.Connection, doc_id: str, path: str, symbols: list[Symbol]) -> None:
+    conn.executemany(
+        "INSERT INTO doc_symbols (doc_id, path, kind, name, role, start, end, line) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+        [(doc_id, path, s.kind, s.name, s.role, s.start, s.end, s.line) for s in symbols],
+    )
+
+
+def _project_macros(conn: sqlite3.Connection, doc_id: str) -> set[str]:
+    rows = conn.execute(
+        "SELECT DISTINCT name FROM doc_symbols WHERE doc_id = ? AND kind = 'macro' AND role = ?", (doc_id, DEF)
+    ).fetchall()
+    return {r["name"] for r in rows}
+
+
+def _substring_terms(query: str) -> tuple[str | None, list[str]]:
+    """
+    Split a substring query into a trigram MATCH expression and the terms too short for it.
+
+    Every whitespace-separated term must occur somewhere in the file. Trigrams need three
+    characters, so shorter terms are checked against the content directly.
+    """
+    terms = query.split()
+    long = [t for t in terms if len(t) >= 3]
+    match = " ".join('"' + t.replace('"', '""') + '"' for t in long) or None
+    return match, [t for t in terms if len(t) < 3]
+
+
+def _create_trigram_index(conn: sqlite3.Connection) -> None:
+    try:
+        conn.execute(
+            """
+            CREATE VIRTUAL TABLE IF NOT EXISTS doc_files_trigram
+            USING fts5(doc_id UNINDEXED, path, content, tokenize = 'trigram')
+            """
+        )
+    except sqlite3.OperationalError:
+        # Needs SQLite 3.34+. Without it substring queries use the word index.
+        logger.warning("SQLite %s has no trigram tokenizer; substring search is disabled", sqlite3.sqlite_version)
+        return
+    # Rows share rowids with doc_files_fts, so doc_files_index tracks both.
+    conn.execute(
+        "INSERT INTO doc_files_trigram (rowid, doc_id, path, content) SELECT rowid, doc_id, path, content FROM doc_files_fts"
+    )
+
+
+def _create_index_state(conn: sqlite3.Connection) -> None:
+    # Bumped whenever this file's search index changes; cached cross-document results key on it.
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS search_index_state (
+          id INTEGER PRIMARY KEY CHECK (id = 0),
+          generation INTEGER NOT NULL
+        )
+        """
+    )
+    conn.execute("INSERT OR IGNORE INTO search_index_state (id, generation) VALUES (0, 0)")
+
+
+def _drop_presence(conn: sqlite3.Connection) -> None:
+    conn.execute("DROP TABLE IF EXISTS presence")
+
+
+def _index_docs_by_update(conn: sqlite3.Connection) -> None:
+    # Summaries list the most recently updated documents first, keyed on (updated_at, rowid).
+    conn.execute("UPDATE docs SET updated_at = 0 WHERE updated_at IS NULL")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_docs_updated ON docs(updated_at)")
+
+
+def _external_content_index(conn: sqlite3.Connection) -> None:
+    """
+    Make the search indexes read file bodies from doc_files instead of keeping their own copies.
+
+    Both FTS tables become external-content tables over the doc_files_text view, and triggers on
+    doc_files keep them in step, so every write path indexes exactly what it stores. doc_files
+    gets an explicit INTEGER PRIMARY KEY because the index refers to rows by id, and VACUUM may
+    renumber implicit rowids.
+    """
+    trigram = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'doc_files_trigram'"
+    ).fetchone() is not None
+    conn.execute("DROP TABLE IF EXISTS doc_files_index")
+    conn.execute("DROP TABLE IF EXISTS doc_files_fts")
+    conn.execute("DROP TABLE IF EXISTS doc_files_trigram")
+    conn.execute("DROP VIEW IF EXISTS doc_files_text")
+    rebuild_table(
+        conn,
+        "doc_files",
+        """
+        CREATE TABLE {table} (
+          id INTEGER PRIMARY KEY,
+          doc_id TEXT NOT NULL,
+          path TEXT NOT NULL,
+          position INTEGER NOT NULL,
+          type TEXT,
+          content TEXT,
+          meta_json TEXT NOT NULL,
+          UNIQUE (doc_id, path),
+          FOREIGN KEY(doc_id) REFERENCES docs(id) ON DELETE CASCADE
+        )
+        """,
+        {
+            "id": "rowid",
+            "doc_id": "doc_id",
+            "path": "path",
+            "position": "position",
+            "type": "type",
+            "content": "content",
+            "meta_json": "meta_json",
+        },
+    )
+    # Only files are searchable; folders and other entries never reach the index.
+    conn.execute(
+        "CREATE VIEW doc_files_text AS SELECT id, doc_id, path, content FROM doc_files WHERE type = 'file'"
+    )
+    conn.execute(
+        """
+        CREATE VIRTUAL TABLE doc_files_fts
+        USING fts5(doc_id, path, content, content = 'doc_files_text', content_rowid = 'id')
+        """
+    )
+    tables = ["doc_files_fts"]
+    if trigram:
+        conn.execute(
+            """
+            CREATE VIRTUAL TABLE doc_files_trigram
+            USING fts5(doc_id UNINDEXED, path, content, tokenize = 'trigram',
+                       content = 'doc_files_text', content_rowid = 'id')
+            """
+        )
+        tables.append("doc_files_trigram")
+    for table in tables:
+        conn.execute(f"INSERT INTO {table} ({table}) VALUES ('rebuild')")
+    # An external-content index must be given a row's old values to remove it, so the triggers
+    # pass them from `old`. Updates that only move a file (position) leave the index alone.
+    def insert(where: str) -> str:
+        return "".join(
+            f"INSERT INTO {t} (rowid, doc_id, path, content) SELECT new.id, new.doc_id, new.path, new.content{where};"
+            for t in tables
+        )
+
+    def delete(where: str) -> str:
+        return "".join(
+            f"INSERT INTO {t} ({t}, rowid, doc_id, path, content)"
+            f" SELECT 'delete', old.id, old.doc_id, old.path, old.content{where};"
+            for t in tables
+        )
+
+    bump = "UPDATE search_index_state SET generation = generation + 1;"
+    conn.execute(
+        f"CREATE TRIGGER doc_files_index_insert AFTER INSERT ON doc_files WHEN new.type = 'file' BEGIN {insert('')} {bump} END"
+    )
+    conn.execute(
+        f"CREATE TRIGGER doc_files_index_delete AFTER DELETE ON doc_files WHEN old.type = 'file' BEGIN {delete('')} {bump} END"
+    )
+    conn.execute(
+        f"""
+        CREATE TRIGGER doc_files_index_update AFTER UPDATE OF type, content ON doc_files
+        WHEN old.type IS NOT new.type OR old.content IS NOT new.content
+        BEGIN {delete(" WHERE old.type = 'file'")} {insert(" WHERE new.type = 'file'")} {bump} END
+        """
+    )
 
 
 class DocStore:
-    def __init__(self, db_path: Path):
+    def __init__(
+        self,
+        db_path: Path,
+        pool: ConnectionPool | None = None,
+        revision_keyframe_interval: int = 20,
+        doc_cache: DocCache | None = None,
+        revision_policy: revisions.RevisionPolicy | None = None,
+        engine: StorageEngine | None = None,
+        search_cache: SearchCache | None = None,
+    ):
         self._db_path = db_path
+        self._revision_policy = revision_policy or revisions.RevisionPolicy()
+        self._engine = engine or SingleFileEngine(db_path, pool)
+        # Users, sessions and share tokens; per-document data goes through _doc_pool.
+        self._pool = self._engine.global_pool
+        shards = self._engine.shards()
+        self._fanout = ThreadPoolExecutor(max_workers=len(shards)) if len(shards) > 1 else None
+        self._cache = doc_cache or DocCache()
+        self._search_cache = search_cache or SearchCache()
+        self._keyframe_interval = max(1, revision_keyframe_interval)
+        self._index_totals = _IndexTotals()
+        # Set once migrations have created these tables; earlier migrations reindex without them.
+        self._trigram = False
+        self._index_state = False
+        self._symbols = False
         self._init()
 
-    def _connect(self) -> sqlite3.Connection:
-        conn = sqlite3.connect(self._db_path)
-        conn.row_factory = sqlite3.Row
-        return conn
-
     def _init(self) -> None:
-        self._db_path.parent.mkdir(parents=True, exist_ok=True)
-        with self._connect() as conn:
-            conn.execute(
-                """
-                CREATE TABLE IF NOT EXISTS docs (
-                  id TEXT PRIMARY KEY,
-                  title TEXT,
-                  content TEXT NOT NULL,
-                  settings_json TEXT NOT NULL
+        # Every database file gets the full schema; tables a file does not use stay empty.
+        for pool in self._engine.pools():
+            with pool.write() as conn:
+                migrate(
+                    conn,
+                    "docs",
+                    [
+                        Migration(1, "baseline schema", self._create_baseline),
+                        Migration(2, "per-file storage, delta revisions and search index backfill", self._backfill),
+                        Migration(3, "epoch-millisecond timestamps and listing indexes", self._epoch_timestamps),
+                        Migration(4, "drop presence table (now in memory)", _drop_presence),
+                        Migration(5, "trigram index for substring search", _create_trigram_index),
+                        Migration(6, "search index generation counter", _create_index_state),
+                        Migration(7, "external-content search index kept by triggers", _external_content_index),
+                        Migration(8, "symbol index for labels, references, citations and macros", _create_symbol_index),
+                        Migration(9, "file inclusions in the symbol index", _create_symbol_index),
+                        Migration(10, "index documents by last update", _index_docs_by_update),
+                        Migration(11, "macro uses limited to the project's own macros", _create_symbol_index),
+                    ],
                 )
-                """
+        self._trigram = all(self._has_table(pool, "doc_files_trigram") for pool in self._engine.pools())
+        self._index_state = True
+        self._symbols = True
+
+    @staticmethod
+    def _has_table(pool: ConnectionPool, name: str) -> bool:
+        with pool.read() as conn:
+            return conn.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (name,)
+            ).fetchone() is not None
+
+    def _doc_pool(self, doc_id: str) -> ConnectionPool:
+        return self._engine.pool_for(doc_id)
+
+    def _fan_out(self, fn: Callable[[ConnectionPool], T]) -> list[T]:
+        """Run `fn` against every shard, concurrently when there is more than one."""
+        shards = self._engine.shards()
+        if self._fanout is None:
+            return [fn(pool) for pool in shards]
+        return list(self._fanout.map(fn, shards))
+
+    def _create_baseline(self, conn: sqlite3.Connection) -> None:
+        # Databases from before versioning may already have any subset of these tables and
+        # columns, so every statement here is idempotent.
+        conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS docs (
+              id TEXT PRIMARY KEY,
+              title TEXT,
+              content TEXT NOT NULL,
+              settings_json TEXT NOT NULL
             )
-            conn.execute(
-                """
-                CREATE TABLE IF NOT EXISTS doc_models (
-                  doc_id TEXT PRIMARY KEY,
-                  models_json TEXT NOT NULL,
-                  FOREIGN KEY(doc_id) REFERENCES docs(id) ON DELETE CASCADE
-                )
-                """
+            """
+        )
+        conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS doc_files (
+              doc_id TEXT NOT NULL,
+              path TEXT NOT NULL,
+              position INTEGER NOT NULL,
+              type TEXT,
+              content TEXT,
+              meta_json TEXT NOT NULL,
+              PRIMARY KEY (doc_id, path),
+              FOREIGN KEY(doc_id) REFERENCES docs(id) ON DELETE CASCADE
             )
-            conn.execute(
-                """
-                CREATE TABLE IF NOT EXISTS doc_revisions (
-                  id TEXT PRIMARY KEY,
-                  doc_id TEXT NOT NULL,
-                  content TEXT NOT NULL,
-                  created_at TEXT NOT NULL,
-                  FOREIGN KEY(doc_id) REFERENCES docs(id) ON DELETE CASCADE
-                )
-                """
+            """
+        )
+        conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS doc_models (
+              doc_id TEXT PRIMARY KEY,
+              models_json TEXT NOT NULL,
+              FOREIGN KEY(doc_id) REFERENCES docs(id) ON DELETE CASCADE
             )
-            conn.execute(
-                """
-                CREATE VIRTUAL TABLE IF NOT EXISTS doc_files_fts
-                USING fts5(doc_id, path, content)
-                """
+            """
+        )
+        conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS doc_revisions (
+              id TEXT PRIMARY KEY,
+              doc_id TEXT NOT NULL,
+              content TEXT NOT NULL,
+              created_at TEXT NOT NULL,
+              seq INTEGER,
+              kind TEXT,
+              payload BLOB,
+              doc_version INTEGER,
+              session_id TEXT,
+              touched_at TEXT,
+              checkpoint INTEGER NOT NULL DEFAULT 0,
+              label TEXT,
+              FOREIGN KEY(doc_id) REFERENCES docs(id) ON DELETE CASCADE
             )
-            conn.execute(
-                """
-                CREATE TABLE IF NOT EXISTS users (
-                  id TEXT PRIMARY KEY,
-                  username TEXT UNIQUE NOT NULL,
-                  password_hash TEXT NOT NULL,
-                  salt TEXT NOT NULL
-                )
-                """
+            """
+        )
+        conn.execute(
+            """
+            CREATE VIRTUAL TABLE IF NOT EXISTS doc_files_fts
+            USING fts5(doc_id, path, content)
+            """
+        )
+        conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS doc_files_index (
+              doc_id TEXT NOT NULL,
+              path TEXT NOT NULL,
+              content_hash TEXT NOT NULL,
+              fts_rowid INTEGER NOT NULL,
+              PRIMARY KEY (doc_id, path)
             )
-            conn.execute(
-                """
-                CREATE TABLE IF NOT EXISTS sessions (
-                  token TEXT PRIMARY KEY,
-                  user_id TEXT NOT NULL,
-                  created_at TEXT NOT NULL,
-                  FOREIGN KEY(user_id) REFERENCES users(id) ON DELETE CASCADE
-                )
-                """
+            """
+        )
+        conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS users (
+              id TEXT PRIMARY KEY,
+              username TEXT UNIQUE NOT NULL,
+              password_hash TEXT NOT NULL,
+              salt TEXT NOT NULL
             )
-            conn.execute(
-                """
-                CREATE TABLE IF NOT EXISTS doc_shares (
-                  token TEXT PRIMARY KEY,
-                  doc_id TEXT NOT NULL,
-                  created_at TEXT NOT NULL,
-                  FOREIGN KEY(doc_id) REFERENCES docs(id) ON DELETE CASCADE
-                )
-                """
+            """
+        )
+        conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS sessions (
+              token TEXT PRIMARY KEY,
+              user_id TEXT NOT NULL,
+              created_at TEXT NOT NULL,
+              FOREIGN KEY(user_id) REFERENCES users(id) ON DELETE CASCADE
+            )
+            """
+        )
+        conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS doc_shares (
+              token TEXT PRIMARY KEY,
+              doc_id TEXT NOT NULL,
+              created_at TEXT NOT NULL,
+              FOREIGN KEY(doc_id) REFERENCES docs(id) ON DELETE CASCADE
+            )
+            """
+        )
+        conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS doc_comments (
+              id TEXT PRIMARY KEY,
+              doc_id TEXT NOT NULL,
+              body TEXT NOT NULL,
+              path TEXT,
+              selection_start INTEGER,
+              selection_end INTEGER,
+              created_at TEXT NOT NULL,
+              FOREIGN KEY(doc_id) REFERENCES docs(id) ON DELETE CASCADE
             )
+            """
+        )
+        conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS doc_logs (
+              id TEXT PRIMARY KEY,
+              doc_id TEXT NOT NULL,
+              body TEXT NOT NULL,
+              created_at TEXT NOT NULL,
+              FOREIGN KEY(doc_id) REFERENCES docs(id) ON DELETE CASCADE
+            )
+            """
+        )
+        conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS presence (
+              id TEXT PRIMARY KEY,
+              doc_id TEXT NOT NULL,
+              user_id TEXT NOT NULL,
+              display_name TEXT NOT NULL,
+              last_seen TEXT NOT NULL
+            )
+            """
+        )
+        add_column(conn, "docs", "layout", "TEXT NOT NULL DEFAULT 'blob'")
+        add_column(conn, "docs", "version", "INTEGER NOT NULL DEFAULT 0")
+        add_column(conn, "docs", "updated_at", "TEXT")
+        if add_column(conn, "docs", "size", "INTEGER NOT NULL DEFAULT 0"):
             conn.execute(
                 """
-                CREATE TABLE IF NOT EXISTS doc_comments (
-                  id TEXT PRIMARY KEY,
-                  doc_id TEXT NOT NULL,
-                  body TEXT NOT NULL,
-                  path TEXT,
-                  selection_start INTEGER,
-                  selection_end INTEGER,
-                  created_at TEXT NOT NULL,
-                  FOREIGN KEY(doc_id) REFERENCES docs(id) ON DELETE CASCADE
-                )
+                UPDATE docs SET size = LENGTH(CAST(content AS BLOB)) + COALESCE((
+                  SELECT SUM(LENGTH(CAST(f.meta_json AS BLOB)) + COALESCE(LENGTH(CAST(f.content AS BLOB)), 0))
+                  FROM doc_files f WHERE f.doc_id = docs.id
+                ), 0)
                 """
             )
-            conn.execute(
-                """
-                CREATE TABLE IF NOT EXISTS doc_logs (
-                  id TEXT PRIMARY KEY,
-                  doc_id TEXT NOT NULL,
-                  body TEXT NOT NULL,
-                  created_at TEXT NOT NULL,
-                  FOREIGN KEY(doc_id) REFERENCES docs(id) ON DELETE CASCADE
+        for column, decl in (
+            ("seq", "INTEGER"),
+            ("kind", "TEXT"),
+            ("payload", "BLOB"),
+            ("doc_version", "INTEGER"),
+            ("session_id", "TEXT"),
+            ("touched_at", "TEXT"),
+            ("checkpoint", "INTEGER NOT NULL DEFAULT 0"),
+            ("label", "TEXT"),
+        ):
+            add_column(conn, "doc_revisions", column, decl)
+
+    def _backfill(self, conn: sqlite3.Connection) -> None:
+        self._migrate_workspace_blobs(conn)
+        self._migrate_full_revisions(conn)
+        # The search index is rebuilt from doc_files by migration 7.
+
+    def _epoch_timestamps(self, conn: sqlite3.Connection) -> None:
+        # Timestamps become INTEGER epoch milliseconds, so (doc_id, created_at) indexes serve
+        # listings as range scans in time order instead of sorting ISO strings.
+        register_functions(conn)
+        ts = "COALESCE(iso_to_epoch_ms({}), 0)"
+        rebuild_table(
+            conn,
+            "docs",
+            """
+            CREATE TABLE {table} (
+              id TEXT PRIMARY KEY,
+              title TEXT,
+              content TEXT NOT NULL,
+              settings_json TEXT NOT NULL,
+              layout TEXT NOT NULL DEFAULT 'blob',
+              version INTEGER NOT NULL DEFAULT 0,
+              size INTEGER NOT NULL DEFAULT 0,
+              updated_at INTEGER
+            )
+            """,
+            {
+                # Keep rowids: summary pagination uses them as its keyset cursor.
+                "rowid": "rowid",
+                "id": "id",
+                "title": "title",
+                "content": "content",
+                "settings_json": "settings_json",
+                "layout": "layout",
+                "version": "version",
+                "size": "size",
+                "updated_at": "iso_to_epoch_ms(updated_at)",
+            },
+        )
+        rebuild_table(
+            conn,
+            "doc_revisions",
+            """
+            CREATE TABLE {table} (
+              id TEXT PRIMARY KEY,
+              doc_id TEXT NOT NULL,
+              content TEXT NOT NULL,
+              created_at INTEGER NOT NULL,
+              seq INTEGER,
+              kind TEXT,
+              payload BLOB,
+              doc_version INTEGER,
+              session_id TEXT,
+              touched_at INTEGER,
+              checkpoint INTEGER NOT NULL DEFAULT 0,
+              label TEXT,
+              FOREIGN KEY(doc_id) REFERENCES docs(id) ON DELETE CASCADE
+            )
+            """,
+            {
+                "id": "id",
+                "doc_id": "doc_id",
+                "content": "content",
+                "created_at": ts.format("created_at"),
+                "seq": "seq",
+                "kind": "kind",
+                "payload": "payload",
+                "doc_version": "doc_version",
+                "session_id": "session_id",
+                "touched_at": "iso_to_epoch_ms(touched_at)",
+                "checkpoint": "checkpoint",
+                "label": "label",
+            },
+        )
+        rebuild_table(
+            conn,
+            "sessions",
+            """
+            CREATE TABLE {table} (
+              token TEXT PRIMARY KEY,
+              user_id TEXT NOT NULL,
+              created_at INTEGER NOT NULL,
+              FOREIGN KEY(user_id) REFERENCES users(id) ON DELETE CASCADE
+            )
+            """,
+            {"token": "token", "user_id": "user_id", "created_at": ts.format("created_at")},
+        )
+        rebuild_table(
+            conn,
+            "doc_shares",
+            """
+            CREATE TABLE {table} (
+              token TEXT PRIMARY KEY,
+              doc_id TEXT NOT NULL,
+              created_at INTEGER NOT NULL,
+              FOREIGN KEY(doc_id) REFERENCES docs(id) ON DELETE CASCADE
+            )
+            """,
+            {"token": "token", "doc_id": "doc_id", "created_at": ts.format("created_at")},
+        )
+        rebuild_table(
+            conn,
+            "doc_comments",
+            """
+            CREATE TABLE {table} (
+              id TEXT PRIMARY KEY,
+              doc_id TEXT NOT NULL,
+              body TEXT NOT NULL,
+              path TEXT,
+              selection_start INTEGER,
+              selection_end INTEGER,
+              created_at INTEGER NOT NULL,
+              FOREIGN KEY(doc_id) REFERENCES docs(id) ON DELETE CASCADE
+            )
+            """,
+            {
+                "id": "id",
+                "doc_id": "doc_id",
+                "body": "body",
+                "path": "path",
+                "selection_start": "selection_start",
+                "selection_end": "selection_end",
+                "created_at": ts.format("created_at"),
+            },
+        )
+        rebuild_table(
+            conn,
+            "doc_logs",
+            """
+            CREATE TABLE {table} (
+              id TEXT PRIMARY KEY,
+              doc_id TEXT NOT NULL,
+              body TEXT NOT NULL,
+              created_at INTEGER NOT NULL,
+              FOREIGN KEY(doc_id) REFERENCES docs(id) ON DELETE CASCADE
+            )
+            """,
+            {"id": "id", "doc_id": "doc_id", "body": "body", "created_at": ts.format("created_at")},
+        )
+        rebuild_table(
+            conn,
+            "presence",
+            """
+            CREATE TABLE {table} (
+              id TEXT PRIMARY KEY,
+              doc_id TEXT NOT NULL,
+              user_id TEXT NOT NULL,
+              display_name TEXT NOT NULL,
+              last_seen INTEGER NOT NULL
+            )
+            """,
+            {
+                "id": "id",
+                "doc_id": "doc_id",
+                "user_id": "user_id",
+                "display_name": "display_name",
+                "last_seen": ts.format("last_seen"),
+            },
+        )
+        # Revisions list and replay by seq, which also orders them by creation.
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_doc_revisions_doc_seq ON doc_revisions(doc_id, seq)")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_doc_comments_doc_created ON doc_comments(doc_id, created_at)")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_doc_logs_doc_created ON doc_logs(doc_id, created_at)")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_doc_shares_doc ON doc_shares(doc_id)")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_presence_doc_seen ON presence(doc_id, last_seen)")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_sessions_user ON sessions(user_id)")
+
+    def _migrate_workspace_blobs(self, conn: sqlite3.Connection) -> None:
+        rows = conn.execute(
+            "SELECT id, content FROM docs WHERE layout = 'blob' AND content LIKE '{%'"
+        ).fetchall()
+        for row in rows:
+            self._write_content(conn, row["id"], row["content"])
+
+    def _migrate_full_revisions(self, conn: sqlite3.Connection) -> None:
+        doc_ids = [
+            r["doc_id"]
+            for r in conn.execute("SELECT DISTINCT doc_id FROM doc_revisions WHERE kind IS NULL").fetchall()
+        ]
+        for doc_id in doc_ids:
+            rows = conn.execute(
+                "SELECT id, kind, payload, content FROM doc_revisions WHERE doc_id = ? ORDER BY created_at ASC, rowid ASC",
+                (doc_id,),
+            ).fetchall()
+            contents: list[str] = []
+            for row in rows:
+                if row["kind"] is None:
+                    contents.append(row["content"] or "")
+                else:
+                    contents.append(revisions.decode(row["kind"], row["payload"], contents[-1] if contents else None))
+            prev: str | None = None
+            for seq, (row, content) in enumerate(zip(rows, contents), start=1):
+                kind, payload = self._encode_revision(seq, prev, content)
+                conn.execute(
+                    "UPDATE doc_revisions SET seq = ?, kind = ?, payload = ?, content = '' WHERE id = ?",
+                    (seq, kind, payload, row["id"]),
                 )
-                """
+                prev = content
+
+    def _encode_revision(self, seq: int, prev: str | None, content: str) -> tuple[str, bytes]:
+        keyframe = revisions.encode_keyframe(content)
+        if prev is None or (seq - 1) % self._keyframe_interval == 0:
+            return revisions.KEYFRAME, keyframe
+        delta = revisions.encode_delta(prev, content)
+        if len(delta) >= len(keyframe):
+            return revisions.KEYFRAME, keyframe
+        return revisions.DELTA, delta
+
+    def _revision_content(self, conn: sqlite3.Connection, doc_id: str, seq: int) -> str:
+        """Rebuild a revision by replaying deltas forward from the nearest keyframe at or before `seq`."""
+        rows = conn.execute(
+            """
+            SELECT kind, payload FROM doc_revisions
+            WHERE doc_id = ? AND seq <= ? AND seq >= (
+              SELECT MAX(seq) FROM doc_revisions WHERE doc_id = ? AND seq <= ? AND kind = ?
             )
+            ORDER BY seq ASC
+            """,
+            (doc_id, seq, doc_id, seq, revisions.KEYFRAME),
+        ).fetchall()
+        content: str | None = None
+        for row in rows:
+            content = revisions.decode(row["kind"], row["payload"], content)
+        if content is None:
+            raise ValueError(f"revision chain for {doc_id} has no keyframe at or before {seq}")
+        return content
+
+    def _write_content(self, conn: sqlite3.Connection, doc_id: str, content: str) -> str:
+        """
+        Store `content` for an existing docs row, touching only doc_files rows that changed.
+
+        Bumps the version and returns the content as get() will return it.
+        """
+        updated_at = _now_ms()
+        split = split_workspace(content)
+        if split is None:
+            files = conn.execute(
+                "SELECT path, type, content FROM doc_files WHERE doc_id = ? AND type = 'file'", (doc_id,)
+            ).fetchall()
+            self._reindex(conn, doc_id, {f["path"]: ("file", f["content"]) for f in files}, {})
+            conn.execute("DELETE FROM doc_files WHERE doc_id = ?", (doc_id,))
             conn.execute(
+                "UPDATE docs SET content = ?, layout = 'blob', size = ?, updated_at = ?, version = version + 1 WHERE id = ?",
+                (content, _byte_len(content), updated_at, doc_id),
+            )
+            return content
+        shell, entries = split
+        existing = {
+            r["path"]: (r["position"], r["type"], r["content"], r["meta_json"])
+            for r in conn.execute(
+                "SELECT path, position, type, content, meta_json FROM doc_files WHERE doc_id = ?",
+                (doc_id,),
+            ).fetchall()
+        }
+        before = {path: row[1:3] for path, row in existing.items()}
+        after: dict[str, tuple] = {}
+        changed: list[tuple] = []
+        stored: list[tuple[str, str | None, str]] = []
+        size = _byte_len(shell)
+        for position, (path, entry) in enumerate(entries):
+            row = (position, *entry_columns(entry))
+            size += _entry_size(row[2], row[3])
+            stored.append((path, row[2], row[3]))
+            after[path] = row[1:3]
+            if existing.pop(path, None) != row:
+                changed.append((doc_id, path, *row))
+        if changed:
+            # An upsert, not INSERT OR REPLACE: rows keep their ids, and the index triggers see
+            # the old values (and skip rows whose text did not change).
+            conn.executemany(
                 """
-                CREATE TABLE IF NOT EXISTS presence (
-                  id TEXT PRIMARY KEY,
-                  doc_id TEXT NOT NULL,
-                  user_id TEXT NOT NULL,
-                  display_name TEXT NOT NULL,
-                  last_seen TEXT NOT NULL
-                )
-                """
+                INSERT INTO doc_files (doc_id, path, position, type, content, meta_json) VALUES (?, ?, ?, ?, ?, ?)
+                ON CONFLICT(doc_id, path) DO UPDATE SET
+                  position = excluded.position, type = excluded.type,
+                  content = excluded.content, meta_json = excluded.meta_json
+                """,
+                changed,
+            )
+        if existing:
+            conn.executemany(
+                "DELETE FROM doc_files WHERE doc_id = ? AND path = ?",
+                [(doc_id, path) for path in existing],
             )
-            conn.commit()
+        conn.execute(
+            "UPDATE docs SET content = ?, layout = 'files', size = ?, updated_at = ?, version = version + 1 WHERE id = ?",
+            (shell, size, updated_at, doc_id),
+        )
+        self._reindex(conn, doc_id, before, after)
+        return join_workspace(shell, stored)
+
+    def _read_content(self, conn: sqlite3.Connection, row: sqlite3.Row) -> str:
+        if row["layout"] != "files":
+            return row["content"]
+        files = conn.execute(
+            "SELECT path, content, meta_json FROM doc_files WHERE doc_id = ? ORDER BY position ASC",
+            (row["id"],),
+        ).fetchall()
+        return join_workspace(row["content"], [(f["path"], f["content"], f["meta_json"]) for f in files])
 
     def create(self, req: DocCreateRequest) -> DocResponse:
         doc_id = req.id or str(uuid.uuid4())
         settings_json = json.dumps(req.settings or {})
-        with self._connect() as conn:
+        with self._doc_pool(doc_id).write() as conn:
+            # Re-creating an existing id keeps its version increasing.
             conn.execute(
-                "INSERT OR REPLACE INTO docs (id, title, content, settings_json) VALUES (?, ?, ?, ?)",
-                (doc_id, req.title, req.content, settings_json),
+                """
+                INSERT OR REPLACE INTO docs (id, title, content, settings_json, version)
+                VALUES (?, ?, '', ?, COALESCE((SELECT version FROM docs WHERE id = ?), 0))
+                """,
+                (doc_id, req.title, settings_json, doc_id),
             )
-            conn.commit()
-        self._update_index(doc_id, req.content)
-        return DocResponse(id=doc_id, title=req.title, content=req.content, settings=req.settings)
+            content = self._write_content(conn, doc_id, req.content)
+            version = self._version(conn, doc_id)
+        doc = DocResponse(id=doc_id, title=req.title, content=content, settings=req.settings, version=version)
+        self._cache.put(doc_id, version, doc)
+        return doc.model_copy()
+
+    def _version(self, conn: sqlite3.Connection, doc_id: str) -> int:
+        return conn.execute("SELECT version FROM docs WHERE id = ?", (doc_id,)).fetchone()["version"]
 
     def get(self, doc_id: str) -> DocResponse | None:
-        with self._connect() as conn:
+        with self._doc_pool(doc_id).read() as conn:
+            probe = conn.execute("SELECT version FROM docs WHERE id = ?", (doc_id,)).fetchone()
+            if probe is None:
+                return None
+            cached = self._cache.get(doc_id, probe["version"])
+            if cached is not None:
+                return cached.model_copy()
             row = conn.execute("SELECT * FROM docs WHERE id = ?", (doc_id,)).fetchone()
             if row is None:
                 return None
-            return DocResponse(
+            doc = DocResponse(
                 id=row["id"],
                 title=row["title"],
-                content=row["content"],
+                content=self._read_content(conn, row),
                 settings=json.loads(row["settings_json"] or "{}"),
+                version=row["version"],
             )
+        self._cache.put(doc_id, row["version"], doc)
+        return doc.model_copy()
+
+    def exists(self, doc_id: str) -> bool:
+        with self._doc_pool(doc_id).read() as conn:
+            return conn.execute("SELECT 1 FROM docs WHERE id = ?", (doc_id,)).fetchone() is not None
+
+    def get_meta(self, doc_id: str) -> dict | None:
+        """Title, size, update time and version without loading content."""
+        with self._doc_pool(doc_id).read() as conn:
+            row = conn.execute(
+                "SELECT id, title, size, updated_at, version FROM docs WHERE id = ?", (doc_id,)
+            ).fetchone()
+            return _with_iso(row, "updated_at") if row else None
+
+    def file_paths(self, doc_id: str) -> list[str] | None:
+        """Paths of `doc_id`'s text files in workspace order, without their content; None if it does not exist."""
+        with self._doc_pool(doc_id).read() as conn:
+            if conn.execute("SELECT 1 FROM docs WHERE id = ?", (doc_id,)).fetchone() is None:
+                return None
+            rows = conn.execute(
+                "SELECT path FROM doc_files WHERE doc_id = ? AND type = 'file' ORDER BY position", (doc_id,)
+            ).fetchall()
+        return [r["path"] for r in rows]
+
+    def read_files(self, doc_id: str, paths: list[str]) -> dict[str, str]:
+        """Text of those of `paths` that are files of `doc_id`, by path."""
+        if not paths:
+            return {}
+        with self._doc_pool(doc_id).read() as conn:
+            rows = conn.execute(
+                f"SELECT path, content FROM doc_files WHERE doc_id = ? AND type = 'file' AND path IN ({', '.join('?' * len(paths))})",
+                [doc_id, *paths],
+            ).fetchall()
+        return {r["path"]: r["content"] or "" for r in rows}
+
+    def list_summaries(self, limit: int = 50, cursor: str | None = None) -> tuple[list[dict], str | None]:
+        """
+        One page of document summaries, most recently updated first.
+
+        `cursor` is the opaque value returned with the previous page; raises ValueError if malformed.
+        """
+        shards = self._engine.shards()
+        # Pages are ordered by (updated_at DESC, shard ASC, rowid DESC); the cursor is the last
+        # item's key, and each shard is asked only for the rows that come after it.
+        after: tuple[int, int, int] | None = None
+        if cursor:
+            try:
+                updated, shard, rowid = (int(part) for part in cursor.split(":"))
+            except ValueError:
+                raise ValueError("Invalid cursor") from None
+            if not 0 <= shard < len(shards):
+                raise ValueError("Invalid cursor")
+            after = (updated, shard, rowid)
+
+        def shard_page(i: int) -> list[tuple[int, sqlite3.Row]]:
+            sql = "SELECT rowid, id, title, size, updated_at FROM docs"
+            params: tuple = ()
+            if after is not None:
+                updated, shard, rowid = after
+                if i < shard:
+                    sql += " WHERE updated_at < ?"
+                    params = (updated,)
+                elif i == shard:
+                    sql += " WHERE (updated_at, rowid) < (?, ?)"
+                    params = (updated, rowid)
+                else:
+                    sql += " WHERE updated_at <= ?"
+                    params = (updated,)
+            with shards[i].read() as conn:
+                found = conn.execute(sql + " ORDER BY updated_at DESC, rowid DESC LIMIT ?", (*params, limit + 1)).fetchall()
+            return [(i, r) for r in found]
+
+        indexes = range(len(shards))
+        pages = list(self._fanout.map(shard_page, indexes)) if self._fanout else [shard_page(i) for i in indexes]
+        rows = sorted(
+            (item for page in pages for item in page),
+            key=lambda item: (-item[1]["updated_at"], item[0], -item[1]["rowid"]),
+        )
+        next_cursor = None
+        if len(rows) > limit:
+            i, last = rows[limit - 1]
+            next_cursor = f"{last['updated_at']}:{i}:{last['rowid']}"
+        items = [
+            {"id": r["id"], "title": r["title"], "size": r["size"], "updated_at": _iso(r["updated_at"])}
+            for _, r in rows[:limit]
+        ]
+        return items, next_cursor
 
     def list(self) -> list[DocResponse]:
-        with self._connect() as conn:
-            rows = conn.execute("SELECT * FROM docs ORDER BY rowid ASC").fetchall()
-            return [
-                DocResponse(
-                    id=row["id"],
-                    title=row["title"],
-                    content=row["content"],
-                    settings=json.loads(row["settings_json"] or "{}"),
-                )
-                for row in rows
-            ]
+        def shard_docs(pool: ConnectionPool) -> list[DocResponse]:
+            with pool.read() as conn:
+                rows = conn.execute("SELECT * FROM docs ORDER BY rowid ASC").fetchall()
+                return [
+                    DocResponse(
+                        id=row["id"],
+                        title=row["title"],
+                        content=self._read_content(conn, row),
+                        settings=json.loads(row["settings_json"] or "{}"),
+                        version=row["version"],
+                    )
+                    for row in rows
+                ]
 
-    def update(self, doc_id: str, title: str | None, content: str, settings: dict) -> DocResponse | None:
+        return [doc for docs in self._fan_out(shard_docs) for doc in docs]
+
+    def update(
+        self,
+        doc_id: str,
+        title: str | None,
+        content: str,
+        settings: dict,
+        expected_version: int | None = None,
+        session_id: str | None = None,
+    ) -> DocResponse | None:
+        """
+        Replace a document's title, content and settings.
+
+        With `expected_version`, raises DocVersionConflict unless that is still the current version.
+        Saves from the same `session_id` in quick succession share one revision (see RevisionPolicy).
+        """
         existing = self.get(doc_id)
         if existing is None:
             return None
-        self._add_revision(doc_id, existing.content)
         settings_json = json.dumps(settings or {})
-        with self._connect() as conn:
+        # Revision and row update share one transaction; triggers reindex within it.
+        with self._doc_pool(doc_id).write() as conn:
+            current = self._version(conn, doc_id)
+            if expected_version is not None and expected_version != current:
+                raise DocVersionConflict(doc_id, expected_version, current)
+            if current != existing.version:
+                # Another writer got in between; revise from what is actually stored.
+                row = conn.execute("SELECT * FROM docs WHERE id = ?", (doc_id,)).fetchone()
+                existing = DocResponse(id=doc_id, content=self._read_content(conn, row), version=current)
+            self._add_revision(doc_id, existing.content, version=current, session_id=session_id)
+            conn.execute(
+                "UPDATE docs SET title = ?, settings_json = ? WHERE id = ?",
+                (title, settings_json, doc_id),
+            )
+            stored = self._write_content(conn, doc_id, content)
+            version = self._version(conn, doc_id)
+        doc = DocResponse(id=doc_id, title=title, content=stored, settings=json.loads(settings_json), version=version)
+        self._cache.put(doc_id, version, doc)
+        return doc.model_copy()
+
+    def patch_files(
+        self,
+        doc_id: str,
+        upsert: dict[str, Any],
+        delete: list[str],
+        expected_version: int | None = None,
+        session_id: str | None = None,
+    ) -> dict | None:
+        """
+        Upsert or delete individual workspace entries without rewriting the rest of the document.
+
+        Returns None if the document does not exist; raises ValueError if it is not a workspace
+        and DocVersionConflict if `expected_version` is stale.
+        """
+        with self._doc_pool(doc_id).write() as conn:
+            row = conn.execute("SELECT * FROM docs WHERE id = ?", (doc_id,)).fetchone()
+            if row is None:
+                return None
+            if expected_version is not None and expected_version != row["version"]:
+                raise DocVersionConflict(doc_id, expected_version, row["version"])
+            if row["layout"] != "files":
+                if (row["content"] or "").strip():
+                    raise ValueError("Document is not a file workspace")
+                conn.execute("UPDATE docs SET content = ?, layout = 'files' WHERE id = ?", ('{"entries":{}}', doc_id))
+            self._add_revision(
+                doc_id, lambda: self._read_content(conn, row), version=row["version"], session_id=session_id
+            )
+            # A path listed twice must not have its size subtracted twice.
+            delete = list(dict.fromkeys(delete))
+            upserted = [path for path in upsert if path not in delete]
+            size_delta = 0
+            before: dict[str, tuple] = {}
+            for path in [*upserted, *delete]:
+                old = conn.execute(
+                    "SELECT type, content, meta_json FROM doc_files WHERE doc_id = ? AND path = ?", (doc_id, path)
+                ).fetchone()
+                if old is not None:
+                    size_delta -= _entry_size(old["content"], old["meta_json"])
+                    before[path] = (old["type"], old["content"])
+            after: dict[str, tuple] = {}
+            for path in upserted:
+                kind, content, meta_json = entry_columns(upsert[path])
+                size_delta += _entry_size(content, meta_json)
+                after[path] = (kind, content)
+            if upserted:
+                conn.executemany(
+                    """
+                    INSERT INTO doc_files (doc_id, path, position, type, content, meta_json)
+                    VALUES (?, ?, (SELECT COALESCE(MAX(position), -1) + 1 FROM doc_files WHERE doc_id = ?), ?, ?, ?)
+                    ON CONFLICT(doc_id, path) DO UPDATE SET
+                      type = excluded.type, content = excluded.content, meta_json = excluded.meta_json
+                    """,
+                    [(doc_id, path, doc_id, *entry_columns(upsert[path])) for path in upserted],
+                )
+            if delete:
+                conn.executemany(
+                    "DELETE FROM doc_files WHERE doc_id = ? AND path = ?",
+                    [(doc_id, path) for path in delete],
+                )
             conn.execute(
-                "UPDATE docs SET title = ?, content = ?, settings_json = ? WHERE id = ?",
-                (title, content, settings_json, doc_id),
+                "UPDATE docs SET size = size + ?, updated_at = ?, version = version + 1 WHERE id = ?",
+                (size_delta, _now_ms(), doc_id),
             )
-            conn.commit()
-        self._update_index(doc_id, content)
-        return self.get(doc_id)
+            self._reindex(conn, doc_id, before, after)
+            version = self._version(conn, doc_id)
+        self._cache.invalidate(doc_id)
+        return {"id": doc_id, "upserted": upserted, "deleted": list(delete), "version": version}
 
     def get_models(self, doc_id: str) -> list[dict] | None:
-        if self.get(doc_id) is None:
+        if not self.exists(doc_id):
             return None
-        with self._connect() as conn:
+        with self._doc_pool(doc_id).read() as conn:
             row = conn.execute(
                 "SELECT models_json FROM doc_models WHERE doc_id = ?", (doc_id,)
             ).fetchone()
@@ -192,106 +1099,428 @@ class DocStore:
             return list(json.loads(row["models_json"] or "[]"))
 
     def set_models(self, doc_id: str, models: list[dict]) -> list[dict] | None:
-        if self.get(doc_id) is None:
+        if not self.exists(doc_id):
             return None
         models_json = json.dumps(models or [])
-        with self._connect() as conn:
+        with self._doc_pool(doc_id).write() as conn:
             conn.execute(
                 "INSERT OR REPLACE INTO doc_models (doc_id, models_json) VALUES (?, ?)",
                 (doc_id, models_json),
             )
-            conn.commit()
         return self.get_models(doc_id)
 
-    def _add_revision(self, doc_id: str, content: str) -> None:
-        rev_id = str(uuid.uuid4())
-        created_at = datetime.now(timezone.utc).isoformat()
-        with self._connect() as conn:
+    def _add_revision(
+        self,
+        doc_id: str,
+        content: str | Callable[[], str],
+        *,
+        version: int,
+        session_id: str | None = None,
+        checkpoint: bool = False,
+        label: str | None = None,
+    ) -> str:
+        """
+        Record `content` (the document at `version`) as a revision unless the policy folds it away.
+
+        `content` may be a callable so folded saves never materialize the document. Returns the id
+        of the revision that now holds this state.
+        """
+        now = _now_ms()
+        with self._doc_pool(doc_id).write() as conn:
+            latest = conn.execute(
+                """
+                SELECT id, seq, doc_version, session_id, created_at, touched_at, checkpoint FROM doc_revisions
+                WHERE doc_id = ? ORDER BY seq DESC LIMIT 1
+                """,
+                (doc_id,),
+            ).fetchone()
+            policy = self._revision_policy
+            if latest is not None and latest["doc_version"] == version:
+                # Already captured (e.g. a checkpoint right before this save).
+                if checkpoint:
+                    conn.execute(
+                        "UPDATE doc_revisions SET checkpoint = 1, label = COALESCE(?, label) WHERE id = ?",
+                        (label, latest["id"]),
+                    )
+                return latest["id"]
+            if (
+                not checkpoint
+                and session_id
+                and latest is not None
+                and latest["session_id"] == session_id
+                and not latest["checkpoint"]
+                and latest["touched_at"] is not None
+                and now - latest["touched_at"] < policy.coalesce_window_s * 1000
+                # touched_at moves with every folded save; created_at bounds how long one
+                # revision can keep absorbing a session that never pauses.
+                and now - latest["created_at"] < policy.coalesce_max_span_s * 1000
+            ):
+                conn.execute("UPDATE doc_revisions SET touched_at = ? WHERE id = ?", (now, latest["id"]))
+                return latest["id"]
+
+            rev_id = str(uuid.uuid4())
+            last = latest["seq"] if latest is not None else None
+            seq = (last or 0) + 1
+            prev = self._revision_content(conn, doc_id, last) if last else None
+            text = content() if callable(content) else content
+            kind, payload = self._encode_revision(seq, prev, text or "")
             conn.execute(
-                "INSERT INTO doc_revisions (id, doc_id, content, created_at) VALUES (?, ?, ?, ?)",
-                (rev_id, doc_id, content or "", created_at),
+                """
+                INSERT INTO doc_revisions
+                  (id, doc_id, content, created_at, seq, kind, payload, doc_version, session_id, touched_at, checkpoint, label)
+                VALUES (?, ?, '', ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                """,
+                (rev_id, doc_id, now, seq, kind, payload, version, session_id, now, int(checkpoint), label),
+            )
+            thin_every = policy.thin_every
+            if thin_every > 0 and seq % thin_every == 0:
+                self._thin_revisions(conn, doc_id, now / 1000)
+            return rev_id
+
+    def create_checkpoint(self, doc_id: str, label: str | None = None) -> dict | None:
+        """Record the current content as a checkpoint revision, which is never coalesced or thinned."""
+        with self._doc_pool(doc_id).write() as conn:
+            row = conn.execute("SELECT * FROM docs WHERE id = ?", (doc_id,)).fetchone()
+            if row is None:
+                return None
+            rev_id = self._add_revision(
+                doc_id, lambda: self._read_content(conn, row), version=row["version"], checkpoint=True, label=label
+            )
+            return _with_iso(
+                conn.execute(
+                    "SELECT id, doc_id, created_at, checkpoint, label FROM doc_revisions WHERE id = ?", (rev_id,)
+                ).fetchone(),
+                "created_at",
             )
-            conn.commit()
+
+    def thin_revisions(self, doc_id: str, now: float | None = None) -> int | None:
+        """Drop revisions the policy no longer keeps; returns how many were removed."""
+        if not self.exists(doc_id):
+            return None
+        with self._doc_pool(doc_id).write() as conn:
+            return self._thin_revisions(conn, doc_id, now if now is not None else datetime.now(timezone.utc).timestamp())
+
+    def _thin_revisions(self, conn: sqlite3.Connection, doc_id: str, now: float) -> int:
+        rows = conn.execute(
+            "SELECT id, kind, payload, created_at, checkpoint FROM doc_revisions WHERE doc_id = ? ORDER BY seq ASC",
+            (doc_id,),
+        ).fetchall()
+        keep = self._revision_policy.kept(
+            [(r["created_at"] / 1000, bool(r["checkpoint"])) for r in rows], now
+        )
+        if all(keep):
+            return 0
+        # Deleting from the middle of a delta chain breaks it, so re-encode the survivors.
+        contents: list[str] = []
+        for row in rows:
+            contents.append(revisions.decode(row["kind"], row["payload"], contents[-1] if contents else None))
+        conn.executemany(
+            "DELETE FROM doc_revisions WHERE id = ?", [(row["id"],) for row, k in zip(rows, keep) if not k]
+        )
+        prev: str | None = None
+        seq = 0
+        for row, content, k in zip(rows, contents, keep):
+            if not k:
+                continue
+            seq += 1
+            kind, payload = self._encode_revision(seq, prev, content)
+            conn.execute(
+                "UPDATE doc_revisions SET seq = ?, kind = ?, payload = ? WHERE id = ?",
+                (seq, kind, payload, row["id"]),
+            )
+            prev = content
+        return keep.count(False)
 
     def list_revisions(self, doc_id: str) -> list[dict] | None:
-        if self.get(doc_id) is None:
+        if not self.exists(doc_id):
             return None
-        with self._connect() as conn:
+        with self._doc_pool(doc_id).read() as conn:
             rows = conn.execute(
-                "SELECT id, doc_id, created_at FROM doc_revisions WHERE doc_id = ? ORDER BY created_at DESC",
+                "SELECT id, doc_id, created_at, checkpoint, label FROM doc_revisions WHERE doc_id = ? ORDER BY seq DESC",
                 (doc_id,),
             ).fetchall()
-            return [dict(row) for row in rows]
+            return [_with_iso(row, "created_at") for row in rows]
 
     def get_revision(self, doc_id: str, rev_id: str) -> dict | None:
-        if self.get(doc_id) is None:
+        if not self.exists(doc_id):
             return None
-        with self._connect() as conn:
+        with self._doc_pool(doc_id).read() as conn:
             row = conn.execute(
-                "SELECT * FROM doc_revisions WHERE id = ? AND doc_id = ?",
+                "SELECT id, doc_id, seq, created_at FROM doc_revisions WHERE id = ? AND doc_id = ?",
                 (rev_id, doc_id),
             ).fetchone()
-            return dict(row) if row else None
+            if row is None:
+                return None
+            return {
+                "id": row["id"],
+                "doc_id": row["doc_id"],
+                "content": self._revision_content(conn, doc_id, row["seq"]),
+                "created_at": _iso(row["created_at"]),
+            }
 
     def restore_revision(self, doc_id: str, rev_id: str) -> DocResponse | None:
+        doc = self.get(doc_id)
+        if doc is None:
+            return None
         rev = self.get_revision(doc_id, rev_id)
         if rev is None:
             return None
-        return self.update(doc_id, title=self.get(doc_id).title if self.get(doc_id) else None, content=rev["content"], settings=self.get(doc_id).settings if self.get(doc_id) else {})
-
-    def _update_index(self, doc_id: str, content: str) -> None:
-        try:
-            data = json.loads(content or "{}")
-            entries = data.get("entries", {})
-        except Exception:
-            entries = {}
-        rows: list[tuple[str, str, str]] = []
-        for path, entry in entries.items():
-            if not isinstance(entry, dict):
-                continue
-            if entry.get("type") != "file":
-                continue
-            body = entry.get("content") or ""
-            rows.append((doc_id, path, body))
-        with self._connect() as conn:
-            conn.execute("DELETE FROM doc_files_fts WHERE doc_id = ?", (doc_id,))
-            if rows:
-                conn.executemany(
-                    "INSERT INTO doc_files_fts (doc_id, path, content) VALUES (?, ?, ?)",
-                    rows,
+        return self.update(doc_id, title=doc.title, content=rev["content"], settings=doc.settings)
+
+    def _reindex(self, conn: sqlite3.Connection, doc_id: str, before: dict[str, tuple], after: dict[str, tuple]) -> None:
+        """
+        Account for a write that took files from `before` to `after` ((type, content) by path).
+
+        The search index is kept by triggers; this records what they did and replaces the
+        symbols of just the files whose text changed.
+        """
+        changed = _changed_files(before, after)
+        reindexed = sum(text is not None for text in changed.values())
+        files = sum(kind == "file" for kind, _ in after.values())
+        stats = IndexStats(reindexed=reindexed, skipped=files - reindexed, removed=len(changed) - reindexed)
+        self._index_totals.add(stats)
+        logger.debug("reindexed doc %s: %s", doc_id, stats)
+        if not self._symbols or not changed:
+            return
+        before_macros = _project_macros(conn, doc_id)
+        conn.executemany("DELETE FROM doc_symbols WHERE doc_id = ? AND path = ?", [(doc_id, p) for p in changed])
+        macros = _project_macros(conn, doc_id).union(
+            *(macro_definitions(text, path) for path, text in changed.items() if text is not None)
+        )
+        for path, text in changed.items():
+            if text is not None:
+                _insert_symbols(conn, doc_id, path, extract_symbols(text, path, macros))
+        if macros == before_macros:
+            return
+        # A macro was defined or dropped: the other files' uses of project macros change too.
+        rows = conn.execute("SELECT path, content FROM doc_files WHERE doc_id = ? AND type = 'file'", (doc_id,)).fetchall()
+        others = [(r["path"], r["content"] or "") for r in rows if r["path"] not in changed]
+        conn.executemany(
+            "DELETE FROM doc_symbols WHERE doc_id = ? AND path = ? AND kind = 'macro' AND role = ?",
+            [(doc_id, path, USE) for path, _ in others],
+        )
+        for path, text in others:
+            uses = [s for s in extract_symbols(text, path, macros) if s.kind == "macro" and s.role == USE]
+            _insert_symbols(conn, doc_id, path, uses)
+
+    def find_symbols(
+        self, doc_id: str, kind: str | None = None, name: str | None = None, role: str | None = None
+    ) -> list[dict] | None:
+        """Symbols of `doc_id` matching the given kind, exact name and role, by file and position; None if it does not exist."""
+        filters, args = "", [doc_id]
+        for column, value in (("kind", kind), ("name", name), ("role", role)):
+            if value is not None:
+                filters += f" AND {column} = ?"
+                args.append(value)
+        with self._doc_pool(doc_id).read() as conn:
+            if conn.execute("SELECT 1 FROM docs WHERE id = ?", (doc_id,)).fetchone() is None:
+                return None
+            # "+path": sorting the few matches beats walking the position index to avoid the sort.
+            rows = conn.execute(
+                f"SELECT {_SYMBOL_COLUMNS} FROM doc_symbols WHERE doc_id = ?{filters} ORDER BY +path, start", args
+            ).fetchall()
+        return [dict(r) for r in rows]
+
+    def symbol_at(self, doc_id: str, path: str, offset: int) -> dict | None:
+        """The symbol whose name spans `offset` in `path` (its end counts, for a cursor just after it)."""
+        with self._doc_pool(doc_id).read() as conn:
+            row = conn.execute(
+                f"""
+                SELECT {_SYMBOL_COLUMNS} FROM doc_symbols
+                WHERE doc_id = ? AND path = ? AND start <= ? AND end >= ?
+                ORDER BY start DESC LIMIT 1
+                """,
+                (doc_id, path, offset, offset),
+            ).fetchone()
+        return dict(row) if row else None
+
+    def undefined_references(self, doc_id: str) -> list[dict] | None:
+        """Uses of labels and citation keys that nothing in the project defines; None if `doc_id` does not exist."""
+        with self._doc_pool(doc_id).read() as conn:
+            if conn.execute("SELECT 1 FROM docs WHERE id = ?", (doc_id,)).fetchone() is None:
+                return None
+            # Distinct missing names first (from the covering name index), then their uses.
+            rows = conn.execute(
+                """
+                WITH missing AS (
+                  SELECT kind, name FROM doc_symbols WHERE doc_id = ? AND kind IN ('label', 'cite') AND role = ?
+                  EXCEPT
+                  SELECT kind, name FROM doc_symbols WHERE doc_id = ? AND kind IN ('label', 'cite') AND role = ?
                 )
-            conn.commit()
+                SELECT s.path, s.kind, s.name, s.role, s.start, s.end, s.line FROM missing m
+                JOIN doc_symbols s ON s.doc_id = ? AND s.kind = m.kind AND s.name = m.name AND s.role = ?
+                ORDER BY +s.path, s.start
+                """,
+                (doc_id, USE, doc_id, DEF, doc_id, USE),
+            ).fetchall()
+        return [dict(r) for r in rows]
+
+    def stats(self) -> dict:
+        writes = {"writes": 0, "commits": 0}
+        for pool in self._engine.pools():
+            for key, value in pool.stats().items():
+                writes[key] += value
+        return {
+            "index": self._index_totals.as_dict(),
+            "cache": self._cache.stats(),
+            "search_cache": self._search_cache.stats(),
+            "writes": writes,
+        }
+
+    def search(self, doc_id: str | None, query: str, limit: int = 50, offset: int = 0) -> list[dict]:
+        return self.search_page(doc_id, query, limit, offset)["results"]
+
+    def search_page(
+        self,
+        doc_id: str | None,
+        query: str,
+        limit: int = 20,
+        offset: int = 0,
+        count_cap: int = SEARCH_COUNT_CAP,
+        mode: str = "auto",
+        prefix: bool = False,
+    ) -> dict:
+        """
+        One page of full-text hits for `query`, best first by bm25, in one document or all of them.
+
+        `mode` picks the index: "words" (FTS5 query syntax over whole words), "substring" (every
+        term anywhere in the text, via the trigram index) or "auto", which uses substring for
+        queries with LaTeX punctuation such as `\\label{sec:` and words otherwise. Word queries
+        go through compile_query, so punctuation is never FTS syntax; `prefix` makes the last
+        word match as a prefix for search-as-you-type. Raises ValueError if a substring search
+        is impossible.
 
-    def search(self, doc_id: str | None, query: str) -> list[dict]:
+        Returns {"results", "total", "total_exact", "index"}. Snippets are built only for the
+        returned hits and counting stops past `count_cap`, so the cost follows the page, not the
+        match count. With shards, each ranks its own top offset + limit and the lists are merged
+        by score; bm25 statistics are per shard, so scores across shards are close but not identical.
+
+        Results are cached by query and index generation, so repeating a search is a lookup.
+        """
+        empty = {"results": [], "total": 0, "total_exact": True, "index": "words"}
         if not query:
-            return []
-        with self._connect() as conn:
-            if doc_id:
-                rows = conn.execute(
-                    "SELECT doc_id, path, snippet(doc_files_fts, 2, '[', ']', '...', 20) as snippet FROM doc_files_fts WHERE doc_id = ? AND doc_files_fts MATCH ?",
-                    (doc_id, query),
-                ).fetchall()
-            else:
-                rows = conn.execute(
-                    "SELECT doc_id, path, snippet(doc_files_fts, 2, '[', ']', '...', 20) as snippet FROM doc_files_fts WHERE doc_files_fts MATCH ?",
-                    (query,),
+            return empty
+        index = self._search_index(query, mode)
+        if index == "substring":
+            table = "doc_files_trigram"
+            match, short = _substring_terms(query)
+            if match is None:
+                raise ValueError("Substring search needs a term of at least 3 characters")
+        else:
+            table, match, short = "doc_files_fts", compile_query(query, prefix), []
+            if match is None:
+                return empty
+        key = (doc_id, index, match, tuple(short), limit, offset, count_cap, self._index_generation(doc_id))
+        cached = self._search_cache.get(key)
+        if cached is None:
+            cached = self._search_uncached(doc_id, index, table, match, short, limit, offset, count_cap)
+            self._search_cache.put(key, cached)
+        return {**cached, "results": [dict(hit) for hit in cached["results"]]}
+
+    def _index_generation(self, doc_id: str | None) -> tuple:
+        """What a cached result depends on: the document's version, or every shard's index generation."""
+        if doc_id:
+            with self._doc_pool(doc_id).read() as conn:
+                row = conn.execute("SELECT version FROM docs WHERE id = ?", (doc_id,)).fetchone()
+            return (row["version"] if row else None,)
+        generations = []
+        for pool in self._engine.shards():
+            with pool.read() as conn:
+                generations.append(conn.execute("SELECT generation FROM search_index_state").fetchone()[0])
+        return tuple(generations)
+
+    def _search_uncached(
+        self,
+        doc_id: str | None,
+        index: str,
+        table: str,
+        match: str,
+        short: list[str],
+        limit: int,
+        offset: int,
+        count_cap: int,
+    ) -> dict:
+        filters = "".join(" AND instr(lower(content), ?) > 0" for _ in short)
+        filter_args: tuple = tuple(t.lower() for t in short)
+        if doc_id:
+            filters += " AND doc_id = ?"
+            filter_args += (doc_id,)
+
+        def shard_page(pool: ConnectionPool) -> tuple[list[sqlite3.Row], int]:
+            with pool.read() as conn:
+                ranked = conn.execute(
+                    f"""
+                    SELECT rowid, doc_id, path, rank FROM {table}
+                    WHERE {table} MATCH ? AND rank MATCH ?{filters}
+                    ORDER BY rank LIMIT ?
+                    """,
+                    (match, _SEARCH_RANK, *filter_args, offset + limit),
                 ).fetchall()
-            return [dict(row) for row in rows]
+                total = conn.execute(
+                    f"SELECT COUNT(*) FROM (SELECT 1 FROM {table} WHERE {table} MATCH ?{filters} LIMIT ?)",
+                    (match, *filter_args, count_cap + 1),
+                ).fetchone()[0]
+            return ranked, total
+
+        pools = [self._doc_pool(doc_id)] if doc_id else self._engine.shards()
+        pages = [shard_page(pools[0])] if doc_id else self._fan_out(shard_page)
+        merged = sorted(
+            ((i, row) for i, (ranked, _) in enumerate(pages) for row in ranked),
+            key=lambda hit: (hit[1]["rank"], hit[0], hit[1]["rowid"]),
+        )[offset:offset + limit]
+
+        # Trigram "tokens" are single characters of context, so its snippets ask for more of them.
+        tokens = 48 if index == "substring" else 20
+        snippets: dict[tuple[int, int], str] = {}
+        for i in {i for i, _ in merged}:
+            rowids = [row["rowid"] for j, row in merged if j == i]
+            with pools[i].read() as conn:
+                for row in conn.execute(
+                    f"""
+                    SELECT rowid, snippet({table}, 2, '[', ']', '...', {tokens}) AS snippet FROM {table}
+                    WHERE {table} MATCH ? AND rowid IN ({",".join("?" * len(rowids))})
+                    """,
+                    (match, *rowids),
+                ):
+                    snippets[(i, row["rowid"])] = row["snippet"]
+
+        counted = sum(total for _, total in pages)
+        return {
+            "results": [
+                {"doc_id": row["doc_id"], "path": row["path"], "snippet": snippets.get((i, row["rowid"]))}
+                for i, row in merged
+            ],
+            "total": min(counted, count_cap),
+            "total_exact": counted <= count_cap,
+            "index": index,
+        }
+
+    def _search_index(self, query: str, mode: str) -> str:
+        if mode == "words":
+            return "words"
+        if mode == "substring":
+            if not self._trigram:
+                raise ValueError("Substring search is not available with this SQLite build")
+            return "substring"
+        if mode != "auto":
+            raise ValueError(f"Unknown search mode {mode!r}")
+        if self._trigram and any(c in _CODE_CHARS for c in query) and _substring_terms(query)[0] is not None:
+            return "substring"
+        return "words"
 
     def create_user(self, username: str, password: str) -> dict:
         user_id = str(uuid.uuid4())
         salt = secrets.token_hex(8)
         pwd_hash = hashlib.sha256((salt + password).encode("utf-8")).hexdigest()
-        with self._connect() as conn:
+        with self._pool.write() as conn:
             conn.execute(
                 "INSERT INTO users (id, username, password_hash, salt) VALUES (?, ?, ?, ?)",
                 (user_id, username, pwd_hash, salt),
             )
-            conn.commit()
         return {"id": user_id, "username": username}
 
     def get_user_by_username(self, username: str) -> dict | None:
-        with self._connect() as conn:
+        with self._pool.read() as conn:
             row = conn.execute("SELECT * FROM users WHERE username = ?", (username,)).fetchone()
             return dict(row) if row else None
 
@@ -306,17 +1535,15 @@ class DocStore:
 
     def create_session(self, user_id: str) -> str:
         token = secrets.token_hex(16)
-        created_at = datetime.now(timezone.utc).isoformat()
-        with self._connect() as conn:
+        with self._pool.write() as conn:
             conn.execute(
                 "INSERT INTO sessions (token, user_id, created_at) VALUES (?, ?, ?)",
-                (token, user_id, created_at),
+                (token, user_id, _now_ms()),
             )
-            conn.commit()
         return token
 
     def get_user_by_token(self, token: str) -> dict | None:
-        with self._connect() as conn:
+        with self._pool.read() as conn:
             row = conn.execute(
                 "SELECT u.id, u.username FROM sessions s JOIN users u ON s.user_id = u.id WHERE s.token = ?",
                 (token,),
@@ -324,80 +1551,48 @@ class DocStore:
             return dict(row) if row else None
 
     def delete_session(self, token: str) -> None:
-        with self._connect() as conn:
+        with self._pool.write() as conn:
             conn.execute("DELETE FROM sessions WHERE token = ?", (token,))
-            conn.commit()
 
     def create_share(self, doc_id: str) -> str | None:
-        if self.get(doc_id) is None:
+        if not self.exists(doc_id):
             return None
         token = secrets.token_hex(12)
-        created_at = datetime.now(timezone.utc).isoformat()
-        with self._connect() as conn:
+        with self._pool.write() as conn:
             conn.execute(
                 "INSERT INTO doc_shares (token, doc_id, created_at) VALUES (?, ?, ?)",
-                (token, doc_id, created_at),
+                (token, doc_id, _now_ms()),
             )
-            conn.commit()
         return token
 
     def get_share(self, token: str) -> dict | None:
-        with self._connect() as conn:
+        with self._pool.read() as conn:
             row = conn.execute(
                 "SELECT token, doc_id FROM doc_shares WHERE token = ?",
                 (token,),
             ).fetchone()
             return dict(row) if row else None
 
-    def heartbeat_presence(self, doc_id: str, user_id: str, display_name: str) -> dict:
-        pid = f"{doc_id}:{user_id}"
-        now = datetime.now(timezone.utc).isoformat()
-        with self._connect() as conn:
-            conn.execute(
-                "INSERT OR REPLACE INTO presence (id, doc_id, user_id, display_name, last_seen) VALUES (?, ?, ?, ?, ?)",
-                (pid, doc_id, user_id, display_name, now),
-            )
-            conn.commit()
-        return {"id": pid, "doc_id": doc_id, "user_id": user_id, "display_name": display_name, "last_seen": now}
-
-    def list_presence(self, doc_id: str, since_seconds: int = 45) -> list[dict]:
-        cutoff = datetime.now(timezone.utc).timestamp() - since_seconds
-        with self._connect() as conn:
-            rows = conn.execute(
-                "SELECT * FROM presence WHERE doc_id = ?",
-                (doc_id,),
-            ).fetchall()
-            result = []
-            for row in rows:
-                try:
-                    ts = datetime.fromisoformat(row["last_seen"]).timestamp()
-                except Exception:
-                    ts = 0
-                if ts >= cutoff:
-                    result.append(dict(row))
-            return result
-
     def list_comments(self, doc_id: str) -> list[dict] | None:
-        if self.get(doc_id) is None:
+        if not self.exists(doc_id):
             return None
-        with self._connect() as conn:
+        with self._doc_pool(doc_id).read() as conn:
             rows = conn.execute(
-                "SELECT * FROM doc_comments WHERE doc_id = ? ORDER BY created_at ASC",
+                "SELECT * FROM doc_comments WHERE doc_id = ? ORDER BY created_at ASC, rowid ASC",
                 (doc_id,),
             ).fetchall()
-            return [dict(row) for row in rows]
+            return [_with_iso(row, "created_at") for row in rows]
 
     def add_comment(self, doc_id: str, body: str, path: str | None, selection_start: int | None, selection_end: int | None) -> dict | None:
-        if self.get(doc_id) is None:
+        if not self.exists(doc_id):
             return None
         comment_id = str(uuid.uuid4())
-        created_at = datetime.now(timezone.utc).isoformat()
-        with self._connect() as conn:
+        created_at = _now_ms()
+        with self._doc_pool(doc_id).write() as conn:
             conn.execute(
                 "INSERT INTO doc_comments (id, doc_id, body, path, selection_start, selection_end, created_at) VALUES (?, ?, ?, ?, ?, ?, ?)",
                 (comment_id, doc_id, body, path, selection_start, selection_end, created_at),
             )
-            conn.commit()
         return {
             "id": comment_id,
             "doc_id": doc_id,
@@ -405,28 +1600,27 @@ class DocStore:
             "path": path,
             "selection_start": selection_start,
             "selection_end": selection_end,
-            "created_at": created_at,
+            "created_at": _iso(created_at),
         }
 
     def list_logs(self, doc_id: str) -> list[dict] | None:
-        if self.get(doc_id) is None:
+        if not self.exists(doc_id):
             return None
-        with self._connect() as conn:
+        with self._doc_pool(doc_id).read() as conn:
             rows = conn.execute(
-                "SELECT * FROM doc_logs WHERE doc_id = ? ORDER BY created_at DESC",
+                "SELECT * FROM doc_logs WHERE doc_id = ? ORDER BY created_at DESC, rowid DESC",
                 (doc_id,),
             ).fetchall()
-            return [dict(row) for row in rows]
+            return [_with_iso(row, "created_at") for row in rows]
 
     def add_log(self, doc_id: str, body: str) -> dict | None:
-        if self.get(doc_id) is None:
+        if not self.exists(doc_id):
             return None
         log_id = str(uuid.uuid4())
-        created_at = datetime.now(timezone.utc).isoformat()
-        with self._connect() as conn:
+        created_at = _now_ms()
+        with self._doc_pool(doc_id).write() as conn:
             conn.execute(
                 "INSERT INTO doc_logs (id, doc_id, body, created_at) VALUES (?, ?, ?, ?)",
                 (log_id, doc_id, body, created_at),
             )
-            conn.commit()
-        return {"id": log_id, "doc_id": doc_id, "body": body, "created_at": created_at}
+        return {"id": log_id, "doc_id": doc_id, "body": body, "created_at": _iso(created_at)}
@@ -0,0 +1,58 @@
+from __future__ import annotations
+
+import json
+from typing import Any
+
+# A workspace document is the JSON the editor saves: {"active": ..., "entries": {path: {type, content}}}.
+# Stores keep the entries as individual rows and the remaining keys as a "shell" object.
+
+
+def dumps(value: Any) -> str:
+    # Matches JSON.stringify output so round-tripped documents look like what the editor sent.
+    return json.dumps(value, separators=(",", ":"), ensure_ascii=False)
+
+
+def split_workspace(content: str) -> tuple[str, list[tuple[str, Any]]] | None:
+    """Split workspace JSON into (shell_json, [(path, entry), ...]); None if `content` is not a workspace."""
+    if not content or not content.lstrip().startswith("{"):
+        return None
+    try:
+        data = json.loads(content)
+    except ValueError:
+        return None
+    if not isinstance(data, dict) or not isinstance(data.get("entries"), dict):
+        return None
+    entries = list(data["entries"].items())
+    data["entries"] = {}
+    return dumps(data), entries
+
+
+def entry_columns(entry: Any) -> tuple[str | None, str | None, str]:
+    """Map one entry to its (type, content, meta_json) columns."""
+    if not isinstance(entry, dict):
+        return None, None, dumps(entry)
+    meta = {k: v for k, v in entry.items() if k != "content"}
+    content = entry.get("content")
+    if content is not None and not isinstance(content, str):
+        # Non-string content is kept verbatim in meta so it round-trips unchanged.
+        return entry.get("type"), None, dumps(entry)
+    return entry.get("type"), content, dumps(meta)
+
+
+def entry_from_columns(content: str | None, meta_json: str) -> Any:
+    entry = json.loads(meta_json)
+    if content is not None and isinstance(entry, dict):
+        entry["content"] = content
+    return entry
+
+
+def join_workspace(shell_json: str, rows) -> str:
+    """Rebuild workspace JSON from its shell and (path, content, meta_json) rows in position order."""
+    try:
+        data = json.loads(shell_json or "{}")
+    except ValueError:
+        data = {}
+    if not isinstance(data, dict):
+        data = {}
+    data["entries"] = {path: entry_from_columns(content, meta_json) for path, content, meta_json in rows}
+    return dumps(data)
@@ -0,0 +1,80 @@
+from __future__ import annotations
+
+import re
+from dataclasses import dataclass
+
+# A sectioning command at the start of a line always begins a new chunk.
+_SECTION_RE = re.compile(r"^[ \t]*\\(?:part|chapter|section|subsection|subsubsection)\*?\s*[\[{]", re.MULTILINE)
+_PARAGRAPH_BREAK_RE = re.compile(r"\n[ \t]*\n")
+
+DEFAULT_MAX_CHARS = 1200
+
+
+@dataclass(frozen=True)
+class Chunk:
+    start: int
+    end: int
+    text: str
+
+
+def chunk_text(text: str, max_chars: int = DEFAULT_MAX_CHARS) -> list[Chunk]:
+    """
+    Split a file into retrieval chunks: paragraphs of one section packed up to `max_chars`.
+
+    Chunks never span a section heading, a paragraph longer than `max_chars` is cut at line
+    ends, and `start`/`end` are offsets into `text` with surrounding whitespace trimmed.
+    """
+    chunks: list[Chunk] = []
+    for sec_start, sec_end in _sections(text):
+        start: int | None = None
+        end = 0
+        for p_start, p_end in _paragraphs(text, sec_start, sec_end):
+            for s, e in _split_long(text, p_start, p_end, max_chars):
+                if start is not None and e - start > max_chars:
+                    chunks.append(Chunk(start, end, text[start:end]))
+                    start = None
+                if start is None:
+                    start = s
+                end = e
+        if start is not None:
+            chunks.append(Chunk(start, end, text[start:end]))
+    return chunks
+
+
+def _sections(text: str) -> list[tuple[int, int]]:
+    bounds = [0, *(m.start() for m in _SECTION_RE.finditer(text) if m.start() > 0), len(text)]
+    return list(zip(bounds, bounds[1:]))
+
+
+def _paragraphs(text: str, start: int, end: int) -> list[tuple[int, int]]:
+    out = []
+    pos = start
+    for m in _PARAGRAPH_BREAK_RE.finditer(text, start, end):
+        out.append((pos, m.start()))
+        pos = m.end()
+    out.append((pos, end))
+    return [span for span in (_trim(text, s, e) for s, e in out) if span[0] < span[1]]
+
+
+def _trim(text: str, start: int, end: int) -> tuple[int, int]:
+    while start < end and text[start].isspace():
+        start += 1
+    while end > start and text[end - 1].isspace():
+        end -= 1
+    return start, end
+
+
+def _split_long(text: str, start: int, end: int, max_chars: int) -> list[tuple[int, int]]:
+    out = []
+    while end - start > max_chars:
+        cut = text.rfind("\n", start + 1, start + max_chars)
+        if cut <= start:
+            cut = start + max_chars
+        s, e = _trim(text, start, cut)
+        if s < e:
+            out.append((s, e))
+        start = cut
+    s, e = _trim(text, start, end)
+    if s < e:
+        out.append((s, e))
+    return out
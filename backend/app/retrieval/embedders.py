@@ -0,0 +1,87 @@
+from __future__ import annotations
+
+import hashlib
+import math
+import re
+from collections import Counter
+from functools import lru_cache
+from pathlib import Path
+from typing import Any, Protocol
+
+try:
+    import numpy as np
+except ImportError:
+    np = None  # type: ignore[assignment]
+
+
+class Embedder(Protocol):
+    # Stored with the index; vectors from a differently named embedder are discarded.
+    name: str
+    dim: int
+
+    def embed(self, texts: list[str]) -> Any:
+        """Return a float32 array of shape (len(texts), dim) with unit-length rows."""
+        ...
+
+
+_TOKEN_RE = re.compile(r"\\[a-z]+|[^\W\d_]{2,}|\d+")
+
+
+@lru_cache(maxsize=65536)
+def _bucket(feature: str, dim: int) -> tuple[int, float]:
+    # hash() is salted per process, so a stable digest keeps vectors valid across restarts.
+    h = int.from_bytes(hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest(), "little")
+    return h % dim, 1.0 if h >> 63 else -1.0
+
+
+class HashingEmbedder:
+    """
+    Offline and deterministic: words, LaTeX macros and word prefixes hashed into `dim` signed
+    buckets with sublinear term frequency. It finds passages sharing vocabulary even when
+    their wording differs in inflection or order; it does not know synonyms.
+    """
+
+    def __init__(self, dim: int = 512):
+        self.dim = dim
+        self.name = f"hashing-{dim}"
+
+    def _features(self, text: str) -> Counter[str]:
+        features: Counter[str] = Counter()
+        for token in _TOKEN_RE.findall(text.lower()):
+            features[token] += 1
+            if len(token) > 5 and not token.startswith("\\"):
+                # "converges" and "convergence" share "conve".
+                features[token[:5] + "~"] += 1
+        return features
+
+    def embed(self, texts: list[str]) -> Any:
+        if np is None:
+            raise RuntimeError("Semantic search requires numpy")
+        out = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for i, text in enumerate(texts):
+            row = out[i]
+            for feature, count in self._features(text).items():
+                index, sign = _bucket(feature, self.dim)
+                row[index] += sign * (1.0 + math.log(count))
+            norm = float(np.linalg.norm(row))
+            if norm:
+                row /= norm
+        return out
+
+
+class SentenceTransformerEmbedder:
+    """A sentence-transformers model loaded from a local directory; nothing is downloaded."""
+
+    def __init__(self, model_dir: str | Path):
+        try:
+            from sentence_transformers import SentenceTransformer  # type: ignore
+        except ImportError:
+            raise RuntimeError("An on-disk embedding model requires sentence-transformers") from None
+        path = Path(model_dir)
+        self._model = SentenceTransformer(str(path), device="cpu", local_files_only=True)
+        self.dim = int(self._model.get_sentence_embedding_dimension())
+        self.name = f"st:{path.name}-{self.dim}"
+
+    def embed(self, texts: list[str]) -> Any:
+        vectors = self._model.encode(texts, normalize_embeddings=True, convert_to_numpy=True, batch_size=32)
+        return vectors.astype(np.float32, copy=False)
@@ -0,0 +1,297 @@
+from __future__ import annotations
+
+import hashlib
+import logging
+import sqlite3
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any
+
+from app.persistence.migrations import Migration, migrate
+from app.persistence.pool import ConnectionPool, get_pool
+from app.persistence.store import DocStore
+from app.persistence.workspace import split_workspace
+from app.retrieval.chunking import DEFAULT_MAX_CHARS, chunk_text
+from app.retrieval.embedders import Embedder
+
+try:
+    import numpy as np
+except ImportError:
+    np = None  # type: ignore[assignment]
+
+logger = logging.getLogger(__name__)
+
+# Rows scored per matrix product; bounds the copy made from the memory map.
+_SCORE_BATCH = 4096
+_INITIAL_ROWS = 1024
+# Documents whose chunk list and files are kept in memory between searches.
+_CACHED_DOCS = 16
+
+
+def _text_hash(text: str) -> str:
+    return hashlib.blake2b(text.encode("utf-8"), digest_size=16).hexdigest()
+
+
+class VectorIndex:
+    """
+    Embedded chunks of every document's text files, for retrieval by meaning.
+
+    Vectors are rows of one float32 matrix in a memory-mapped file; which row holds which chunk
+    (document, path, offsets, text hash) lives in SQLite. A document is brought up to date the
+    first time it is searched after it changed: its changed files are re-chunked and only chunks
+    whose text is new are embedded, so an edit costs the paragraphs it touched. Rows of removed
+    chunks are reused. Vectors have unit length, so a dot product is the cosine similarity.
+
+    The matrix is owned by this process; run a single worker when semantic search is in use.
+    """
+
+    def __init__(
+        self,
+        store: DocStore,
+        db_path: Path,
+        vectors_path: Path,
+        embedder: Embedder,
+        pool: ConnectionPool | None = None,
+        max_chunk_chars: int = DEFAULT_MAX_CHARS,
+    ):
+        self._store = store
+        self._pool = pool or get_pool(db_path)
+        self._vectors_path = vectors_path
+        self.embedder = embedder
+        self._max_chunk_chars = max_chunk_chars
+        self._lock = threading.Lock()
+        self._matrix: Any = None
+        self._free: list[int] = []
+        self._next_row = 0
+        self._docs: OrderedDict[str, _DocChunks] = OrderedDict()
+        self.embedded = 0
+        with self._pool.write() as conn:
+            migrate(conn, "vectors", [Migration(1, "baseline schema", self._create_baseline)])
+
+    def _create_baseline(self, conn: sqlite3.Connection) -> None:
+        conn.execute("CREATE TABLE IF NOT EXISTS vector_meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+        conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS vector_docs (
+              doc_id TEXT PRIMARY KEY,
+              version INTEGER NOT NULL
+            )
+            """
+        )
+        conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS vector_chunks (
+              row INTEGER PRIMARY KEY,
+              doc_id TEXT NOT NULL,
+              path TEXT NOT NULL,
+              start INTEGER NOT NULL,
+              end INTEGER NOT NULL,
+              text_hash TEXT NOT NULL
+            )
+            """
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_vector_chunks_doc ON vector_chunks(doc_id, path)")
+        conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS vector_files (
+              doc_id TEXT NOT NULL,
+              path TEXT NOT NULL,
+              text_hash TEXT NOT NULL,
+              PRIMARY KEY (doc_id, path)
+            )
+            """
+        )
+
+    def _open(self) -> None:
+        # Called with the lock held. Vectors from another embedder are meaningless here, so a
+        # change of embedder (or a missing matrix file) starts the index over.
+        if self._matrix is not None:
+            return
+        if np is None:
+            raise RuntimeError("Semantic search requires numpy")
+        with self._pool.write() as conn:
+            row = conn.execute("SELECT value FROM vector_meta WHERE key = 'embedder'").fetchone()
+            if row is None or row["value"] != self.embedder.name or not self._vectors_path.exists():
+                conn.execute("DELETE FROM vector_chunks")
+                conn.execute("DELETE FROM vector_files")
+                conn.execute("DELETE FROM vector_docs")
+                conn.execute(
+                    "INSERT OR REPLACE INTO vector_meta (key, value) VALUES ('embedder', ?)", (self.embedder.name,)
+                )
+                self._vectors_path.parent.mkdir(parents=True, exist_ok=True)
+                self._vectors_path.unlink(missing_ok=True)
+            used = [r["row"] for r in conn.execute("SELECT row FROM vector_chunks ORDER BY row").fetchall()]
+        if self._vectors_path.exists():
+            rows = self._vectors_path.stat().st_size // (4 * self.embedder.dim)
+            self._matrix = np.memmap(self._vectors_path, dtype=np.float32, mode="r+", shape=(rows, self.embedder.dim))
+        else:
+            self._matrix = np.memmap(
+                self._vectors_path, dtype=np.float32, mode="w+", shape=(_INITIAL_ROWS, self.embedder.dim)
+            )
+        # Rows written but never committed (a crash mid-sync) are free as well.
+        self._next_row = used[-1] + 1 if used else 0
+        taken = set(used)
+        self._free = [r for r in range(self._next_row) if r not in taken]
+
+    def _allocate(self, n: int) -> list[int]:
+        rows = [self._free.pop() for _ in range(min(n, len(self._free)))]
+        extra = n - len(rows)
+        if self._next_row + extra > len(self._matrix):
+            capacity = max(len(self._matrix) * 2, self._next_row + extra)
+            self._matrix.flush()
+            self._matrix = None
+            with open(self._vectors_path, "r+b") as f:
+                f.truncate(capacity * self.embedder.dim * 4)
+            self._matrix = np.memmap(self._vectors_path, dtype=np.float32, mode="r+", shape=(capacity, self.embedder.dim))
+        rows.extend(range(self._next_row, self._next_row + extra))
+        self._next_row += extra
+        return rows
+
+    def sync(self, doc_id: str) -> dict[str, str] | None:
+        """
+        Bring `doc_id`'s vectors in line with its stored files and return those files by path,
+        or None (dropping its vectors) if the document does not exist.
+        """
+        doc = self._store.get(doc_id)
+        with self._lock:
+            cached = self._sync(doc_id, doc)
+        return cached.files if cached is not None else None
+
+    def _sync(self, doc_id: str, doc: Any) -> _DocChunks | None:
+        # Called with the lock held.
+        self._open()
+        cached = self._docs.get(doc_id)
+        if doc is not None and cached is not None and cached.version == doc.version:
+            self._docs.move_to_end(doc_id)
+            return cached
+        with self._pool.read() as conn:
+            indexed = conn.execute("SELECT version FROM vector_docs WHERE doc_id = ?", (doc_id,)).fetchone()
+            current = doc is not None and indexed is not None and indexed["version"] == doc.version
+            file_hashes = {
+                r["path"]: r["text_hash"]
+                for r in conn.execute("SELECT path, text_hash FROM vector_files WHERE doc_id = ?", (doc_id,))
+            }
+        files = _text_files(doc.content) if doc is not None else {}
+        if not current:
+            self._reindex(doc_id, doc, files, file_hashes)
+        if doc is None:
+            self._docs.pop(doc_id, None)
+            return None
+        with self._pool.read() as conn:
+            chunks = conn.execute(
+                "SELECT row, path, start, end FROM vector_chunks WHERE doc_id = ? ORDER BY row", (doc_id,)
+            ).fetchall()
+        cached = _DocChunks(doc.version, files, chunks)
+        self._docs[doc_id] = cached
+        while len(self._docs) > _CACHED_DOCS:
+            self._docs.popitem(last=False)
+        return cached
+
+    def _reindex(self, doc_id: str, doc: Any, files: dict[str, str], file_hashes: dict[str, str]) -> None:
+        # Files whose text is unchanged keep their chunks untouched; changed files are
+        # re-chunked, and chunks whose text survived keep their vectors with new offsets.
+        changed = {path: _text_hash(text) for path, text in files.items()}
+        changed = {path: digest for path, digest in changed.items() if file_hashes.get(path) != digest}
+        dropped = [path for path in file_hashes if path not in files]
+        existing: dict[tuple[str, str], list[int]] = {}
+        if changed or dropped:
+            with self._pool.read() as conn:
+                for path in [*changed, *dropped]:
+                    for r in conn.execute(
+                        "SELECT row, text_hash FROM vector_chunks WHERE doc_id = ? AND path = ?", (doc_id, path)
+                    ):
+                        existing.setdefault((path, r["text_hash"]), []).append(r["row"])
+
+        kept: list[tuple[int, int, int]] = []
+        new: list[tuple[str, int, int, str, str]] = []
+        for path in changed:
+            for chunk in chunk_text(files[path], self._max_chunk_chars):
+                digest = _text_hash(chunk.text)
+                reusable = existing.get((path, digest))
+                if reusable:
+                    kept.append((chunk.start, chunk.end, reusable.pop()))
+                else:
+                    new.append((path, chunk.start, chunk.end, digest, chunk.text))
+        stale = [row for reusable in existing.values() for row in reusable]
+
+        rows = self._allocate(len(new))
+        try:
+            if new:
+                vectors = self.embedder.embed([item[4] for item in new])
+                for row, vector in zip(rows, vectors):
+                    self._matrix[row] = vector
+                self._matrix.flush()
+                self.embedded += len(new)
+            with self._pool.write() as conn:
+                conn.executemany("DELETE FROM vector_chunks WHERE row = ?", [(row,) for row in stale])
+                conn.executemany("UPDATE vector_chunks SET start = ?, end = ? WHERE row = ?", kept)
+                conn.executemany(
+                    "INSERT INTO vector_chunks (row, doc_id, path, start, end, text_hash) VALUES (?, ?, ?, ?, ?, ?)",
+                    [(row, doc_id, path, start, end, digest) for row, (path, start, end, digest, _) in zip(rows, new)],
+                )
+                conn.executemany(
+                    "DELETE FROM vector_files WHERE doc_id = ? AND path = ?", [(doc_id, path) for path in dropped]
+                )
+                conn.executemany(
+                    "INSERT OR REPLACE INTO vector_files (doc_id, path, text_hash) VALUES (?, ?, ?)",
+                    [(doc_id, path, digest) for path, digest in changed.items()],
+                )
+                if doc is None:
+                    conn.execute("DELETE FROM vector_docs WHERE doc_id = ?", (doc_id,))
+                else:
+                    conn.execute(
+                        "INSERT OR REPLACE INTO vector_docs (doc_id, version) VALUES (?, ?)", (doc_id, doc.version)
+                    )
+        except BaseException:
+            self._free.extend(rows)
+            raise
+        # Only now is nothing pointing at the stale rows.
+        self._free.extend(stale)
+        logger.debug("vectors for %s: %d embedded, %d moved, %d dropped", doc_id, len(new), len(kept), len(stale))
+
+    def search(self, doc_id: str, query: str, k: int = 8) -> list[dict] | None:
+        """
+        The `k` chunks of `doc_id` closest to `query`, best first, as {"path", "start", "end",
+        "score", "text"}; None if the document does not exist. Raises RuntimeError without numpy.
+        """
+        q = self.embedder.embed([query])[0]
+        doc = self._store.get(doc_id)
+        with self._lock:
+            cached = self._sync(doc_id, doc)
+            if cached is None:
+                return None
+            if not len(cached.rows):
+                return []
+            scores = np.empty(len(cached.rows), dtype=np.float32)
+            for i in range(0, len(cached.rows), _SCORE_BATCH):
+                scores[i:i + _SCORE_BATCH] = self._matrix[cached.rows[i:i + _SCORE_BATCH]] @ q
+        k = min(k, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top], kind="stable")]
+        return [cached.hit(int(i), float(scores[i])) for i in top]
+
+
+class _DocChunks:
+    """One document's chunk rows (sorted, so scoring reads the memory map front to back) and files."""
+
+    def __init__(self, version: int, files: dict[str, str], chunks: list[sqlite3.Row]):
+        self.version = version
+        self.files = files
+        self.rows = np.fromiter((c["row"] for c in chunks), dtype=np.int64, count=len(chunks))
+        self.spans = [(c["path"], c["start"], c["end"]) for c in chunks]
+
+    def hit(self, i: int, score: float) -> dict:
+        path, start, end = self.spans[i]
+        return {"path": path, "start": start, "end": end, "score": score, "text": self.files[path][start:end]}
+
+
+def _text_files(content: str) -> dict[str, str]:
+    split = split_workspace(content)
+    if split is None:
+        return {}
+    return {
+        path: entry["content"]
+        for path, entry in split[1]
+        if isinstance(entry, dict) and entry.get("type") == "file" and isinstance(entry.get("content"), str)
+    }
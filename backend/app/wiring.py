@@ -4,10 +4,18 @@ from pathlib import Path
 
 from app.modeling.backends import ApiEchoBackend, HuggingFaceEndpointBackend, LlamaCppBackend, LocalEchoBackend, OllamaBackend, OpenAIHttpBackend
 from app.modeling.router import ModelRouter
+from app.modeling.tokenizers import TokenizerRegistry
+from app.collab.session import CollabHub
+from app.events.bus import EventBus
 from app.latex.compile import AutoCompiler, LatexCompiler, LatexMkCompiler, PdfLatexCompiler, TectonicCompiler
 from app.latex.extract_image import LatexImageExtractor, create_latex_image_extractor
+from app.persistence.engine import ShardedEngine
+from app.persistence.presence import PresenceRegistry
+from app.persistence.revisions import RevisionPolicy
 from app.persistence.store import DocStore
 from app.persistence.local_models import LocalModelStore
+from app.retrieval.embedders import Embedder, HashingEmbedder, SentenceTransformerEmbedder
+from app.retrieval.index import VectorIndex
 from app.local_models.manager import ModelManager
 
 
@@ -30,8 +38,52 @@ def get_model_router() -> ModelRouter:
 
 @lru_cache
 def get_doc_store() -> DocStore:
-    db_path = _backend_root() / ".data" / "verta.sqlite3"
-    return DocStore(db_path=db_path)
+    data_dir = _backend_root() / ".data"
+    window = os.environ.get("VERTA_REVISION_COALESCE_SECONDS")
+    policy = RevisionPolicy(coalesce_window_s=float(window)) if window else None
+    # Off by default: sharding has not been measured to beat one file (see ShardedEngine), and
+    # the count is fixed once documents exist, since changing it does not move them between files.
+    shards = int(os.environ.get("VERTA_DB_SHARDS", "1") or 1)
+    engine = ShardedEngine(data_dir, shards) if shards > 1 else None
+    return DocStore(db_path=data_dir / "verta.sqlite3", revision_policy=policy, engine=engine)
+
+
+@lru_cache
+def get_vector_index() -> VectorIndex:
+    data_dir = _backend_root() / ".data"
+    # A local sentence-transformers directory; the default hashing embedder needs no model.
+    model_dir = os.environ.get("VERTA_EMBEDDING_MODEL_DIR", "").strip()
+    embedder: Embedder = SentenceTransformerEmbedder(model_dir) if model_dir else HashingEmbedder()
+    return VectorIndex(get_doc_store(), data_dir / "verta.sqlite3", data_dir / "vectors.f32", embedder)
+
+
+@lru_cache
+def get_event_bus() -> EventBus:
+    return EventBus()
+
+
+@lru_cache
+def get_collab_hub() -> CollabHub:
+    interval = float(os.environ.get("VERTA_COLLAB_FLUSH_SECONDS", "2") or 2)
+    return CollabHub(get_doc_store(), get_event_bus(), flush_interval_s=interval)
+
+
+@lru_cache
+def get_presence_registry() -> PresenceRegistry:
+    bus = get_event_bus()
+
+    def on_change(doc_id: str, entries: list[dict]) -> None:
+        bus.publish(doc_id, "presence", {"users": entries})
+
+    # Presence is per process. Set VERTA_PRESENCE_SNAPSHOT_SECONDS to survive restarts.
+    interval = float(os.environ.get("VERTA_PRESENCE_SNAPSHOT_SECONDS", "0") or 0)
+    if interval > 0:
+        return PresenceRegistry(
+            snapshot_path=_backend_root() / ".data" / "presence.json",
+            snapshot_interval_s=interval,
+            on_change=on_change,
+        )
+    return PresenceRegistry(on_change=on_change)
 
 
 @lru_cache
@@ -59,6 +111,16 @@ def get_model_manager() -> ModelManager:
     return ModelManager(models_dir=models_dir)
 
 
+@lru_cache
+def get_tokenizer_registry() -> TokenizerRegistry:
+    # Vocabulary files (tokenizer.json / SentencePiece .model) named after model ids.
+    root = os.environ.get("VERTA_TOKENIZER_DIR")
+    if root:
+        return TokenizerRegistry(Path(root))
+    models = os.environ.get("VERTA_MODELS_DIR")
+    return TokenizerRegistry((Path(models) if models else _backend_root() / ".models") / "tokenizers")
+
+
 @lru_cache
 def get_latex_image_extractor() -> LatexImageExtractor:
     return create_latex_image_extractor()
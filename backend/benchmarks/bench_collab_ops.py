@@ -0,0 +1,76 @@
+"""
+Type into one file of a workspace, saving either the whole document per keystroke or
+sending collaborative operations that are flushed on an interval.
+
+    python backend/benchmarks/bench_collab_ops.py --keystrokes 2000 --file-kb 50
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import sys
+import tempfile
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from app.collab.session import CollabHub  # noqa: E402
+from app.persistence.models import DocCreateRequest  # noqa: E402
+from app.persistence.store import DocStore  # noqa: E402
+
+
+def workspace(text: str) -> str:
+    return json.dumps({"active": "main.tex", "entries": {"main.tex": {"type": "file", "content": text}}})
+
+
+def whole_document(store: DocStore, base: str, keystrokes: int) -> tuple[int, int]:
+    store.create(DocCreateRequest(id="put", title="bench", content=workspace(base)))
+    before = store.stats()["writes"]["writes"]
+    text, sent = base, 0
+    for _ in range(keystrokes):
+        text += "x"
+        body = workspace(text)
+        sent += len(body.encode())
+        store.update("put", "bench", body, {}, session_id="tab")
+    return sent, store.stats()["writes"]["writes"] - before
+
+
+async def collaborative(store: DocStore, base: str, keystrokes: int, flush_s: float) -> tuple[int, int]:
+    store.create(DocCreateRequest(id="ot", title="bench", content=workspace(base)))
+    hub = CollabHub(store, flush_interval_s=flush_s)
+    session, client = await hub.join("ot")
+    before = store.stats()["writes"]["writes"]
+    length, sent = len(base), 0
+    for rev in range(keystrokes):
+        message = json.dumps({"path": "main.tex", "rev": rev, "op": [length, "x"]})
+        sent += len(message.encode())
+        session.submit(client, "main.tex", rev, [length, "x"])
+        length += 1
+        client.queue.get_nowait()
+        # Typing pace: a few hundred keystrokes a second spread over several flush intervals.
+        if rev % 50 == 0:
+            await asyncio.sleep(flush_s / 4)
+    await hub.leave(session, client)
+    return sent, store.stats()["writes"]["writes"] - before
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--keystrokes", type=int, default=2000)
+    parser.add_argument("--file-kb", type=int, default=50)
+    parser.add_argument("--flush-seconds", type=float, default=0.2)
+    args = parser.parse_args()
+
+    base = ("\\section{Intro} lorem ipsum dolor sit amet\n" * (args.file_kb * 1024 // 42))[: args.file_kb * 1024]
+    print(f"{'':<20}{'bytes/key':>12}{'writes':>10}")
+    with tempfile.TemporaryDirectory() as tmp:
+        store = DocStore(db_path=Path(tmp) / "bench.sqlite3")
+        sent, writes = whole_document(store, base, args.keystrokes)
+        print(f"{'whole-document PUT':<20}{sent / args.keystrokes:>12.0f}{writes:>10}")
+        sent, writes = asyncio.run(collaborative(store, base, args.keystrokes, args.flush_seconds))
+        print(f"{'collab operations':<20}{sent / args.keystrokes:>12.0f}{writes:>10}")
+
+
+if __name__ == "__main__":
+    main()
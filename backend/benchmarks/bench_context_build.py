@@ -0,0 +1,58 @@
+"""
+One /api/context/build on a large document: parsing the source on every request vs reusing
+the cached parse while the document is unchanged.
+
+    python backend/benchmarks/bench_context_build.py --kb 200
+"""
+from __future__ import annotations
+
+import argparse
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from fastapi.testclient import TestClient  # noqa: E402
+
+from app.context.extract import clear_parse_cache, parse_latex  # noqa: E402
+from app.main import app  # noqa: E402
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--kb", type=int, default=200)
+    parser.add_argument("--repeat", type=int, default=10)
+    args = parser.parse_args()
+
+    block = (
+        "\\section{Part %d}\\label{sec:%d}\nAs \\cite{ref%d} shows,\n"
+        "\\begin{equation}\\label{eq:%d} x_%d = \\frac{a}{b} \\end{equation}\n" + "Body text. " * 40 + "\n"
+    )
+    parts, size, i = [], 0, 0
+    while size < args.kb * 1024:
+        parts.append(block % (i, i, i, i, i))
+        size += len(parts[-1])
+        i += 1
+    source = "".join(parts)
+    client = TestClient(app)
+
+    def build(cursor: int) -> float:
+        body = {"sourceLatex": source, "cursorIndex": cursor, "maxContextChars": 4000, "maxContextTokens": 1000}
+        start = time.perf_counter()
+        assert client.post("/api/context/build", json=body).status_code == 200
+        return (time.perf_counter() - start) * 1000
+
+    cold = []
+    for r in range(args.repeat):
+        clear_parse_cache()
+        cold.append(build(len(source) * r // args.repeat))
+    warm = [build(len(source) * r // args.repeat) for r in range(args.repeat)]
+
+    print(f"{len(source) / 1024:.0f} KB source, parser: {'pylatexenc' if parse_latex(source).nodes is not None else 'scanner'}")
+    print(f"{'build, parse per request (ms)':<34}{sum(cold) / len(cold):>10.1f}")
+    print(f"{'build, cached parse (ms)':<34}{sum(warm) / len(warm):>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
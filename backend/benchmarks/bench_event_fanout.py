@@ -0,0 +1,76 @@
+"""
+Publish events to one document with many subscribers, one of them never reading.
+
+Reports publish throughput and delivery latency; the stalled subscriber should only
+cost its own dropped events, never publisher time.
+
+    python backend/benchmarks/bench_event_fanout.py --events 20000 --subscribers 200
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import statistics
+import sys
+import threading
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from app.events.bus import EventBus  # noqa: E402
+
+
+async def run(*, events: int, subscribers: int) -> None:
+    bus = EventBus(max_pending=256)
+    stalled = bus.subscribe("doc")
+    subs = [bus.subscribe("doc", max_pending=events + 1) for _ in range(subscribers)]
+    latencies: list[float] = []
+    sent: dict[int, float] = {}
+
+    async def consume(sub, record: bool) -> None:
+        for _ in range(events):
+            event = await sub.get()
+            if record:
+                latencies.append(time.perf_counter() - sent[event.id])
+
+    consumers = [asyncio.create_task(consume(sub, i == 0)) for i, sub in enumerate(subs)]
+
+    def publish() -> float:
+        start = time.perf_counter()
+        for n in range(events):
+            # Ids are assigned in publish order, starting from 1.
+            sent[n + 1] = time.perf_counter()
+            bus.publish("doc", "log", {"n": n})
+        return time.perf_counter() - start
+
+    # Publishers are sync endpoints on the thread pool, as in the API.
+    done: list[float] = []
+    thread = threading.Thread(target=lambda: done.append(publish()))
+    thread.start()
+    await asyncio.gather(*consumers)
+    thread.join()
+
+    elapsed = done[0]
+    pending = 0
+    while stalled.get_nowait() is not None:
+        pending += 1
+    lat = sorted(latencies)
+    print(f"subscribers            {subscribers + 1:>10}")
+    print(f"publish/s              {events / elapsed:>10.0f}")
+    print(f"deliveries/s           {events * subscribers / elapsed:>10.0f}")
+    print(f"latency p50 (ms)       {statistics.median(lat) * 1000:>10.2f}")
+    print(f"latency p99 (ms)       {lat[int(len(lat) * 0.99)] * 1000:>10.2f}")
+    print(f"stalled sub queued     {pending - 1:>10} (+1 overflow marker)")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--events", type=int, default=20000)
+    parser.add_argument("--subscribers", type=int, default=200)
+    args = parser.parse_args()
+    asyncio.run(run(events=args.events, subscribers=args.subscribers))
+
+
+if __name__ == "__main__":
+    main()
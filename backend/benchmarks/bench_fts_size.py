@@ -0,0 +1,87 @@
+"""
+Database size for a synthetic project with self-contained search indexes (each FTS table
+keeping its own copy of every file, plus a hash table to skip unchanged files) vs the
+external-content indexes that read file bodies from doc_files.
+
+    python backend/benchmarks/bench_fts_size.py --docs 50 --files 40 --file-kb 8
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import random
+import sqlite3
+import sys
+import tempfile
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from app.persistence.models import DocCreateRequest  # noqa: E402
+from app.persistence.store import DocStore  # noqa: E402
+
+WORDS = "lemma theorem proof bound error term kernel estimate sequence converges uniformly measure".split()
+
+
+def body(rng: random.Random, size: int) -> str:
+    lines, n = [], 0
+    while n < size:
+        line = " ".join(rng.choice(WORDS) for _ in range(10)) + f" \\ref{{eq:{rng.randint(0, 999)}}}\n"
+        lines.append(line)
+        n += len(line)
+    return "".join(lines)
+
+
+def self_contained(conn: sqlite3.Connection) -> None:
+    # The previous layout: standalone FTS tables fed by the store, with a content-hash table.
+    for name in ("insert", "delete", "update"):
+        conn.execute(f"DROP TRIGGER doc_files_index_{name}")
+    conn.execute("DROP TABLE doc_files_fts")
+    conn.execute("DROP TABLE doc_files_trigram")
+    conn.execute("CREATE VIRTUAL TABLE doc_files_fts USING fts5(doc_id, path, content)")
+    conn.execute("CREATE VIRTUAL TABLE doc_files_trigram USING fts5(doc_id UNINDEXED, path, content, tokenize = 'trigram')")
+    conn.execute(
+        "CREATE TABLE doc_files_index (doc_id TEXT NOT NULL, path TEXT NOT NULL, content_hash TEXT NOT NULL,"
+        " fts_rowid INTEGER NOT NULL, PRIMARY KEY (doc_id, path))"
+    )
+    for table in ("doc_files_fts", "doc_files_trigram"):
+        conn.execute(f"INSERT INTO {table} (rowid, doc_id, path, content) SELECT id, doc_id, path, content FROM doc_files_text")
+    conn.execute(
+        "INSERT INTO doc_files_index SELECT doc_id, path, hex(randomblob(32)), id FROM doc_files_text"
+    )
+    conn.commit()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--docs", type=int, default=50)
+    parser.add_argument("--files", type=int, default=40)
+    parser.add_argument("--file-kb", type=int, default=8)
+    args = parser.parse_args()
+
+    rng = random.Random(1)
+    with tempfile.TemporaryDirectory() as tmp:
+        store = DocStore(db_path=Path(tmp) / "bench.sqlite3")
+        text = 0
+        for d in range(args.docs):
+            entries = {f"sec{i}.tex": {"type": "file", "content": body(rng, args.file_kb * 1024)} for i in range(args.files)}
+            text += sum(len(e["content"].encode()) for e in entries.values())
+            store.create(DocCreateRequest(id=f"d{d}", title="bench", content=json.dumps({"entries": entries})))
+
+        external, contained = Path(tmp) / "external.sqlite3", Path(tmp) / "contained.sqlite3"
+        with sqlite3.connect(Path(tmp) / "bench.sqlite3") as conn:
+            conn.execute("VACUUM INTO ?", (str(external),))
+            conn.execute("VACUUM INTO ?", (str(contained),))
+        conn = sqlite3.connect(contained)
+        self_contained(conn)
+        conn.execute("VACUUM")
+        conn.close()
+
+        mb = 1024 * 1024
+        print(f"{args.docs * args.files} files, {text / mb:.1f} MB of text")
+        print(f"{'self-contained (MB)':<24}{contained.stat().st_size / mb:>10.1f}")
+        print(f"{'external content (MB)':<24}{external.stat().st_size / mb:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
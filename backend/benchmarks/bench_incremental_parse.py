@@ -0,0 +1,73 @@
+"""
+Context builds on a book-length source after edits of growing size: parsing the whole
+document vs reparsing only the chunks an edit touched.
+
+    python backend/benchmarks/bench_incremental_parse.py --pages 300
+"""
+from __future__ import annotations
+
+import argparse
+import random
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from app.context import extract  # noqa: E402
+from app.context.extract import build_structured_context_with_limits, clear_parse_cache, parse_latex  # noqa: E402
+
+WORDS = "lemma bound estimate sequence converges uniformly measure gradient operator spectrum".split()
+
+
+def paragraph(rng: random.Random, i: int) -> str:
+    body = " ".join(rng.choice(WORDS) for _ in range(70))
+    return f"{body} as in \\cite{{ref{i % 97}}}, see \\eqref{{eq:{i}}} and $x_{{{i}}} \\le \\frac{{a}}{{b}}$."
+
+
+def book(pages: int, rng: random.Random) -> str:
+    # About 3 KB of source per page: a section with three paragraphs and an equation.
+    out = ["\\documentclass{book}\n\\begin{document}\n"]
+    for i in range(pages):
+        out.append(f"\\section{{Part {i}}}\\label{{sec:{i}}}\n")
+        out.append("\n\n".join(paragraph(rng, 3 * i + j) for j in range(3)))
+        out.append(f"\n\n\\begin{{equation}}\\label{{eq:{i}}}\n\\sum_k a_k = {i}\n\\end{{equation}}\n\n")
+    out.append("\\end{document}\n")
+    return "".join(out)
+
+
+def build(source: str, cursor: int) -> float:
+    start = time.perf_counter()
+    build_structured_context_with_limits(source, center_index=cursor, max_chars=4000, max_tokens=1000)
+    return (time.perf_counter() - start) * 1000
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--pages", type=int, default=300)
+    args = parser.parse_args()
+
+    rng = random.Random(1)
+    source = book(args.pages, rng)
+    clear_parse_cache()
+    cold = build(source, len(source) // 2)
+    mode = "pylatexenc" if parse_latex(source).nodes is not None else "scanner"
+    print(f"{args.pages} pages, {len(source) / 1024:.0f} KB, parser: {mode}")
+    print(f"{'edit':<28}{'build (ms)':>12}{'chunks reparsed':>18}")
+    print(f"{'none (first parse)':<28}{cold:>12.1f}{extract._chunk_parser.last.parsed:>18}")
+
+    # Each edit is applied to the original source, in the middle of the book.
+    at = source.index(f"\\section{{Part {args.pages // 2}}}")
+    for label, pages in (("one word", 0), ("one page", 1), ("ten pages", 10)):
+        if pages == 0:
+            edited = source[:at] + "edited " + source[at:]
+        else:
+            rewritten = book(pages, rng).split("\\begin{document}\n", 1)[1].rsplit("\\end{document}", 1)[0]
+            end = source.index(f"\\section{{Part {args.pages // 2 + pages}}}")
+            edited = source[:at] + rewritten + source[end:]
+        ms = build(edited, at)
+        print(f"{label:<28}{ms:>12.1f}{extract._chunk_parser.last.parsed:>18}")
+
+
+if __name__ == "__main__":
+    main()
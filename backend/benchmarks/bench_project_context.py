@@ -0,0 +1,80 @@
+"""
+Context for a completion in one chapter of a large project: the client uploading every file
+as one `sourceLatex` vs the server reading the active file and its linked files by `docId`.
+
+    python backend/benchmarks/bench_project_context.py --chapters 60 --chapter-kb 20
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from fastapi.testclient import TestClient  # noqa: E402
+
+from app.context.extract import clear_parse_cache  # noqa: E402
+from app.main import app  # noqa: E402
+from app.persistence.models import DocCreateRequest  # noqa: E402
+from app.persistence.store import DocStore  # noqa: E402
+from app.wiring import get_doc_store  # noqa: E402
+
+
+def timed(fn, repeat: int) -> float:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - start) / repeat * 1000
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--chapters", type=int, default=60)
+    parser.add_argument("--chapter-kb", type=int, default=20)
+    parser.add_argument("--repeat", type=int, default=10)
+    args = parser.parse_args()
+
+    line = "As \\cref{sec:ch%d} shows, the bound holds by \\cite{ref%d}.\n\n"
+    files = {"main.tex": "\\documentclass{book}\n\\begin{document}\n" + "".join(
+        f"\\include{{chapters/ch{i}}}\n" for i in range(args.chapters)) + "\\end{document}\n"}
+    for i in range(args.chapters):
+        body = "".join(line % ((i + j) % args.chapters, j % 50) for j in range(args.chapter_kb * 1024 // len(line)))
+        files[f"chapters/ch{i}.tex"] = f"\\chapter{{Chapter {i}}}\\label{{sec:ch{i}}}\n" + body
+    files["refs.bib"] = "".join(f"@article{{ref{j},\n title={{T}}\n}}\n" for j in range(50))
+    whole = "\n".join(files.values())
+    active = f"chapters/ch{args.chapters // 2}.tex"
+
+    with tempfile.TemporaryDirectory() as tmp:
+        store = DocStore(db_path=Path(tmp) / "bench.sqlite3")
+        content = json.dumps({"entries": {p: {"type": "file", "content": c} for p, c in files.items()}})
+        store.create(DocCreateRequest(id="big", title="bench", content=content))
+        app.dependency_overrides[get_doc_store] = lambda: store
+        client = TestClient(app)
+        try:
+            limits = {"maxContextChars": 4000, "maxContextTokens": 1000}
+            upload = {"sourceLatex": whole, "cursorIndex": whole.index(files[active]) + 500, **limits}
+            by_id = {"docId": "big", "activePath": active, "cursorIndex": 500, **limits}
+
+            def post(body: dict) -> None:
+                assert client.post("/api/context/build", json=body).status_code == 200
+
+            def cold(body: dict) -> None:
+                clear_parse_cache()
+                post(body)
+
+            print(f"{args.chapters} chapters, {len(whole) / 1024 / 1024:.1f} MB project")
+            print(f"{'request body, upload (KB)':<34}{len(json.dumps(upload)) / 1024:>10.0f}")
+            print(f"{'request body, docId (KB)':<34}{len(json.dumps(by_id)) / 1024:>10.1f}")
+            print(f"{'build, upload, new text (ms)':<34}{timed(lambda: cold(upload), args.repeat):>10.1f}")
+            print(f"{'build, docId, new text (ms)':<34}{timed(lambda: cold(by_id), args.repeat):>10.1f}")
+            print(f"{'build, docId, cached (ms)':<34}{timed(lambda: post(by_id), args.repeat):>10.1f}")
+        finally:
+            app.dependency_overrides.clear()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+"""
+The parser-free fallback on a book-length source: the old four regex passes over the window
+vs the single-pass scanner over the whole source, and a cursor lookup against its tables.
+
+    python backend/benchmarks/bench_scanner.py --pages 300
+"""
+from __future__ import annotations
+
+import argparse
+import random
+import re
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from app.context import extract  # noqa: E402
+from bench_incremental_parse import book  # noqa: E402
+
+OLD = [
+    re.compile(r"\\section\{([^}]*)\}"),
+    re.compile(r"\\label\{([^}]*)\}"),
+    re.compile(r"\\begin\{equation\}(.*?)\\end\{equation\}", re.DOTALL | re.MULTILINE),
+    re.compile(r"\\cite[a-zA-Z]*\{([^}]*)\}"),
+]
+
+
+def timed(fn, repeat: int) -> float:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - start) / repeat * 1000
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--pages", type=int, default=300)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    source = book(args.pages, random.Random(1))
+    window = source[len(source) // 2 - 2000:len(source) // 2 + 2000]
+    parsed = extract.ParsedLatex.join([(0, extract._parse_with_scanner(source))])
+
+    def lookup() -> None:
+        center = len(source) // 2
+        parsed.sections.spans[extract.bisect_right(parsed.sections.starts, center) - 1]
+        parsed.labels.overlapping(center - 2000, center + 2000)
+        parsed.citations.overlapping(center - 2000, center + 2000)
+
+    print(f"{args.pages} pages, {len(source) / 1024:.0f} KB")
+    print(f"{'4 regex passes, window (ms)':<34}{timed(lambda: [r.findall(window) for r in OLD], args.repeat):>10.3f}")
+    print(f"{'4 regex passes, source (ms)':<34}{timed(lambda: [r.findall(source) for r in OLD], args.repeat):>10.1f}")
+    print(f"{'scanner, source (ms)':<34}{timed(lambda: extract._parse_with_scanner(source), args.repeat):>10.1f}")
+    print(f"{'scanner, one chunk (ms)':<34}{timed(lambda: extract._parse_with_scanner(window), args.repeat):>10.3f}")
+    print(f"{'cursor lookup, bisect (ms)':<34}{timed(lookup, args.repeat * 50):>10.3f}")
+
+
+if __name__ == "__main__":
+    main()
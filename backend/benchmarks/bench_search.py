@@ -0,0 +1,67 @@
+"""
+Search for a term that every file contains, returning every hit with a snippet (as search
+used to) vs one ranked page vs the same page again from the result cache, as the corpus grows.
+
+    python backend/benchmarks/bench_search.py --docs 200,800,3200 --files 10
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from app.persistence.cache import SearchCache  # noqa: E402
+from app.persistence.models import DocCreateRequest  # noqa: E402
+from app.persistence.store import DocStore  # noqa: E402
+
+TEXT = "We prove the theorem by induction on the number of vertices, then bound the error term. "
+
+
+def unbounded(store: DocStore, query: str) -> int:
+    with store._pool.read() as conn:
+        rows = conn.execute(
+            "SELECT doc_id, path, snippet(doc_files_fts, 2, '[', ']', '...', 20) FROM doc_files_fts WHERE doc_files_fts MATCH ?",
+            (query,),
+        ).fetchall()
+    return len(rows)
+
+
+def timed(fn, repeat: int) -> float:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - start) / repeat * 1000
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--docs", default="200,800,3200")
+    parser.add_argument("--files", type=int, default=10)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    print(f"{'docs':>8}{'hits':>10}{'all hits (ms)':>16}{'page of 20 (ms)':>18}{'repeat (ms)':>14}")
+    with tempfile.TemporaryDirectory() as tmp:
+        store = DocStore(db_path=Path(tmp) / "bench.sqlite3")
+        uncached = DocStore(db_path=Path(tmp) / "bench.sqlite3", search_cache=SearchCache(max_entries=0))
+        created = 0
+        for target in (int(n) for n in args.docs.split(",")):
+            for d in range(created, target):
+                entries = {f"ch{f}.tex": {"type": "file", "content": TEXT * (1 + (d + f) % 7)} for f in range(args.files)}
+                store.create(DocCreateRequest(id=f"doc-{d}", title="bench", content=json.dumps({"entries": entries})))
+            created = target
+            hits = unbounded(store, "theorem")
+            full = timed(lambda: unbounded(store, "theorem"), args.repeat)
+            paged = timed(lambda: uncached.search_page(None, "theorem", limit=20), args.repeat)
+            store.search_page(None, "theorem", limit=20)
+            repeat = timed(lambda: store.search_page(None, "theorem", limit=20), args.repeat)
+            print(f"{target:>8}{hits:>10}{full:>16.1f}{paged:>18.1f}{repeat:>14.2f}")
+
+
+if __name__ == "__main__":
+    main()
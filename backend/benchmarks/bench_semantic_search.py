@@ -0,0 +1,77 @@
+"""
+Semantic search over a project: building the vector index, catching up after a one-paragraph
+edit (only changed chunks are embedded) and answering a query with the batched top-k.
+
+    python backend/benchmarks/bench_semantic_search.py --files 200 --paragraphs 40
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from app.persistence.models import DocCreateRequest  # noqa: E402
+from app.persistence.store import DocStore  # noqa: E402
+from app.retrieval.embedders import HashingEmbedder  # noqa: E402
+from app.retrieval.index import VectorIndex  # noqa: E402
+
+WORDS = (
+    "lemma theorem proof bound error kernel estimate sequence converges uniformly measure gradient "
+    "descent convex sampler chain proposal posterior prior likelihood variance operator spectrum"
+).split()
+
+
+def paragraph(rng: random.Random) -> str:
+    return " ".join(rng.choice(WORDS) for _ in range(60)) + "."
+
+
+def workspace(files: dict[str, str]) -> str:
+    return json.dumps({"entries": {p: {"type": "file", "content": c} for p, c in files.items()}})
+
+
+def timed(fn) -> float:
+    start = time.perf_counter()
+    fn()
+    return (time.perf_counter() - start) * 1000
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--files", type=int, default=200)
+    parser.add_argument("--paragraphs", type=int, default=40)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    rng = random.Random(1)
+    files = {
+        f"sec{i}.tex": f"\\section{{Part {i}}}\n" + "\n\n".join(paragraph(rng) for _ in range(args.paragraphs))
+        for i in range(args.files)
+    }
+    with tempfile.TemporaryDirectory() as tmp:
+        store = DocStore(db_path=Path(tmp) / "bench.sqlite3")
+        store.create(DocCreateRequest(id="big", title="bench", content=workspace(files)))
+        index = VectorIndex(store, Path(tmp) / "bench.sqlite3", Path(tmp) / "vectors.f32", HashingEmbedder())
+
+        build = timed(lambda: index.sync("big"))
+        built = index.embedded
+        files["sec0.tex"] = files["sec0.tex"].replace(".", ". Edited.", 1)
+        store.update("big", "bench", workspace(files), {})
+        update = timed(lambda: index.sync("big"))
+
+        query = " ".join(rng.choice(WORDS) for _ in range(8))
+        search = sum(timed(lambda: index.search("big", query, k=10)) for _ in range(args.repeat)) / args.repeat
+
+        print(f"{args.files} files, {built} chunks, {index.embedder.name}")
+        print(f"{'full build (ms)':<28}{build:>10.1f}")
+        print(f"{'one-paragraph edit (ms)':<28}{update:>10.1f}   ({index.embedded - built} chunk embedded)")
+        print(f"{'top-10 query (ms)':<28}{search:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+"""
+Compare small concurrent writes with one commit per write vs group commit.
+
+    python backend/benchmarks/bench_store_commit.py --seconds 3 --writers 16
+"""
+from __future__ import annotations
+
+import argparse
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from app.persistence.models import DocCreateRequest  # noqa: E402
+from app.persistence.pool import ConnectionPool  # noqa: E402
+from app.persistence.store import DocStore  # noqa: E402
+
+
+def run(db_path: Path, *, seconds: float, writers: int, max_batch: int, synchronous: str) -> tuple[float, float]:
+    pool = ConnectionPool(db_path, max_batch=max_batch, synchronous=synchronous)
+    store = DocStore(db_path=db_path, pool=pool)
+    for w in range(writers):
+        store.create(DocCreateRequest(id=f"doc-{w}", title="bench", content="x"))
+    before = pool.stats()
+    stop = time.perf_counter() + seconds
+    counts = [0] * writers
+
+    def write_loop(w: int) -> None:
+        n = 0
+        while time.perf_counter() < stop:
+            store.add_log(f"doc-{w}", f"compile {n}")
+            store.add_comment(f"doc-{w}", "looks good", None, None, None)
+            n += 2
+        counts[w] = n
+
+    threads = [threading.Thread(target=write_loop, args=(w,)) for w in range(writers)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    after = pool.stats()
+    pool.close()
+    writes = after["writes"] - before["writes"]
+    commits = max(1, after["commits"] - before["commits"])
+    return sum(counts) / seconds, writes / commits
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--seconds", type=float, default=3.0)
+    parser.add_argument("--writers", type=int, default=16)
+    args = parser.parse_args()
+
+    print(f"{'':<24}{'writes/s':>12}{'writes/commit':>16}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for synchronous in ("NORMAL", "FULL"):
+            for label, max_batch in (("per-write commit", 1), ("group commit", 64)):
+                rate, per_commit = run(
+                    Path(tmp) / f"{synchronous}-{max_batch}.sqlite3",
+                    seconds=args.seconds,
+                    writers=args.writers,
+                    max_batch=max_batch,
+                    synchronous=synchronous,
+                )
+                print(f"{f'{label} ({synchronous})':<24}{rate:>12.0f}{per_commit:>16.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+"""
+Compare DocStore throughput with per-call connections vs the pooled WAL connections.
+
+    python backend/benchmarks/bench_store_pool.py --seconds 3 --readers 4
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from app.persistence.models import DocCreateRequest  # noqa: E402
+from app.persistence.pool import ConnectionPool  # noqa: E402
+from app.persistence.store import DocStore  # noqa: E402
+
+
+class ConnectPerCall:
+    """The pre-pool behaviour: a fresh connection per operation, default rollback journal."""
+
+    def __init__(self, db_path: Path):
+        self._db_path = db_path
+        self._db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._local = threading.local()
+
+    def _open(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self._db_path, timeout=30)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    @contextmanager
+    def read(self):
+        conn = self._open()
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    @contextmanager
+    def write(self):
+        outer = getattr(self._local, "conn", None)
+        if outer is not None:
+            yield outer
+            return
+        conn = self._open()
+        self._local.conn = conn
+        try:
+            yield conn
+            conn.commit()
+        finally:
+            self._local.conn = None
+            conn.close()
+
+    def close(self) -> None:
+        pass
+
+
+def _workspace(n_files: int, rev: int) -> str:
+    entries = {
+        f"chapters/ch{i}.tex": {"type": "file", "content": f"\\section{{Chapter {i}}} revision {rev} " + "lorem ipsum " * 40}
+        for i in range(n_files)
+    }
+    return json.dumps({"active": "chapters/ch0.tex", "entries": entries})
+
+
+def run(store: DocStore, *, seconds: float, readers: int, n_files: int) -> dict:
+    store.create(DocCreateRequest(id="bench", title="bench", content=_workspace(n_files, 0)))
+    stop = time.perf_counter() + seconds
+    counts = {"reads": 0, "writes": 0}
+    lock = threading.Lock()
+
+    def read_loop():
+        n = 0
+        while time.perf_counter() < stop:
+            store.get("bench")
+            store.search("bench", "lorem")
+            n += 2
+        with lock:
+            counts["reads"] += n
+
+    def write_loop():
+        n = 0
+        rev = 1
+        while time.perf_counter() < stop:
+            store.update("bench", title="bench", content=_workspace(n_files, rev), settings={})
+            store.add_log("bench", "saved")
+            rev += 1
+            n += 2
+        with lock:
+            counts["writes"] += n
+
+    threads = [threading.Thread(target=read_loop) for _ in range(readers)]
+    threads.append(threading.Thread(target=write_loop))
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return {k: v / seconds for k, v in counts.items()}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--seconds", type=float, default=3.0)
+    parser.add_argument("--readers", type=int, default=4)
+    parser.add_argument("--files", type=int, default=20)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        before_path = Path(tmp) / "before.sqlite3"
+        before = run(
+            DocStore(db_path=before_path, pool=ConnectPerCall(before_path)),
+            seconds=args.seconds,
+            readers=args.readers,
+            n_files=args.files,
+        )
+        after_path = Path(tmp) / "after.sqlite3"
+        pool = ConnectionPool(after_path)
+        after = run(DocStore(db_path=after_path, pool=pool), seconds=args.seconds, readers=args.readers, n_files=args.files)
+        pool.close()
+
+    print(f"{'':<14}{'reads/s':>12}{'writes/s':>12}")
+    print(f"{'per-call':<14}{before['reads']:>12.0f}{before['writes']:>12.0f}")
+    print(f"{'pooled+WAL':<14}{after['reads']:>12.0f}{after['writes']:>12.0f}")
+
+
+if __name__ == "__main__":
+    main()
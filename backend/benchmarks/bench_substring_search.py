@@ -0,0 +1,61 @@
+"""
+Find a label key in a large project: scanning every file in Python (what clients did) vs
+the trigram index.
+
+    python backend/benchmarks/bench_substring_search.py --files 2000 --file-kb 5
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from app.persistence.models import DocCreateRequest  # noqa: E402
+from app.persistence.store import DocStore  # noqa: E402
+
+
+def timed(fn, repeat: int) -> float:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - start) / repeat * 1000
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--files", type=int, default=2000)
+    parser.add_argument("--file-kb", type=int, default=5)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    line = "We bound the error term as in Lemma~\\ref{lem:bound} and \\eqref{eq:main}.\n"
+    body = line * (args.file_kb * 1024 // len(line))
+    entries = {
+        f"sec{i}.tex": {"type": "file", "content": f"\\section{{Part {i}}}\\label{{sec:part{i}}}\n" + body}
+        for i in range(args.files)
+    }
+    with tempfile.TemporaryDirectory() as tmp:
+        store = DocStore(db_path=Path(tmp) / "bench.sqlite3")
+        store.create(DocCreateRequest(id="big", title="bench", content=json.dumps({"entries": entries})))
+        needle = f"\\label{{sec:part{args.files // 2}}}"
+
+        def scan() -> list[str]:
+            files = json.loads(store.get("big").content)["entries"]
+            return [p for p, e in files.items() if needle in e.get("content", "")]
+
+        def indexed() -> list[str]:
+            return [r["path"] for r in store.search_page("big", needle.lower(), limit=20)["results"]]
+
+        assert scan() == indexed()
+        print(f"{args.files} files, {args.files * args.file_kb / 1024:.1f} MB, query {needle}")
+        print(f"{'python scan (ms)':<24}{timed(scan, args.repeat):>10.1f}")
+        print(f"{'trigram index (ms)':<24}{timed(indexed, args.repeat):>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
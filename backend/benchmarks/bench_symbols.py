@@ -0,0 +1,68 @@
+"""
+Undefined-reference detection and go-to-definition in a large project: re-parsing every file
+per request vs lookups in the symbol index kept up to date on save.
+
+    python backend/benchmarks/bench_symbols.py --files 300 --file-kb 20
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from app.context.symbols import extract_symbols  # noqa: E402
+from app.persistence.models import DocCreateRequest  # noqa: E402
+from app.persistence.store import DocStore  # noqa: E402
+
+
+def timed(fn, repeat: int) -> float:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - start) / repeat * 1000
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--files", type=int, default=300)
+    parser.add_argument("--file-kb", type=int, default=20)
+    parser.add_argument("--repeat", type=int, default=10)
+    args = parser.parse_args()
+
+    line = "As \\cref{sec:part%d} shows, $\\norm{x} \\le C$ by \\cite{ref%d}.\n"
+    files = {}
+    for i in range(args.files):
+        body = "".join(line % ((i + j) % args.files, j % 120) for j in range(args.file_kb * 1024 // len(line)))
+        files[f"sec{i}.tex"] = f"\\section{{Part {i}}}\\label{{sec:part{i}}}\n" + body
+    files["refs.bib"] = "".join(f"@article{{ref{j},\n title={{T}}\n}}\n" for j in range(100))
+    with tempfile.TemporaryDirectory() as tmp:
+        store = DocStore(db_path=Path(tmp) / "bench.sqlite3")
+        content = json.dumps({"entries": {p: {"type": "file", "content": c} for p, c in files.items()}})
+        store.create(DocCreateRequest(id="big", title="bench", content=content))
+
+        def reparse_undefined() -> set:
+            symbols = [s for path, text in files.items() for s in extract_symbols(text, path)]
+            defined = {(s.kind, s.name) for s in symbols if s.role == "def"}
+            return {(s.kind, s.name) for s in symbols if s.kind in ("label", "cite") and s.role == "use" and (s.kind, s.name) not in defined}
+
+        def indexed_undefined() -> set:
+            return {(r["kind"], r["name"]) for r in store.undefined_references("big")}
+
+        assert reparse_undefined() == indexed_undefined()
+        # A save re-extracts only the files it changed.
+        reindex = timed(lambda: extract_symbols(files["sec0.tex"], "sec0.tex"), args.repeat)
+
+        print(f"{args.files} files, {sum(map(len, files.values())) / 1024 / 1024:.1f} MB")
+        print(f"{'undefined refs, re-parse (ms)':<36}{timed(reparse_undefined, args.repeat):>10.1f}")
+        print(f"{'undefined refs, index (ms)':<36}{timed(indexed_undefined, args.repeat):>10.1f}")
+        print(f"{'go-to-definition, index (ms)':<36}{timed(lambda: store.find_symbols('big', 'label', 'sec:part7', 'def'), args.repeat):>10.2f}")
+        print(f"{'reindex one file on save (ms)':<36}{reindex:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
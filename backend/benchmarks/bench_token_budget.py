@@ -0,0 +1,63 @@
+"""
+Fitting a large context into a token budget: the old loop that trims 100 chars and recounts
+vs the binary search over prefixes, with the heuristic and with an exact (word-piece) count.
+
+    python backend/benchmarks/bench_token_budget.py --kb 64 --budget 4000
+"""
+from __future__ import annotations
+
+import argparse
+import re
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from app.context.extract import fit_to_tokens  # noqa: E402
+from app.modeling.tokenizers import HEURISTIC  # noqa: E402
+
+_PIECE_RE = re.compile(r"\w{1,4}|[^\w\s]")
+
+
+class PieceTokenizer:
+    """Stands in for a BPE vocabulary: every count is a full pass over the text."""
+
+    name = "pieces"
+
+    def count(self, text: str) -> int:
+        return len(_PIECE_RE.findall(text))
+
+
+def trim_loop(text: str, max_tokens: int, tokenizer) -> str:
+    while text and tokenizer.count(text) > max_tokens:
+        text = text[: max(0, len(text) - 100)]
+    return text
+
+
+def timed(fn) -> float:
+    start = time.perf_counter()
+    fn()
+    return (time.perf_counter() - start) * 1000
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--kb", type=int, default=64)
+    parser.add_argument("--budget", type=int, default=4000)
+    args = parser.parse_args()
+
+    line = "As \\cref{sec:part} shows, $\\norm{x_k} \\le C \\epsilon$ for every iterate.\n"
+    text = line * (args.kb * 1024 // len(line))
+    print(f"{len(text) / 1024:.0f} KB context, budget {args.budget} tokens")
+    for tokenizer in (HEURISTIC, PieceTokenizer()):
+        old = trim_loop(text, args.budget, tokenizer)
+        new = fit_to_tokens(text, args.budget, tokenizer)
+        assert tokenizer.count(new) <= args.budget and len(new) >= len(old)
+        print(f"{tokenizer.name:<12}{'trim loop (ms)':<18}{timed(lambda: trim_loop(text, args.budget, tokenizer)):>10.1f}")
+        print(f"{'':<12}{'binary search (ms)':<18}{timed(lambda: fit_to_tokens(text, args.budget, tokenizer)):>10.1f}"
+              f"   ({len(new) - len(old)} more chars kept)")
+
+
+if __name__ == "__main__":
+    main()
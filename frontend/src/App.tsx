@@ -34,6 +34,7 @@ import {
   connectZotero,
   getOllamaStatus,
   webSearch,
+  subscribeDocEvents,
 } from "./api/client";
 import type { ModelConfig } from "./api/types";
 import { CodeEditor } from "./components/CodeEditor";
@@ -765,16 +766,34 @@ export default function App() {
 
   useEffect(() => {
     if (!docId || !authUser) return;
-    const ping = async () => {
-      await heartbeatPresence(docId, authUser.id, authUser.username);
+    const ping = () => heartbeatPresence(docId, authUser.id, authUser.username);
+    void (async () => {
+      await ping();
       const list = await listPresence(docId);
       setPresenceUsers(list.map((u) => ({ id: u.user_id, display_name: u.display_name })));
-    };
-    void ping();
+    })();
     const id = window.setInterval(() => void ping(), 10000);
     return () => window.clearInterval(id);
   }, [docId, authUser]);
 
+  useEffect(() => {
+    if (!docId) return;
+    return subscribeDocEvents(docId, (event) => {
+      if (event.type === "presence") {
+        setPresenceUsers(event.data.users.map((u) => ({ id: u.user_id, display_name: u.display_name })));
+      } else if (event.type === "comment") {
+        const row = event.data;
+        setComments((prev) => (prev.some((c) => c.id === row.id) ? prev : [...prev, row]));
+      } else if (event.type === "log") {
+        const row = event.data;
+        setLogs((prev) => (prev.some((l) => l.id === row.id) ? prev : [...prev, row]));
+      } else if (event.type === "overflow") {
+        void listComments(docId).then(setComments);
+        void listLogs(docId).then(setLogs);
+      }
+    });
+  }, [docId]);
+
   useEffect(() => {
     const token = window.location.pathname.startsWith("/share/")
       ? window.location.pathname.split("/share/")[1]
@@ -791,7 +810,7 @@ export default function App() {
     let cancelled = false;
     const load = async () => {
       try {
-        const res = await searchDoc(docId, search.trim());
+        const res = await searchDoc(docId, search.trimStart(), true);
         if (cancelled) return;
         setSearchResults(res.results.map((r) => r.path));
       } catch {
@@ -1213,11 +1232,11 @@ State your objectives here.`),
 
   async function onCompilePreview() {
     if (!activeFile) return;
-    await ensureDocId();
+    const id = await ensureDocId();
     if (previewUrl) URL.revokeObjectURL(previewUrl);
     try {
       setPreviewCompiling(true);
-      const blob = await compileLatex(activeFile.content);
+      const blob = await compileLatex(activeFile.content, id);
       const url = URL.createObjectURL(blob);
       setPreviewUrl(url);
       setPdfPage(1);
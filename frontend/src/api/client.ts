@@ -7,6 +7,8 @@ import type {
   DocModelsEnvelope,
   DocUpdateRequest,
   DocSummary,
+  DocSummaryPage,
+  DocEvent,
   ShareResponse,
   SharedDocResponse,
   SearchResponse,
@@ -49,9 +51,19 @@ export async function createDoc(req: DocCreateRequest): Promise<Doc> {
   return json<Doc>(res);
 }
 
-export async function listDocs(): Promise<DocSummary[]> {
-  const res = await authFetch(`${API_BASE}/doc`);
-  return json<DocSummary[]>(res);
+// Every document, most recently updated first, fetched page by page.
+export async function listDocs(pageSize = 100): Promise<DocSummary[]> {
+  const docs: DocSummary[] = [];
+  let cursor: string | null = null;
+  do {
+    const params = new URLSearchParams({ limit: String(pageSize) });
+    if (cursor) params.set("cursor", cursor);
+    const res = await authFetch(`${API_BASE}/doc/summaries?${params}`);
+    const page = await json<DocSummaryPage>(res);
+    docs.push(...page.items);
+    cursor = page.nextCursor ?? null;
+  } while (cursor);
+  return docs;
 }
 
 export async function getDoc(id: string): Promise<Doc> {
@@ -59,10 +71,16 @@ export async function getDoc(id: string): Promise<Doc> {
   return json<Doc>(res);
 }
 
+// Identifies this tab's edits so the server can fold rapid autosaves into one revision.
+const EDIT_SESSION =
+  typeof crypto !== "undefined" && "randomUUID" in crypto
+    ? crypto.randomUUID()
+    : Math.random().toString(36).slice(2);
+
 export async function updateDoc(id: string, req: DocUpdateRequest): Promise<Doc> {
   const res = await authFetch(`${API_BASE}/doc/${encodeURIComponent(id)}`, {
     method: "PUT",
-    headers: { "content-type": "application/json" },
+    headers: { "content-type": "application/json", "x-edit-session": EDIT_SESSION },
     body: JSON.stringify(req),
   });
   return json<Doc>(res);
@@ -95,8 +113,10 @@ export async function getSharedDoc(token: string): Promise<SharedDocResponse> {
   return json<SharedDocResponse>(res);
 }
 
-export async function searchDoc(id: string, q: string): Promise<SearchResponse> {
-  const res = await authFetch(`${API_BASE}/doc/${encodeURIComponent(id)}/search?q=${encodeURIComponent(q)}`);
+export async function searchDoc(id: string, q: string, prefix = false): Promise<SearchResponse> {
+  const res = await authFetch(
+    `${API_BASE}/doc/${encodeURIComponent(id)}/search?q=${encodeURIComponent(q)}${prefix ? "&prefix=true" : ""}`,
+  );
   return json<SearchResponse>(res);
 }
 
@@ -144,6 +164,15 @@ export async function listRevisions(id: string): Promise<Revision[]> {
   return json<Revision[]>(res);
 }
 
+export async function createCheckpoint(id: string, label?: string): Promise<Revision> {
+  const res = await authFetch(`${API_BASE}/doc/${encodeURIComponent(id)}/revisions/checkpoint`, {
+    method: "POST",
+    headers: { "content-type": "application/json" },
+    body: JSON.stringify({ label }),
+  });
+  return json<Revision>(res);
+}
+
 export async function restoreRevision(id: string, revId: string): Promise<Doc> {
   const res = await authFetch(
     `${API_BASE}/doc/${encodeURIComponent(id)}/revisions/${encodeURIComponent(revId)}/restore`,
@@ -161,11 +190,18 @@ export async function completion(req: CompletionRequest): Promise<CompletionResp
   return json<CompletionResponse>(res);
 }
 
-export async function compileLatex(sourceLatex: string): Promise<Blob> {
+// Pushes presence, comment, log, compile and version changes; EventSource reconnects on its own.
+export function subscribeDocEvents(id: string, onEvent: (event: DocEvent) => void): () => void {
+  const source = new EventSource(`${API_BASE}/doc/${encodeURIComponent(id)}/events`);
+  source.onmessage = (msg) => onEvent(JSON.parse(msg.data) as DocEvent);
+  return () => source.close();
+}
+
+export async function compileLatex(sourceLatex: string, docId?: string): Promise<Blob> {
   const res = await authFetch(`${API_BASE}/latex/compile`, {
     method: "POST",
     headers: { "content-type": "application/json" },
-    body: JSON.stringify({ sourceLatex }),
+    body: JSON.stringify({ sourceLatex, docId }),
   });
   if (!res.ok) {
     const body = await res.json().catch(() => null);
@@ -10,6 +10,7 @@ export type Doc = {
   title?: string | null;
   content: string;
   settings: Record<string, unknown>;
+  version?: number;
 };
 
 export type DocCreateRequest = {
@@ -32,6 +33,13 @@ export type DocModelsEnvelope = {
 export type DocSummary = {
   id: string;
   title?: string | null;
+  size?: number;
+  updated_at?: string | null;
+};
+
+export type DocSummaryPage = {
+  items: DocSummary[];
+  nextCursor?: string | null;
 };
 
 export type ShareResponse = {
@@ -51,6 +59,10 @@ export type SearchHit = {
 
 export type SearchResponse = {
   results: SearchHit[];
+  total?: number;
+  total_exact?: boolean;
+  next_offset?: number | null;
+  index?: "words" | "substring";
 };
 
 export type WebSearchHit = {
@@ -90,10 +102,21 @@ export type Presence = {
   last_seen: string;
 };
 
+export type DocEvent =
+  | { id: number; type: "ready"; doc_id: string; data: { version: number } }
+  | { id: number; type: "presence"; doc_id: string; data: { users: Presence[] } }
+  | { id: number; type: "comment"; doc_id: string; data: Comment }
+  | { id: number; type: "log"; doc_id: string; data: LogEntry }
+  | { id: number; type: "version"; doc_id: string; data: { version: number; session: string | null } }
+  | { id: number; type: "compile"; doc_id: string; data: { status: "running" | "succeeded" | "failed"; error?: string } }
+  | { id: number; type: "overflow"; doc_id: string; data: { dropped: number } };
+
 export type Revision = {
   id: string;
   doc_id: string;
   created_at: string;
+  checkpoint?: boolean;
+  label?: string | null;
 };
 
 export type CompletionRequest = {
@@ -65,6 +65,20 @@ export const server = setupServer(
     }
     return HttpResponse.json([{ id: doc.id, title: doc.title }]);
   }),
+  http.get("/api/doc/summaries", async () => {
+    if (!doc) {
+      doc = {
+        id: "doc-1",
+        title: "workspace",
+        content: JSON.stringify({
+          active: "main.tex",
+          entries: { "main.tex": { type: "file", content: "" } },
+        }),
+        settings: {},
+      };
+    }
+    return HttpResponse.json({ items: [{ id: doc.id, title: doc.title, size: doc.content.length }], nextCursor: null });
+  }),
   http.get("/api/doc/:id", ({ params }) => {
     if (!doc) {
       doc = {
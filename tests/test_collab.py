@@ -0,0 +1,121 @@
+import json
+import random
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+from starlette.websockets import WebSocketDisconnect
+
+from app.collab.ot import OTError, apply, normalize, transform
+from app.collab.session import CollabHub
+from app.main import app
+from app.persistence.models import DocCreateRequest
+from app.persistence.store import DocStore
+from app.wiring import get_collab_hub
+
+
+def _random_op(text: str, rng: random.Random) -> list:
+    op: list = []
+    pos, n = 0, len(text)
+    while pos < n:
+        k = rng.randint(1, n - pos)
+        roll = rng.random()
+        if roll < 0.4:
+            op.append(k)
+        elif roll < 0.7:
+            op.append(-k)
+        else:
+            op += [rng.choice(["x", "yz"]), k]
+        pos += k
+    if rng.random() < 0.5:
+        op.append("end")
+    return normalize(op)
+
+
+def test_transformed_operations_converge():
+    rng = random.Random(7)
+    for _ in range(500):
+        text = "".join(rng.choice("abc") for _ in range(rng.randint(0, 10)))
+        a, b = _random_op(text, rng), _random_op(text, rng)
+        a2, b2 = transform(a, b)
+        assert apply(apply(text, a), b2) == apply(apply(text, b), a2)
+
+
+def test_operations_count_utf16_units():
+    # The emoji is two units in JavaScript, so "after it" is offset 3.
+    assert apply("a😀b", [3, "!", -1]) == "a😀!"
+    with pytest.raises(OTError):
+        apply("a😀b", [2, "!", 2])
+    with pytest.raises(OTError):
+        apply("ab", [1])
+    with pytest.raises(OTError):
+        normalize([True])
+
+
+def _wait_closed(hub: CollabHub) -> None:
+    # The test client cancels the handler on disconnect; the session still saves and ends on its own.
+    deadline = time.monotonic() + 5
+    while hub.session_count() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert hub.session_count() == 0
+
+
+def _workspace(**files: str) -> str:
+    return json.dumps({"active": "main.tex", "entries": {p: {"type": "file", "content": c} for p, c in files.items()}})
+
+
+def test_concurrent_edits_merge_and_are_saved(tmp_path):
+    store = DocStore(db_path=tmp_path / "t.sqlite3")
+    store.create(DocCreateRequest(id="d1", title="t", content=_workspace(**{"main.tex": "hello"})))
+    hub = CollabHub(store, flush_interval_s=60)
+    app.dependency_overrides[get_collab_hub] = lambda: hub
+    try:
+        with TestClient(app) as client:
+            with client.websocket_connect("/api/doc/d1/collab") as a, client.websocket_connect("/api/doc/d1/collab") as b:
+                init = a.receive_json()
+                assert init["files"] == {"main.tex": {"rev": 0, "content": "hello"}}
+                b.receive_json()
+
+                # Both edit revision 0; b's insert is transformed past a's.
+                a.send_json({"path": "main.tex", "rev": 0, "op": ["> ", 5]})
+                assert a.receive_json() == {"type": "ack", "path": "main.tex", "rev": 1}
+                b.send_json({"path": "main.tex", "rev": 0, "op": [5, "!"]})
+                assert b.receive_json() == {"type": "op", "path": "main.tex", "rev": 1, "op": ["> ", 5], "client_id": init["client_id"]}
+                assert b.receive_json()["rev"] == 2
+                assert a.receive_json()["op"] == [7, "!"]
+
+                b.send_json({"path": "new.tex", "rev": 0, "op": ["x"]})
+                assert b.receive_json()["type"] == "ack"
+                a.receive_json()
+
+                b.send_json({"path": "main.tex", "rev": 2, "op": [99]})
+                assert b.receive_json()["type"] == "error"
+                assert b.receive_json() == {"type": "resync", "path": "main.tex", "rev": 2, "content": "> hello!"}
+            _wait_closed(hub)
+        files = json.loads(store.get("d1").content)["entries"]
+        assert files["main.tex"] == {"type": "file", "content": "> hello!"}
+        assert files["new.tex"] == {"type": "file", "content": "x"}
+    finally:
+        app.dependency_overrides.clear()
+
+
+def test_stale_revision_gets_a_resync(tmp_path):
+    store = DocStore(db_path=tmp_path / "t.sqlite3")
+    store.create(DocCreateRequest(id="d1", title="t", content=_workspace(**{"main.tex": ""})))
+    hub = CollabHub(store, history_limit=1)
+    app.dependency_overrides[get_collab_hub] = lambda: hub
+    try:
+        with TestClient(app) as client:
+            with client.websocket_connect("/api/doc/d1/collab") as ws:
+                ws.receive_json()
+                for rev in range(2):
+                    ws.send_json({"path": "main.tex", "rev": rev, "op": [rev, "a"]})
+                    ws.receive_json()
+                ws.send_json({"path": "main.tex", "rev": 0, "op": ["b"]})
+                assert ws.receive_json() == {"type": "resync", "path": "main.tex", "rev": 2, "content": "aa"}
+            with pytest.raises(WebSocketDisconnect) as closed:
+                with client.websocket_connect("/api/doc/missing/collab"):
+                    pass
+            assert closed.value.code == 4404
+    finally:
+        app.dependency_overrides.clear()
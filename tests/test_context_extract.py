@@ -25,3 +25,69 @@ def test_build_context_respects_token_limit():
     src = "\\section{A}\n" + ("x" * 2000)
     ctx = build_context_with_limits(src, max_chars=4000, max_tokens=50)
     assert estimate_tokens(ctx) <= 50
+
+
+def test_repeated_context_builds_reuse_one_parse(monkeypatch):
+    from fastapi.testclient import TestClient
+
+    from app.context import extract
+    from app.main import app
+
+    calls = []
+    parse = extract._parse_with_scanner
+    monkeypatch.setattr(extract, "_parse_with_scanner", lambda s: calls.append(s) or parse(s))
+    monkeypatch.setattr(extract, "_parse_with_pylatexenc", _unavailable)
+    extract.clear_parse_cache()
+    src = "\\section{Intro}\n\\label{sec:intro}\nSee \\cite{a, b}.\n" + "text " * 1000
+    client = TestClient(app)
+    for cursor in (40, 2000, 40):
+        body = {"sourceLatex": src, "cursorIndex": cursor, "maxContextChars": 500, "maxContextTokens": 200}
+        assert client.post("/api/context/build", json=body).status_code == 200
+    assert calls == [src]
+
+
+def test_structured_context_reads_window_from_position_tables():
+    from app.context.extract import extract_structured_context, parse_latex
+
+    src = "\\section{A}\\label{a}" + "x" * 100 + "\\section{B}\\cite{k1,k2}\\label{b}" + "y" * 100
+    parsed = parse_latex(src)
+    assert parse_latex(src) is parsed
+    meta = extract_structured_context(src, center_index=150, window_chars=40)
+    assert meta["currentSection"] == "B"
+    assert meta["labelsNear"] == ["b"]
+    assert meta["citationsNear"] == ["k1", "k2"]
+    assert parsed.window_ast(0, 20).labels == ["a"]
+
+
+def _unavailable(source):
+    raise ImportError("pylatexenc")
+
+
+def test_scanner_emits_positioned_events_in_one_pass():
+    from app.context.scanner import scan_latex
+
+    src = "\\section*{Intro {X}}\\label{a} 50\\% \\cite[p.~2]{b, c} % \\label{gone}\n\\begin{equation}x\\end{equation}\\eqref{a}"
+    events = [(e.kind, e.name, e.text) for e in scan_latex(src)]
+    assert events == [
+        ("heading", "section", "Intro {X}"),
+        ("label", "", "a"),
+        ("cite", "", "b, c"),
+        ("begin", "equation", ""),
+        ("end", "equation", ""),
+        ("ref", "", "a"),
+    ]
+    assert all(src[e.pos:e.end].startswith("\\") for e in scan_latex(src))
+
+
+def test_scanner_fallback_finds_current_heading_outside_the_window(monkeypatch):
+    from app.context import extract
+
+    monkeypatch.setattr(extract, "_parse_with_pylatexenc", _unavailable)
+    extract.clear_parse_cache()
+    src = "\\section{A}\n" + "x" * 3000 + "\\subsection{A.1}\\label{s}\n" + "y" * 3000 + "see \\cref{s,t} here"
+    meta = extract.extract_structured_context(src, center_index=len(src) - 5, window_chars=100)
+    assert meta["currentSection"] == "A.1"
+    assert meta["refsNear"] == ["s", "t"]
+    assert meta["labelsNear"] == []
+    assert extract.parse_latex_to_ast(src).sections == ["A"]
+    extract.clear_parse_cache()
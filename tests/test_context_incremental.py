@@ -0,0 +1,61 @@
+from app.context import extract
+from app.context.incremental import IncrementalParser, split_chunks
+
+DOC = r"""\documentclass{article}
+\begin{document}
+\section{Intro}\label{sec:intro}
+Text citing \cite{a,b} and {\bf bold
+
+across} a blank line. % a { in a comment
+
+\begin{figure}
+\caption{X}
+
+\label{fig:x}
+\end{figure}
+
+\section{Method}
+\begin{equation}\label{eq:1}
+E = mc^2
+\end{equation}
+\end{document}
+"""
+
+
+def test_chunks_break_only_outside_groups_and_environments():
+    chunks = [DOC[a:b] for a, b in split_chunks(DOC)]
+    assert "".join(chunks) == DOC
+    assert [c.split("\n", 1)[0] for c in chunks] == [
+        "\\documentclass{article}",
+        "\\begin{figure}",
+        "\\section{Method}",
+    ]
+
+
+def test_split_from_previous_version_matches_full_split():
+    previous = (DOC, split_chunks(DOC))
+    for edit in ("\n\nNew paragraph.\n\n", "{", "\\end{figure}", "x", ""):
+        for at in range(0, len(DOC) + 1, 7):
+            source = DOC[:at] + edit + DOC[at + 3:]
+            assert split_chunks(source, previous) == split_chunks(source)
+
+
+def test_edit_reparses_only_the_chunk_it_touches():
+    parsed: list[str] = []
+    parser = IncrementalParser(lambda text: parsed.append(text) or len(text))
+    assert len(parser.parse(DOC)) == parser.last.chunks == 3
+    edited = DOC.replace("\\caption{X}", "\\caption{Y}")
+    assert [(start, n) for start, n in parser.parse(edited)] == [(a, b - a) for a, b in split_chunks(edited)]
+    assert parser.last.parsed == 1
+    assert parsed[-1].startswith("\\begin{figure}")
+
+
+def test_chunked_parse_matches_whole_document_parse():
+    extract.clear_parse_cache()
+    whole = extract._parse_chunk(DOC)
+    parsed = extract.parse_latex(DOC)
+    for kind in ("sections", "labels", "citations", "equations"):
+        assert [(s.pos, s.end, s.text) for s in getattr(parsed, kind).spans] == [
+            (s.pos, s.end, s.text) for s in getattr(whole, kind)
+        ]
+    assert extract.parse_latex_to_ast(DOC).labels == ["sec:intro", "fig:x", "eq:1"]
@@ -0,0 +1,54 @@
+from app.persistence.cache import DocCache
+from app.persistence.models import DocCreateRequest, DocResponse
+from app.persistence.store import DocStore
+
+
+def test_hot_documents_are_served_from_cache(tmp_path):
+    store = DocStore(db_path=tmp_path / "t.sqlite3")
+    store.create(DocCreateRequest(id="d1", title="t", content="hello"))
+    for _ in range(5):
+        assert store.get("d1").content == "hello"
+    cache = store.stats()["cache"]
+    assert cache["hits"] == 5
+    assert cache["misses"] == 0
+
+    store.update("d1", title="t", content="changed", settings={})
+    assert store.get("d1").content == "changed"
+    doc = store.restore_revision("d1", store.list_revisions("d1")[0]["id"])
+    assert doc.content == "hello"
+    assert store.get("d1").content == "hello"
+
+
+def test_writes_from_another_store_are_never_served_stale(tmp_path):
+    db_path = tmp_path / "t.sqlite3"
+    a = DocStore(db_path=db_path)
+    b = DocStore(db_path=db_path)
+    a.create(DocCreateRequest(id="d1", title="t", content="v1"))
+    assert a.get("d1").content == "v1"
+    b.update("d1", title="t", content="v2", settings={})
+    assert a.get("d1").content == "v2"
+
+
+def test_cache_evicts_least_recently_used_by_size():
+    cache = DocCache(max_entries=10, max_bytes=10)
+    cache.put("a", 1, DocResponse(id="a", content="aaaa"))
+    cache.put("b", 1, DocResponse(id="b", content="bbbb"))
+    assert cache.get("a", 1) is not None
+    cache.put("c", 1, DocResponse(id="c", content="cccc"))
+    assert cache.get("b", 1) is None
+    assert cache.get("a", 1) is not None
+    assert cache.get("a", 2) is None
+    stats = cache.stats()
+    assert stats["evictions"] == 1
+    assert stats["bytes"] == 8
+
+
+def test_cache_size_is_measured_in_utf8_bytes():
+    cache = DocCache(max_entries=10, max_bytes=10)
+    # Four characters, eight bytes.
+    cache.put("a", 1, DocResponse(id="a", content="ääää"))
+    assert cache.stats()["bytes"] == 8
+    cache.put("b", 1, DocResponse(id="b", content="bbbb"))
+    assert cache.get("a", 1) is None
+    cache.put("c", 1, DocResponse(id="c", content="é" * 6))
+    assert cache.get("c", 1) is None
@@ -0,0 +1,92 @@
+import json
+
+from fastapi.testclient import TestClient
+
+from app.main import app
+from app.persistence.store import DocStore
+from app.wiring import get_doc_store
+
+
+def test_get_returns_etag_and_304_when_unchanged(tmp_path):
+    store = DocStore(db_path=tmp_path / "t.sqlite3")
+    app.dependency_overrides[get_doc_store] = lambda: store
+    try:
+        client = TestClient(app)
+        created = client.post("/api/doc", json={"title": "t", "content": "hello"})
+        doc_id = created.json()["id"]
+        etag = created.headers["etag"]
+
+        read = client.get(f"/api/doc/{doc_id}")
+        assert read.headers["etag"] == etag
+        assert read.json()["version"] == 1
+
+        cached = client.get(f"/api/doc/{doc_id}", headers={"If-None-Match": etag})
+        assert cached.status_code == 304
+        assert cached.content == b""
+
+        updated = client.put(f"/api/doc/{doc_id}", json={"title": "t", "content": "new"})
+        assert updated.headers["etag"] != etag
+        assert client.get(f"/api/doc/{doc_id}", headers={"If-None-Match": etag}).status_code == 200
+    finally:
+        app.dependency_overrides.clear()
+
+
+def test_put_with_stale_if_match_returns_412(tmp_path):
+    store = DocStore(db_path=tmp_path / "t.sqlite3")
+    app.dependency_overrides[get_doc_store] = lambda: store
+    try:
+        client = TestClient(app)
+        created = client.post("/api/doc", json={"title": "t", "content": "base"})
+        doc_id = created.json()["id"]
+        etag = created.headers["etag"]
+
+        first = client.put(f"/api/doc/{doc_id}", json={"title": "t", "content": "alice"}, headers={"If-Match": etag})
+        assert first.status_code == 200
+        second = client.put(f"/api/doc/{doc_id}", json={"title": "t", "content": "bob"}, headers={"If-Match": etag})
+        assert second.status_code == 412
+        assert second.json()["error"]["status"] == 412
+        assert client.get(f"/api/doc/{doc_id}").json()["content"] == "alice"
+
+        ws = json.dumps({"entries": {}})
+        client.put(f"/api/doc/{doc_id}", json={"title": "t", "content": ws})
+        stale = client.patch(
+            f"/api/doc/{doc_id}/files", json={"delete": ["x"]}, headers={"If-Match": first.headers["etag"]}
+        )
+        assert stale.status_code == 412
+        assert client.put(f"/api/doc/{doc_id}", json={"title": "t", "content": "x"}, headers={"If-Match": "W/\"1\""}).status_code == 412
+        assert client.put(f"/api/doc/{doc_id}", json={"title": "t", "content": "x"}, headers={"If-Match": "*"}).status_code == 200
+    finally:
+        app.dependency_overrides.clear()
+
+
+def test_restore_returns_etag_usable_for_if_match(tmp_path):
+    store = DocStore(db_path=tmp_path / "t.sqlite3")
+    app.dependency_overrides[get_doc_store] = lambda: store
+    try:
+        client = TestClient(app)
+        doc_id = client.post("/api/doc", json={"title": "t", "content": "v1"}).json()["id"]
+        client.put(f"/api/doc/{doc_id}", json={"title": "t", "content": "v2"})
+        rev_id = client.get(f"/api/doc/{doc_id}/revisions").json()[0]["id"]
+
+        restored = client.post(f"/api/doc/{doc_id}/revisions/{rev_id}/restore")
+        assert restored.headers["etag"] == client.get(f"/api/doc/{doc_id}").headers["etag"]
+        res = client.put(
+            f"/api/doc/{doc_id}", json={"title": "t", "content": "v3"}, headers={"If-Match": restored.headers["etag"]}
+        )
+        assert res.status_code == 200
+    finally:
+        app.dependency_overrides.clear()
+
+
+def test_share_supports_if_none_match(tmp_path):
+    store = DocStore(db_path=tmp_path / "t.sqlite3")
+    app.dependency_overrides[get_doc_store] = lambda: store
+    try:
+        client = TestClient(app)
+        doc_id = client.post("/api/doc", json={"title": "t", "content": "shared"}).json()["id"]
+        url = client.post(f"/api/doc/{doc_id}/share").json()["url"]
+        first = client.get(url)
+        assert first.status_code == 200
+        assert client.get(url, headers={"If-None-Match": first.headers["etag"]}).status_code == 304
+    finally:
+        app.dependency_overrides.clear()
@@ -0,0 +1,114 @@
+import asyncio
+import json
+import threading
+
+from fastapi.testclient import TestClient
+
+from app.api.events import stream_events
+from app.events.bus import EventBus
+from app.main import app
+from app.persistence.models import DocCreateRequest
+from app.persistence.presence import PresenceRegistry
+from app.persistence.store import DocStore
+from app.wiring import get_doc_store, get_event_bus, get_latex_compiler, get_presence_registry
+
+
+def test_events_published_from_other_threads_wake_subscribers():
+    async def scenario():
+        bus = EventBus()
+        sub = bus.subscribe("d1")
+        other = bus.subscribe("d2")
+        threading.Thread(target=lambda: bus.publish("d1", "log", {"body": "hi"})).start()
+        event = await sub.get(timeout=2)
+        assert json.loads(event.payload) == {"id": event.id, "type": "log", "doc_id": "d1", "data": {"body": "hi"}}
+        assert other.get_nowait() is None
+        assert await sub.get(timeout=0.01) is None
+        sub.close()
+        assert bus.subscriber_count("d1") == 0
+        assert bus.publish("d1", "log", {}) == 0
+
+    asyncio.run(scenario())
+
+
+def test_slow_subscriber_drops_oldest_and_is_told():
+    async def scenario():
+        bus = EventBus()
+        slow = bus.subscribe("d1", max_pending=3)
+        fast = bus.subscribe("d1")
+        for i in range(10):
+            assert bus.publish("d1", "log", {"n": i}) == 2
+        overflow = slow.get_nowait()
+        assert overflow.type == "overflow"
+        assert json.loads(overflow.payload)["data"] == {"dropped": 7}
+        assert [json.loads(slow.get_nowait().payload)["data"]["n"] for _ in range(3)] == [7, 8, 9]
+        assert slow.get_nowait() is None
+        assert len([fast.get_nowait() for _ in range(10)]) == 10
+
+    asyncio.run(scenario())
+
+
+class FakeCompiler:
+    def compile_pdf(self, source: str) -> bytes:
+        return b"%PDF-1.4"
+
+
+def test_websocket_receives_comments_versions_and_presence(tmp_path):
+    store = DocStore(db_path=tmp_path / "t.sqlite3")
+    bus = EventBus()
+    registry = PresenceRegistry(on_change=lambda doc_id, users: bus.publish(doc_id, "presence", {"users": users}))
+    app.dependency_overrides[get_doc_store] = lambda: store
+    app.dependency_overrides[get_event_bus] = lambda: bus
+    app.dependency_overrides[get_presence_registry] = lambda: registry
+    app.dependency_overrides[get_latex_compiler] = lambda: FakeCompiler()
+    try:
+        client = TestClient(app)
+        doc_id = client.post("/api/doc", json={"title": "t", "content": "a"}).json()["id"]
+        with client.websocket_connect(f"/api/doc/{doc_id}/events/ws") as ws:
+            assert ws.receive_json() == {"id": 0, "type": "ready", "doc_id": doc_id, "data": {"version": 1}}
+
+            client.post(f"/api/doc/{doc_id}/comments", json={"body": "nice"})
+            event = ws.receive_json()
+            assert (event["type"], event["data"]["body"]) == ("comment", "nice")
+
+            client.put(f"/api/doc/{doc_id}", json={"title": "t", "content": "b"}, headers={"X-Edit-Session": "tab"})
+            assert ws.receive_json()["data"] == {"version": 2, "session": "tab"}
+
+            body = {"doc_id": doc_id, "user_id": "u1", "display_name": "User"}
+            client.post("/api/presence/heartbeat", json=body)
+            client.post("/api/presence/heartbeat", json=body)
+            client.post(f"/api/doc/{doc_id}/logs", json={"body": "built"})
+            presence = ws.receive_json()
+            assert presence["type"] == "presence"
+            assert [u["user_id"] for u in presence["data"]["users"]] == ["u1"]
+            # The repeat heartbeat changed nothing, so the next event is the log.
+            assert ws.receive_json()["type"] == "log"
+
+            assert client.post("/api/latex/compile", json={"sourceLatex": "x", "docId": doc_id}).status_code == 200
+            assert [ws.receive_json()["data"]["status"] for _ in range(2)] == ["running", "succeeded"]
+        assert bus.subscriber_count(doc_id) == 0
+    finally:
+        app.dependency_overrides.clear()
+
+
+def test_sse_stream_frames_events(tmp_path):
+    store = DocStore(db_path=tmp_path / "t.sqlite3")
+    store.create(DocCreateRequest(id="d1", title="t", content="a"))
+    bus = EventBus()
+
+    class FakeRequest:
+        async def is_disconnected(self):
+            return False
+
+    async def scenario():
+        response = await stream_events("d1", FakeRequest(), store=store, bus=bus)
+        assert response.headers["content-type"].startswith("text/event-stream")
+        frames = response.body_iterator
+        assert json.loads((await frames.__anext__())[len("data: "):])["type"] == "ready"
+        bus.publish("d1", "compile", {"status": "running"})
+        frame = await frames.__anext__()
+        assert frame.startswith("id: ")
+        assert json.loads(frame.split("data: ", 1)[1])["data"] == {"status": "running"}
+        await frames.aclose()
+        assert bus.subscriber_count("d1") == 0
+
+    asyncio.run(scenario())
@@ -0,0 +1,107 @@
+import json
+import sqlite3
+
+from fastapi.testclient import TestClient
+
+from app.main import app
+from app.persistence.store import DocStore
+from app.wiring import get_doc_store
+
+
+def _workspace(**files):
+    return {"active": next(iter(files), None), "entries": {p: {"type": "file", "content": c} for p, c in files.items()}}
+
+
+def test_workspace_put_roundtrips_through_per_file_rows(tmp_path):
+    store = DocStore(db_path=tmp_path / "t.sqlite3")
+    app.dependency_overrides[get_doc_store] = lambda: store
+    try:
+        client = TestClient(app)
+        ws = _workspace(**{"main.tex": "\\input{a}", "a.tex": "alpha"})
+        ws["entries"]["figs"] = {"type": "folder"}
+        doc_id = client.post("/api/doc", json={"title": "t", "content": json.dumps(ws)}).json()["id"]
+
+        read = client.get(f"/api/doc/{doc_id}").json()
+        assert json.loads(read["content"]) == ws
+        assert list(json.loads(read["content"])["entries"]) == ["main.tex", "a.tex", "figs"]
+
+        with store._pool.read() as conn:
+            paths = [r["path"] for r in conn.execute("SELECT path FROM doc_files WHERE doc_id = ?", (doc_id,))]
+        assert sorted(paths) == ["a.tex", "figs", "main.tex"]
+    finally:
+        app.dependency_overrides.clear()
+
+
+def test_patch_files_upserts_and_deletes_single_entries(tmp_path):
+    store = DocStore(db_path=tmp_path / "t.sqlite3")
+    app.dependency_overrides[get_doc_store] = lambda: store
+    try:
+        client = TestClient(app)
+        ws = _workspace(**{"main.tex": "hello", "old.tex": "stale"})
+        doc_id = client.post("/api/doc", json={"title": "t", "content": json.dumps(ws)}).json()["id"]
+
+        resp = client.patch(
+            f"/api/doc/{doc_id}/files",
+            json={"upsert": {"main.tex": {"type": "file", "content": "hello world"}, "new.tex": {"content": "zebra"}}, "delete": ["old.tex"]},
+        )
+        assert resp.status_code == 200
+        assert resp.json()["deleted"] == ["old.tex"]
+
+        content = json.loads(client.get(f"/api/doc/{doc_id}").json()["content"])
+        assert content["active"] == "main.tex"
+        assert content["entries"] == {
+            "main.tex": {"type": "file", "content": "hello world"},
+            "new.tex": {"type": "file", "content": "zebra"},
+        }
+        hits = client.get(f"/api/doc/{doc_id}/search", params={"q": "zebra"}).json()["results"]
+        assert [h["path"] for h in hits] == ["new.tex"]
+        assert client.get(f"/api/doc/{doc_id}/search", params={"q": "stale"}).json()["results"] == []
+        assert len(client.get(f"/api/doc/{doc_id}/revisions").json()) == 1
+    finally:
+        app.dependency_overrides.clear()
+
+
+def test_patch_files_ignores_repeated_deletes_in_size(tmp_path):
+    store = DocStore(db_path=tmp_path / "t.sqlite3")
+    app.dependency_overrides[get_doc_store] = lambda: store
+    try:
+        client = TestClient(app)
+        ws = _workspace(**{"main.tex": "hello", "old.tex": "stale"})
+        doc_id = client.post("/api/doc", json={"title": "t", "content": json.dumps(ws)}).json()["id"]
+        res = client.patch(f"/api/doc/{doc_id}/files", json={"delete": ["old.tex", "old.tex"]})
+        assert res.status_code == 200
+        patched = store.get_meta(doc_id)["size"]
+
+        # The same workspace written in full must land on the same size.
+        content = client.get(f"/api/doc/{doc_id}").json()["content"]
+        client.put(f"/api/doc/{doc_id}", json={"title": "t", "content": content})
+        assert store.get_meta(doc_id)["size"] == patched
+    finally:
+        app.dependency_overrides.clear()
+
+
+def test_patch_files_rejects_plain_documents_and_missing_docs(tmp_path):
+    store = DocStore(db_path=tmp_path / "t.sqlite3")
+    app.dependency_overrides[get_doc_store] = lambda: store
+    try:
+        client = TestClient(app)
+        doc_id = client.post("/api/doc", json={"title": "t", "content": "plain text"}).json()["id"]
+        assert client.patch(f"/api/doc/{doc_id}/files", json={"delete": ["x"]}).status_code == 409
+        assert client.patch("/api/doc/missing/files", json={"delete": ["x"]}).status_code == 404
+    finally:
+        app.dependency_overrides.clear()
+
+
+def test_existing_workspace_blobs_are_split_on_open(tmp_path):
+    db_path = tmp_path / "t.sqlite3"
+    ws = _workspace(**{"main.tex": "legacy"})
+    with sqlite3.connect(db_path) as conn:
+        conn.execute("CREATE TABLE docs (id TEXT PRIMARY KEY, title TEXT, content TEXT NOT NULL, settings_json TEXT NOT NULL)")
+        conn.execute("INSERT INTO docs VALUES ('d1', 't', ?, '{}')", (json.dumps(ws),))
+    conn.close()
+
+    store = DocStore(db_path=db_path)
+    assert json.loads(store.get("d1").content) == ws
+    with store._pool.read() as conn:
+        row = conn.execute("SELECT layout FROM docs WHERE id = 'd1'").fetchone()
+    assert row["layout"] == "files"
@@ -0,0 +1,103 @@
+from datetime import datetime, timezone
+
+from fastapi.testclient import TestClient
+
+from app.main import app
+from app.persistence import store as store_module
+from app.persistence.models import DocCreateRequest
+from app.persistence.revisions import RevisionPolicy
+from app.persistence.store import DocStore
+from app.wiring import get_doc_store
+
+
+def test_autosaves_from_one_session_share_a_revision(tmp_path):
+    store = DocStore(db_path=tmp_path / "t.sqlite3")
+    store.create(DocCreateRequest(id="d1", title="t", content="v0"))
+    for i in range(1, 6):
+        store.update("d1", title="t", content=f"v{i}", settings={}, session_id="tab-a")
+    revs = store.list_revisions("d1")
+    assert len(revs) == 1
+    assert store.get_revision("d1", revs[0]["id"])["content"] == "v0"
+
+    # Another session, or a save without one, opens its own revision.
+    store.update("d1", title="t", content="v6", settings={}, session_id="tab-b")
+    store.update("d1", title="t", content="v7", settings={})
+    assert [store.get_revision("d1", r["id"])["content"] for r in store.list_revisions("d1")] == ["v6", "v5", "v0"]
+
+
+def test_coalescing_window_expires(tmp_path):
+    store = DocStore(db_path=tmp_path / "t.sqlite3", revision_policy=RevisionPolicy(coalesce_window_s=0))
+    store.create(DocCreateRequest(id="d1", title="t", content="v0"))
+    store.update("d1", title="t", content="v1", settings={}, session_id="s")
+    store.update("d1", title="t", content="v2", settings={}, session_id="s")
+    assert len(store.list_revisions("d1")) == 2
+
+
+def test_long_session_keeps_opening_revisions(tmp_path, monkeypatch):
+    store = DocStore(db_path=tmp_path / "t.sqlite3", revision_policy=RevisionPolicy(coalesce_max_span_s=600))
+    store.create(DocCreateRequest(id="d1", title="t", content="v0"))
+    clock = [store_module._now_ms()]
+    monkeypatch.setattr(store_module, "_now_ms", lambda: clock[0])
+    # Three hours of autosaves every 30 s, never idle for a whole coalescing window.
+    for i in range(1, 361):
+        clock[0] += 30_000
+        store.update("d1", title="t", content=f"v{i}", settings={}, session_id="s")
+    contents = [store.get_revision("d1", r["id"])["content"] for r in store.list_revisions("d1")]
+    assert len(contents) == 18
+    assert contents[-1] == "v0"
+    assert contents[0] == "v340"
+
+
+def test_checkpoint_is_kept_and_breaks_coalescing(tmp_path):
+    store = DocStore(db_path=tmp_path / "t.sqlite3")
+    store.create(DocCreateRequest(id="d1", title="t", content="v0"))
+    store.update("d1", title="t", content="v1", settings={}, session_id="s")
+    cp = store.create_checkpoint("d1", label="draft")
+    assert cp["checkpoint"] and cp["label"] == "draft"
+    # The save right after the checkpoint must not record v1 a second time.
+    store.update("d1", title="t", content="v2", settings={}, session_id="s")
+    store.update("d1", title="t", content="v3", settings={}, session_id="s")
+    contents = [store.get_revision("d1", r["id"])["content"] for r in store.list_revisions("d1")]
+    assert contents == ["v2", "v1", "v0"]
+    assert store.create_checkpoint("missing") is None
+
+
+def test_thinning_keeps_checkpoints_and_rebuilds_chain(tmp_path):
+    policy = RevisionPolicy(coalesce_window_s=0, thinning=((float("inf"), 86400.0),), thin_every=0)
+    store = DocStore(db_path=tmp_path / "t.sqlite3", revision_policy=policy, revision_keyframe_interval=4)
+    store.create(DocCreateRequest(id="d1", title="t", content="line\n"))
+    for i in range(10):
+        store.update("d1", title="t", content="line\n" * (i + 2), settings={})
+        if i == 3:
+            store.create_checkpoint("d1")
+    before = {r["id"]: store.get_revision("d1", r["id"])["content"] for r in store.list_revisions("d1")}
+
+    removed = store.thin_revisions("d1", now=datetime.now(timezone.utc).timestamp())
+    revs = store.list_revisions("d1")
+    assert removed == len(before) - len(revs)
+    # Everything was saved today: the checkpoint and the newest revision survive.
+    assert len(revs) == 2
+    assert revs[1]["checkpoint"]
+    for r in revs:
+        assert store.get_revision("d1", r["id"])["content"] == before[r["id"]]
+    assert store.thin_revisions("missing") is None
+
+
+def test_edit_session_header_and_checkpoint_endpoint(tmp_path):
+    store = DocStore(db_path=tmp_path / "t.sqlite3")
+    app.dependency_overrides[get_doc_store] = lambda: store
+    try:
+        client = TestClient(app)
+        doc_id = client.post("/api/doc", json={"title": "t", "content": "a"}).json()["id"]
+        for content in ("b", "c", "d"):
+            client.put(f"/api/doc/{doc_id}", json={"title": "t", "content": content}, headers={"X-Edit-Session": "s1"})
+        assert len(client.get(f"/api/doc/{doc_id}/revisions").json()) == 1
+
+        cp = client.post(f"/api/doc/{doc_id}/revisions/checkpoint", json={"label": "v1"})
+        assert cp.status_code == 200
+        assert cp.json()["checkpoint"] is True
+        assert client.get(f"/api/doc/{doc_id}/revisions").json()[0]["label"] == "v1"
+        assert client.post(f"/api/doc/{doc_id}/revisions/thin").json() == {"removed": 0}
+        assert client.post("/api/doc/nope/revisions/checkpoint").status_code == 404
+    finally:
+        app.dependency_overrides.clear()
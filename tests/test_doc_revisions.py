@@ -0,0 +1,93 @@
+import json
+import sqlite3
+
+from fastapi.testclient import TestClient
+
+from app.main import app
+from app.persistence import revisions
+from app.persistence.models import DocCreateRequest
+from app.persistence.store import DocStore
+from app.wiring import get_doc_store
+
+
+def _ws(files: dict[str, str], active: str | None = None) -> str:
+    return json.dumps(
+        {"active": active, "entries": {p: {"type": "file", "content": c} for p, c in files.items()}},
+        separators=(",", ":"),
+    )
+
+
+def test_delta_codec_roundtrips_text_and_workspaces():
+    old_text = "line one\nline two\nline three\n"
+    new_text = "line one\nline 2\nline three\nline four"
+    assert revisions.decode("delta", revisions.encode_delta(old_text, new_text), old_text) == new_text
+
+    old_ws = _ws({"a.tex": "alpha\nbeta\n", "b.tex": "bee", "c.tex": "sea"}, active="a.tex")
+    new_ws = _ws({"c.tex": "sea", "a.tex": "alpha\nBETA\n", "d.tex": "dee"}, active="d.tex")
+    decoded = revisions.decode("delta", revisions.encode_delta(old_ws, new_ws), old_ws)
+    assert decoded == new_ws
+    assert list(json.loads(decoded)["entries"]) == ["c.tex", "a.tex", "d.tex"]
+
+
+def test_revisions_are_deltas_between_keyframes(tmp_path):
+    store = DocStore(db_path=tmp_path / "t.sqlite3", revision_keyframe_interval=4)
+    big = "\n".join(f"paragraph {i} " + "x" * 60 for i in range(200))
+    files = {"main.tex": big, "other.tex": big}
+    store.create(DocCreateRequest(id="d1", title="t", content=_ws(files)))
+    history = [store.get("d1").content]
+    for i in range(10):
+        files["main.tex"] = files["main.tex"] + f"\nedit {i}"
+        store.update("d1", title="t", content=_ws(files), settings={})
+        history.append(store.get("d1").content)
+
+    with store._pool.read() as conn:
+        rows = conn.execute("SELECT seq, kind, length(payload) AS n FROM doc_revisions ORDER BY seq").fetchall()
+    assert [r["kind"] for r in rows] == ["key", "delta", "delta", "delta"] * 2 + ["key", "delta"]
+    assert max(r["n"] for r in rows if r["kind"] == "delta") < min(r["n"] for r in rows if r["kind"] == "key") / 10
+
+    listed = store.list_revisions("d1")
+    assert len(listed) == 10
+    for rev, expected in zip(reversed(listed), history):
+        assert store.get_revision("d1", rev["id"])["content"] == expected
+
+
+def test_restore_rebuilds_revision_content(tmp_path):
+    store = DocStore(db_path=tmp_path / "t.sqlite3", revision_keyframe_interval=3)
+    app.dependency_overrides[get_doc_store] = lambda: store
+    try:
+        client = TestClient(app)
+        doc_id = client.post("/api/doc", json={"title": "t", "content": "v0\n"}).json()["id"]
+        for i in range(1, 6):
+            client.put(f"/api/doc/{doc_id}", json={"title": "t", "content": f"v0\nv{i}\n"})
+        revs = client.get(f"/api/doc/{doc_id}/revisions").json()
+        oldest = revs[-1]["id"]
+        assert client.get(f"/api/doc/{doc_id}/revisions/{oldest}").json()["content"] == "v0\n"
+        restored = client.post(f"/api/doc/{doc_id}/revisions/{oldest}/restore")
+        assert restored.status_code == 200
+        assert restored.json()["content"] == "v0\n"
+    finally:
+        app.dependency_overrides.clear()
+
+
+def test_full_copy_revisions_are_migrated_on_open(tmp_path):
+    db_path = tmp_path / "t.sqlite3"
+    with sqlite3.connect(db_path) as conn:
+        conn.execute("CREATE TABLE docs (id TEXT PRIMARY KEY, title TEXT, content TEXT NOT NULL, settings_json TEXT NOT NULL)")
+        conn.execute(
+            "CREATE TABLE doc_revisions (id TEXT PRIMARY KEY, doc_id TEXT NOT NULL, content TEXT NOT NULL, created_at TEXT NOT NULL)"
+        )
+        conn.execute("INSERT INTO docs VALUES ('d1', 't', 'v3', '{}')")
+        for i in range(3):
+            conn.execute(
+                "INSERT INTO doc_revisions VALUES (?, 'd1', ?, ?)",
+                (f"r{i}", f"v{i}\n" * 50, f"2024-01-01T00:00:0{i}+00:00"),
+            )
+    conn.close()
+
+    store = DocStore(db_path=db_path)
+    with store._pool.read() as conn:
+        rows = conn.execute("SELECT id, seq, kind, content FROM doc_revisions ORDER BY seq").fetchall()
+    assert [(r["id"], r["seq"], r["content"]) for r in rows] == [("r0", 1, ""), ("r1", 2, ""), ("r2", 3, "")]
+    assert all(r["kind"] in ("key", "delta") for r in rows)
+    for i in range(3):
+        assert store.get_revision("d1", f"r{i}")["content"] == f"v{i}\n" * 50
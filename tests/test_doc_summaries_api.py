@@ -0,0 +1,62 @@
+import json
+import time
+
+from fastapi.testclient import TestClient
+
+from app.main import app
+from app.persistence.store import DocStore
+from app.wiring import get_doc_store
+
+
+def test_summaries_are_paginated_with_cursor(tmp_path):
+    store = DocStore(db_path=tmp_path / "t.sqlite3")
+    app.dependency_overrides[get_doc_store] = lambda: store
+    try:
+        client = TestClient(app)
+        ids = [client.post("/api/doc", json={"title": f"d{i}", "content": "x" * i}).json()["id"] for i in range(5)]
+
+        # Most recently updated first.
+        time.sleep(0.002)
+        client.put(f"/api/doc/{ids[1]}", json={"title": "d1", "content": "y"})
+        expected = [ids[1], ids[4], ids[3], ids[2], ids[0]]
+
+        first = client.get("/api/doc/summaries", params={"limit": 2}).json()
+        assert [item["id"] for item in first["items"]] == expected[:2]
+        assert first["items"][1]["size"] == 4
+        assert "content" not in first["items"][0]
+        assert first["nextCursor"]
+
+        second = client.get("/api/doc/summaries", params={"limit": 2, "cursor": first["nextCursor"]}).json()
+        third = client.get("/api/doc/summaries", params={"limit": 2, "cursor": second["nextCursor"]}).json()
+        assert [item["id"] for item in second["items"] + third["items"]] == expected[2:]
+        assert third["nextCursor"] is None
+
+        assert client.get("/api/doc/summaries", params={"cursor": "nope"}).status_code == 400
+    finally:
+        app.dependency_overrides.clear()
+
+
+def test_meta_size_tracks_puts_and_patches(tmp_path):
+    store = DocStore(db_path=tmp_path / "t.sqlite3")
+    app.dependency_overrides[get_doc_store] = lambda: store
+    try:
+        client = TestClient(app)
+        ws = {"active": None, "entries": {"a.tex": {"type": "file", "content": "aaaa"}}}
+        doc_id = client.post("/api/doc", json={"title": "t", "content": json.dumps(ws)}).json()["id"]
+        created = store.get_meta(doc_id)
+        assert created["updated_at"]
+
+        client.patch(f"/api/doc/{doc_id}/files", json={"upsert": {"b.tex": {"type": "file", "content": "bbbbbbbb"}}})
+        patched = store.get_meta(doc_id)["size"]
+
+        # A full rewrite of the same workspace must land on the same size as the patch.
+        content = client.get(f"/api/doc/{doc_id}").json()["content"]
+        client.put(f"/api/doc/{doc_id}", json={"title": "t", "content": content})
+        assert store.get_meta(doc_id)["size"] == patched
+        assert patched > created["size"]
+
+        assert store.exists(doc_id)
+        assert not store.exists("missing")
+        assert store.get_meta("missing") is None
+    finally:
+        app.dependency_overrides.clear()
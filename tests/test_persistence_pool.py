@@ -0,0 +1,173 @@
+import gc
+import sqlite3
+import threading
+import time
+
+import pytest
+
+from app.persistence.local_models import LocalModelStore
+from app.persistence.pool import ConnectionPool, get_pool
+from app.persistence.store import DocStore
+from app.persistence.models import DocCreateRequest
+
+
+def test_pool_enables_wal_and_is_shared_per_path(tmp_path):
+    db_path = tmp_path / "t.sqlite3"
+    docs = DocStore(db_path=db_path)
+    models = LocalModelStore(db_path=db_path)
+    assert docs._pool is models._pool is get_pool(db_path)
+    with docs._pool.read() as conn:
+        assert conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+
+
+def test_readers_are_not_blocked_by_open_write(tmp_path):
+    pool = ConnectionPool(tmp_path / "t.sqlite3")
+    store = DocStore(db_path=tmp_path / "t.sqlite3", pool=pool)
+    store.create(DocCreateRequest(id="d1", title="t", content="before"))
+
+    in_write = threading.Event()
+    release = threading.Event()
+
+    def writer():
+        with pool.write() as conn:
+            conn.execute("UPDATE docs SET content = 'after', version = version + 1 WHERE id = 'd1'")
+            in_write.set()
+            release.wait(timeout=5)
+
+    t = threading.Thread(target=writer)
+    t.start()
+    try:
+        assert in_write.wait(timeout=5)
+        # The writer still holds its transaction; readers see the last committed value.
+        assert store.get("d1").content == "before"
+    finally:
+        release.set()
+        t.join()
+    assert store.get("d1").content == "after"
+    pool.close()
+
+
+def test_write_rolls_back_on_error(tmp_path):
+    pool = ConnectionPool(tmp_path / "t.sqlite3")
+    store = DocStore(db_path=tmp_path / "t.sqlite3", pool=pool)
+    store.create(DocCreateRequest(id="d1", title="t", content="x"))
+    with pytest.raises(RuntimeError):
+        with pool.write() as conn:
+            conn.execute("UPDATE docs SET content = 'y', version = version + 1 WHERE id = 'd1'")
+            raise RuntimeError("boom")
+    assert store.get("d1").content == "x"
+    pool.close()
+
+
+def _hold_until_queued(pool, n, rows):
+    def first():
+        with pool.write() as conn:
+            conn.execute("INSERT INTO t (v) VALUES ('first')")
+            deadline = time.monotonic() + 5
+            while pool._queued < n and time.monotonic() < deadline:
+                time.sleep(0.001)
+        rows.append("first")
+
+    return threading.Thread(target=first)
+
+
+def test_concurrent_writes_are_group_committed(tmp_path):
+    pool = ConnectionPool(tmp_path / "t.sqlite3")
+    with pool.write() as conn:
+        conn.execute("CREATE TABLE t (v TEXT)")
+    done = []
+
+    def writer(i):
+        with pool.write() as conn:
+            conn.execute("INSERT INTO t (v) VALUES (?)", (str(i),))
+        # Returned means committed: a fresh reader on this thread sees the row.
+        with pool.read() as conn:
+            assert conn.execute("SELECT 1 FROM t WHERE v = ?", (str(i),)).fetchone()
+        done.append(i)
+
+    first = _hold_until_queued(pool, 8, done)
+    first.start()
+    time.sleep(0.05)
+    threads = [threading.Thread(target=writer, args=(i,)) for i in range(8)]
+    for t in threads:
+        t.start()
+    for t in [first, *threads]:
+        t.join()
+    assert len(done) == 9
+    stats = pool.stats()
+    assert stats["writes"] == 10
+    assert stats["commits"] < stats["writes"] - 4
+    pool.close()
+
+
+def test_failed_block_does_not_undo_its_batch(tmp_path):
+    pool = ConnectionPool(tmp_path / "t.sqlite3")
+    with pool.write() as conn:
+        conn.execute("CREATE TABLE t (v TEXT)")
+    done = []
+    errors = []
+
+    def ok():
+        with pool.write() as conn:
+            conn.execute("INSERT INTO t (v) VALUES ('ok')")
+
+    def failing():
+        try:
+            with pool.write() as conn:
+                conn.execute("INSERT INTO t (v) VALUES ('bad')")
+                raise RuntimeError("boom")
+        except RuntimeError as exc:
+            errors.append(exc)
+
+    first = _hold_until_queued(pool, 2, done)
+    first.start()
+    time.sleep(0.05)
+    others = [threading.Thread(target=failing), threading.Thread(target=ok)]
+    for t in others:
+        t.start()
+    for t in [first, *others]:
+        t.join()
+    assert len(errors) == 1
+    with pool.read() as conn:
+        assert sorted(r[0] for r in conn.execute("SELECT v FROM t").fetchall()) == ["first", "ok"]
+    pool.close()
+
+
+def test_reader_is_closed_when_its_thread_exits(tmp_path):
+    pool = ConnectionPool(tmp_path / "t.sqlite3")
+    opened = []
+
+    def read():
+        with pool.read() as conn:
+            conn.execute("SELECT 1").fetchone()
+            opened.append(conn)
+
+    threads = [threading.Thread(target=read) for _ in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    gc.collect()
+    assert len(pool._readers) == 0
+    for conn in opened:
+        with pytest.raises(sqlite3.ProgrammingError):
+            conn.execute("SELECT 1")
+    pool.close()
+
+
+def test_read_block_sees_one_snapshot(tmp_path):
+    pool = ConnectionPool(tmp_path / "t.sqlite3")
+    store = DocStore(db_path=tmp_path / "t.sqlite3", pool=pool)
+    store.create(DocCreateRequest(id="d1", title="t", content="before"))
+    with pool.read() as conn:
+        version = conn.execute("SELECT version FROM docs WHERE id = 'd1'").fetchone()[0]
+        # A save committed mid-block is not visible until the block ends.
+        t = threading.Thread(target=lambda: store.update("d1", "t", "after", {}))
+        t.start()
+        t.join()
+        with pool.read() as nested:
+            assert nested.execute("SELECT version FROM docs WHERE id = 'd1'").fetchone()[0] == version
+        assert store._read_content(conn, conn.execute("SELECT * FROM docs WHERE id = 'd1'").fetchone()) == "before"
+    assert not conn.in_transaction
+    assert store.get("d1").content == "after"
+    pool.close()
@@ -0,0 +1,67 @@
+from fastapi.testclient import TestClient
+
+from app.main import app
+from app.persistence.presence import PresenceRegistry
+from app.persistence.store import DocStore
+from app.wiring import get_presence_registry
+
+
+class FakeClock:
+    def __init__(self, now: float = 1_000_000.0):
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def test_heartbeats_refresh_and_stale_entries_expire():
+    clock = FakeClock()
+    registry = PresenceRegistry(ttl_s=45, clock=clock)
+    registry.heartbeat("d1", "alice", "Alice")
+    registry.heartbeat("d1", "bob", "Bob")
+    registry.heartbeat("d2", "alice", "Alice")
+    for _ in range(100):
+        clock.now += 10
+        registry.heartbeat("d1", "alice", "Alice A.")
+    # Repeated heartbeats reuse the entry's heap slot; bob and the d2 entry have expired.
+    assert len(registry._heap) == 1
+    assert [(p["user_id"], p["display_name"]) for p in registry.list("d1")] == [("alice", "Alice A.")]
+    assert registry.list("d2") == []
+    assert len(registry) == 1
+
+    clock.now += 46
+    assert registry.list("d1") == []
+    assert registry._docs == {}
+
+
+def test_snapshot_survives_restart(tmp_path):
+    clock = FakeClock()
+    path = tmp_path / "presence.json"
+    registry = PresenceRegistry(ttl_s=45, snapshot_path=path, snapshot_interval_s=0, clock=clock)
+    registry.heartbeat("d1", "alice", "Alice")
+    clock.now += 40
+    registry.heartbeat("d1", "bob", "Bob")
+    registry.close()
+
+    clock.now += 10
+    restored = PresenceRegistry(ttl_s=45, snapshot_path=path, snapshot_interval_s=0, clock=clock)
+    assert [p["user_id"] for p in restored.list("d1")] == ["bob"]
+    restored.close()
+
+
+def test_presence_api_uses_registry_and_drops_table(tmp_path):
+    registry = PresenceRegistry()
+    app.dependency_overrides[get_presence_registry] = lambda: registry
+    try:
+        client = TestClient(app)
+        body = {"doc_id": "d1", "user_id": "u1", "display_name": "User"}
+        beat = client.post("/api/presence/heartbeat", json=body)
+        assert beat.status_code == 200
+        assert beat.json()["id"] == "d1:u1"
+        assert [p["user_id"] for p in client.get("/api/presence/list", params={"doc_id": "d1"}).json()] == ["u1"]
+    finally:
+        app.dependency_overrides.clear()
+
+    store = DocStore(db_path=tmp_path / "t.sqlite3")
+    with store._pool.read() as conn:
+        assert conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'presence'").fetchone() is None
@@ -0,0 +1,100 @@
+import json
+
+from fastapi.testclient import TestClient
+
+from app.context.project import resolve_input
+from app.context.symbols import extract_symbols
+from app.main import app
+from app.persistence.store import DocStore
+from app.wiring import get_doc_store
+
+
+def _ws(files: dict[str, str]) -> str:
+    return json.dumps({"active": "main.tex", "entries": {p: {"type": "file", "content": c} for p, c in files.items()}})
+
+
+METHOD = (
+    "\\section{Method}\\label{sec:method}\n"
+    "Building on \\cref{sec:intro}, we follow \\cite{knuth84}.\n"
+    "\\subfile{fig}\n"
+)
+PROJECT = {
+    "main.tex": "\\documentclass{book}\n\\begin{document}\n\\input{chapters/intro}\n\\include{chapters/method}\n\\end{document}\n",
+    "chapters/intro.tex": "\\section{Intro}\\label{sec:intro}\nWe motivate the problem.\n",
+    "chapters/method.tex": METHOD,
+    "chapters/fig.tex": "\\begin{figure}\\label{fig:plot}\\end{figure}\n",
+    "refs.bib": "@book{knuth84,\n  title = {TAOCP}\n}\n",
+    "unused.tex": "\\section{Appendix}\n",
+}
+
+
+def test_inputs_are_file_symbols_resolved_like_latex():
+    found = [(s.kind, s.name, s.role) for s in extract_symbols(PROJECT["main.tex"], "main.tex")]
+    assert ("file", "chapters/intro", "use") in found
+    assert ("macro", "input", "use") not in found
+    paths = set(PROJECT)
+    assert resolve_input("chapters/intro", "main.tex", paths) == "chapters/intro.tex"
+    assert resolve_input("fig", "chapters/method.tex", paths) == "chapters/fig.tex"
+    assert resolve_input("refs.bib", "chapters/method.tex", paths) == "refs.bib"
+    assert resolve_input("missing", "main.tex", paths) is None
+
+
+def test_context_build_follows_the_project_graph(tmp_path):
+    store = DocStore(db_path=tmp_path / "t.sqlite3")
+    app.dependency_overrides[get_doc_store] = lambda: store
+    try:
+        client = TestClient(app)
+        doc_id = client.post("/api/doc", json={"title": "t", "content": _ws(PROJECT)}).json()["id"]
+        body = {
+            "docId": doc_id,
+            "activePath": "chapters/method.tex",
+            "cursorIndex": METHOD.index("we follow"),
+            "maxContextChars": 2000,
+            "maxContextTokens": 500,
+        }
+        res = client.post("/api/context/build", json=body)
+        assert res.status_code == 200
+        meta = res.json()["metadata"]
+        project = meta["project"]
+        assert meta["mode"] == "project"
+        assert meta["currentSection"] == "Method"
+        assert project["root"] == "main.tex"
+        assert project["includedFrom"] == ["main.tex"]
+        assert project["includes"] == ["chapters/fig.tex"]
+        assert [(d["path"], d["name"]) for d in project["definitions"]] == [
+            ("chapters/intro.tex", "sec:intro"),
+            ("refs.bib", "knuth84"),
+        ]
+        assert "unused.tex" not in project["linkedFiles"]
+
+        ctx = res.json()["context"]
+        assert "- chapters/fig.tex: Labels: fig:plot" in ctx
+        assert "Building on \\cref{sec:intro}" in ctx
+        assert "% chapters/intro.tex:1 (label sec:intro)\n\\section{Intro}\\label{sec:intro}" in ctx
+
+        small = client.post("/api/context/build", json={**body, "maxContextChars": 300, "maxContextTokens": 40})
+        assert len(small.json()["context"]) <= 300 and (len(small.json()["context"]) + 3) // 4 <= 40
+
+        # Saving one file updates the graph it is read from.
+        store.patch_files(doc_id, {"main.tex": {"type": "file", "content": "\\input{unused}\n\\input{chapters/method}"}}, [])
+        project = client.post("/api/context/build", json=body).json()["metadata"]["project"]
+        assert project["includedFrom"] == ["main.tex"]
+        assert client.post("/api/context/build", json={**body, "activePath": "unused.tex"}).json()["metadata"]["project"]["includes"] == []
+
+        assert client.post("/api/context/build", json={**body, "activePath": "nope.tex"}).status_code == 400
+        assert client.post("/api/context/build", json={**body, "docId": "missing"}).status_code == 404
+        assert client.post("/api/context/build", json={"docId": doc_id, "maxContextChars": 10}).status_code == 422
+
+        completion = client.post(
+            "/api/model/completion",
+            json={
+                "modelConfig": {"type": "local", "provider": "echo", "id": "echo"},
+                "docId": doc_id,
+                "activePath": "chapters/method.tex",
+                "prompt": "Continue.",
+            },
+        )
+        assert completion.status_code == 200
+        assert "Active File: chapters/method.tex" in completion.json()["text"]
+    finally:
+        app.dependency_overrides.clear()
@@ -0,0 +1,90 @@
+import sqlite3
+
+from app.persistence.local_models import LocalModelStore
+from app.persistence.migrations import Migration, migrate, schema_version
+from app.persistence.store import DocStore
+
+
+def _plan(store: DocStore, sql: str, params: tuple) -> str:
+    with store._pool.read() as conn:
+        return " | ".join(r["detail"] for r in conn.execute(f"EXPLAIN QUERY PLAN {sql}", params).fetchall())
+
+
+def test_fresh_database_records_versions_and_lists_by_index(tmp_path):
+    db_path = tmp_path / "t.sqlite3"
+    store = DocStore(db_path=db_path)
+    LocalModelStore(db_path=db_path)
+    with store._pool.read() as conn:
+        assert schema_version(conn, "docs") == 11
+        assert schema_version(conn, "local_models") == 1
+
+    for sql in (
+        "SELECT * FROM doc_comments WHERE doc_id = ? ORDER BY created_at ASC, rowid ASC",
+        "SELECT * FROM doc_logs WHERE doc_id = ? ORDER BY created_at DESC, rowid DESC",
+    ):
+        plan = _plan(store, sql, ("d1",))
+        assert "USING INDEX" in plan
+        assert "TEMP B-TREE" not in plan
+    assert "USING INDEX idx_doc_shares_doc" in _plan(store, "SELECT token FROM doc_shares WHERE doc_id = ?", ("d1",))
+    summaries = "SELECT rowid, id FROM docs WHERE (updated_at, rowid) < (?, ?) ORDER BY updated_at DESC, rowid DESC LIMIT 10"
+    assert "TEMP B-TREE" not in _plan(store, summaries, (0, 0))
+
+
+def test_legacy_database_is_upgraded_in_place(tmp_path):
+    db_path = tmp_path / "t.sqlite3"
+    conn = sqlite3.connect(db_path)
+    conn.executescript(
+        """
+        CREATE TABLE docs (id TEXT PRIMARY KEY, title TEXT, content TEXT NOT NULL, settings_json TEXT NOT NULL);
+        CREATE TABLE doc_revisions (id TEXT PRIMARY KEY, doc_id TEXT NOT NULL, content TEXT NOT NULL, created_at TEXT NOT NULL);
+        CREATE TABLE doc_comments (
+          id TEXT PRIMARY KEY, doc_id TEXT NOT NULL, body TEXT NOT NULL, path TEXT,
+          selection_start INTEGER, selection_end INTEGER, created_at TEXT NOT NULL
+        );
+        CREATE TABLE local_models (id TEXT PRIMARY KEY, runtime TEXT NOT NULL, model_path TEXT, settings_json TEXT NOT NULL);
+        INSERT INTO docs VALUES ('d1', 't', '{"entries":{"main.tex":{"type":"file","content":"hello world"}}}', '{}');
+        INSERT INTO doc_revisions VALUES ('r1', 'd1', 'hello', '2024-01-01T00:00:00+00:00');
+        INSERT INTO doc_comments VALUES ('c2', 'd1', 'second', NULL, NULL, NULL, '2024-01-02T00:00:00.500000+00:00');
+        INSERT INTO doc_comments VALUES ('c1', 'd1', 'first', NULL, NULL, NULL, '2024-01-01T00:00:00+00:00');
+        INSERT INTO local_models VALUES ('m1', 'llamacpp', 'model.gguf', '{}');
+        """
+    )
+    conn.commit()
+    conn.close()
+
+    store = DocStore(db_path=db_path)
+    models = LocalModelStore(db_path=db_path)
+    assert store.get("d1").content == '{"entries":{"main.tex":{"type":"file","content":"hello world"}}}'
+    assert [c["id"] for c in store.list_comments("d1")] == ["c1", "c2"]
+    assert store.list_comments("d1")[1]["created_at"] == "2024-01-02T00:00:00.500000+00:00"
+    rev = store.get_revision("d1", "r1")
+    assert rev["content"] == "hello"
+    assert rev["created_at"] == "2024-01-01T00:00:00+00:00"
+    assert [r["path"] for r in store.search("d1", "hello")] == ["main.tex"]
+    assert models.get("m1").file_name == "model.gguf"
+    with store._pool.read() as conn:
+        types = {r["name"]: r["type"] for r in conn.execute("PRAGMA table_info(doc_comments)").fetchall()}
+        assert types["created_at"] == "INTEGER"
+
+    # Reopening runs nothing further.
+    DocStore(db_path=db_path)
+    assert store.list_summaries()[0][0]["id"] == "d1"
+
+
+def test_failed_migration_rolls_back(tmp_path):
+    store = DocStore(db_path=tmp_path / "t.sqlite3")
+
+    def broken(conn):
+        conn.execute("CREATE TABLE scratch (x)")
+        raise RuntimeError("boom")
+
+    with store._pool.read() as conn:
+        current = schema_version(conn, "docs")
+    try:
+        with store._pool.write() as conn:
+            migrate(conn, "docs", [Migration(current + 1, "broken", broken)])
+    except RuntimeError:
+        pass
+    with store._pool.read() as conn:
+        assert schema_version(conn, "docs") == current
+        assert conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'scratch'").fetchone() is None
@@ -0,0 +1,208 @@
+import json
+import sqlite3
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.main import app
+from app.persistence.models import DocCreateRequest
+from app.persistence.engine import ShardedEngine
+from app.persistence.fts_query import compile_query
+from app.persistence.store import DocStore
+from app.wiring import get_doc_store
+
+
+def _ws(files: dict[str, str]) -> str:
+    return json.dumps({"active": None, "entries": {p: {"type": "file", "content": c} for p, c in files.items()}})
+
+
+def _fts_rows(store: DocStore, doc_id: str) -> list[tuple[str, str]]:
+    with store._pool.read() as conn:
+        rows = conn.execute("SELECT path, content FROM doc_files_fts WHERE doc_id = ? ORDER BY path", (doc_id,)).fetchall()
+    return [(r["path"], r["content"]) for r in rows]
+
+
+def test_save_reindexes_only_changed_files(tmp_path):
+    store = DocStore(db_path=tmp_path / "t.sqlite3")
+    files = {f"ch{i}.tex": f"chapter {i} text" for i in range(50)}
+    store.create(DocCreateRequest(id="d1", title="t", content=_ws(files)))
+
+    files["ch3.tex"] = "chapter three rewritten"
+    del files["ch7.tex"]
+    files["appendix.tex"] = "appendix body"
+    before = store.stats()["index"]
+    store.update("d1", "t", _ws(files), {})
+    after = store.stats()["index"]
+    # Removing ch7 moves every later file up one position, which does not touch the index.
+    assert tuple(after[k] - before[k] for k in ("reindexed", "skipped", "removed")) == (2, 48, 1)
+
+    assert _fts_rows(store, "d1") == sorted(files.items())
+    assert [r["path"] for r in store.search("d1", "rewritten")] == ["ch3.tex"]
+
+
+def test_index_reads_file_bodies_from_doc_files(tmp_path):
+    store = DocStore(db_path=tmp_path / "t.sqlite3")
+    content = json.dumps({"active": None, "entries": {
+        "figs": {"type": "folder"},
+        "a.tex": {"type": "file", "content": "alpha"},
+        "b.tex": {"type": "file", "content": "beta"},
+    }})
+    store.create(DocCreateRequest(id="d1", title="t", content=content))
+    store.patch_files("d1", {"a.tex": {"type": "file", "content": "gamma"}, "c.tex": {"type": "file", "content": "delta"}}, ["b.tex"])
+    store.patch_files("d1", {"c.tex": {"type": "folder"}}, [])
+    store.create(DocCreateRequest(id="d2", title="t", content=_ws({"x.tex": "beta"})))
+    store.update("d2", "t", "plain text, not a workspace", {})
+
+    with store._pool.write() as conn:
+        for table in ("doc_files_fts", "doc_files_trigram"):
+            # With rank = 1, FTS5 checks its index against the external content table.
+            conn.execute(f"INSERT INTO {table} ({table}, rank) VALUES ('integrity-check', 1)")
+            # External-content tables keep no copy of the text.
+            assert conn.execute("SELECT 1 FROM sqlite_master WHERE name = ?", (f"{table}_content",)).fetchone() is None
+    assert _fts_rows(store, "d1") == [("a.tex", "gamma")]
+    assert store.search(None, "beta") == []
+    assert [r["snippet"] for r in store.search("d1", "gamma")] == ["[gamma]"]
+
+
+def test_store_stats_endpoint_reports_index_counts(tmp_path):
+    store = DocStore(db_path=tmp_path / "t.sqlite3")
+    app.dependency_overrides[get_doc_store] = lambda: store
+    try:
+        client = TestClient(app)
+        doc_id = client.post("/api/doc", json={"title": "t", "content": _ws({"a.tex": "a", "b.tex": "b"})}).json()["id"]
+        client.put(f"/api/doc/{doc_id}", json={"title": "t", "content": _ws({"a.tex": "a", "b.tex": "bb"})})
+        index = client.get("/api/stats/store").json()["index"]
+        assert index["reindexed"] == 3
+        assert index["skipped"] == 1
+    finally:
+        app.dependency_overrides.clear()
+
+
+def test_fts_rows_without_hashes_are_rebuilt_on_open(tmp_path):
+    db_path = tmp_path / "t.sqlite3"
+    with sqlite3.connect(db_path) as conn:
+        conn.execute("CREATE TABLE docs (id TEXT PRIMARY KEY, title TEXT, content TEXT NOT NULL, settings_json TEXT NOT NULL)")
+        conn.execute("CREATE VIRTUAL TABLE doc_files_fts USING fts5(doc_id, path, content)")
+        conn.execute("INSERT INTO docs VALUES ('d1', 't', ?, '{}')", (_ws({"a.tex": "fresh"}),))
+        conn.execute("INSERT INTO doc_files_fts VALUES ('d1', 'a.tex', 'stale')")
+    conn.close()
+
+    store = DocStore(db_path=db_path)
+    assert _fts_rows(store, "d1") == [("a.tex", "fresh")]
+
+
+def test_search_ranks_pages_and_caps_the_count(tmp_path):
+    store = DocStore(db_path=tmp_path / "t.sqlite3")
+    files = {f"notes{i}.tex": "lemma " + "filler " * i for i in range(30)}
+    files["lemma.tex"] = "filler " * 40 + "lemma"
+    store.create(DocCreateRequest(id="d1", title="t", content=_ws(files)))
+
+    page = store.search_page("d1", "lemma", limit=5)
+    # A path match outweighs a short body; then shorter bodies rank first.
+    assert [r["path"] for r in page["results"]] == ["lemma.tex", "notes0.tex", "notes1.tex", "notes2.tex", "notes3.tex"]
+    assert all("[lemma]" in r["snippet"] for r in page["results"])
+    assert (page["total"], page["total_exact"]) == (31, True)
+    assert [r["path"] for r in store.search_page("d1", "lemma", limit=2, offset=29)["results"]] == ["notes28.tex", "notes29.tex"]
+    assert store.search_page("d1", "lemma", count_cap=10)["total"] == 10
+    assert store.search_page("d1", "lemma", count_cap=10)["total_exact"] is False
+
+    app.dependency_overrides[get_doc_store] = lambda: store
+    try:
+        client = TestClient(app)
+        body = client.get("/api/doc/d1/search", params={"q": "lemma", "limit": 20, "offset": 20}).json()
+        assert (len(body["results"]), body["total"], body["next_offset"]) == (11, 31, None)
+        body = client.get("/api/search", params={"q": "lemma", "limit": 20}).json()
+        assert (body["results"][0]["path"], body["next_offset"]) == ("lemma.tex", 20)
+    finally:
+        app.dependency_overrides.clear()
+
+
+def test_sharded_search_merges_by_rank(tmp_path):
+    store = DocStore(db_path=tmp_path / "t.sqlite3", engine=ShardedEngine(tmp_path, 3))
+    for i in range(12):
+        store.create(DocCreateRequest(id=f"doc-{i}", title="t", content=_ws({"main.tex": "proof " + "word " * i})))
+    everything = store.search_page(None, "proof", limit=12)["results"]
+    assert sorted(r["doc_id"] for r in everything) == sorted(f"doc-{i}" for i in range(12))
+    # Pages are slices of one merged ranking, whichever shards their hits come from.
+    page = store.search_page(None, "proof", limit=4, offset=2)
+    assert page["results"] == everything[2:6]
+    assert page["total"] == 12
+
+
+def test_latex_punctuation_routes_to_the_trigram_index(tmp_path):
+    store = DocStore(db_path=tmp_path / "t.sqlite3")
+    files = {
+        "intro.tex": "\\section{Intro}\\label{sec:intro} See eq:energy.",
+        "method.tex": "\\subsection{Setup}\\label{sec:method} as in \\cite{knuth84}",
+    }
+    store.create(DocCreateRequest(id="d1", title="t", content=_ws(files)))
+
+    def paths(query: str, **kwargs) -> list[str]:
+        return sorted(r["path"] for r in store.search_page("d1", query, **kwargs)["results"])
+
+    assert paths("\\label{sec:") == ["intro.tex", "method.tex"]
+    assert paths("\\subsec") == ["method.tex"]
+    assert paths("eq:") == ["intro.tex"]
+    assert paths("sec:intro") == ["intro.tex"]
+    # Short terms are checked against the text; long ones use the index.
+    assert paths("\\label{ {s") == ["intro.tex", "method.tex"]
+    assert paths("label{sec: in", mode="substring") == ["intro.tex", "method.tex"]
+    assert store.search_page("d1", "knuth")["index"] == "words"
+    assert paths("knu", mode="substring") == ["method.tex"]
+    page = store.search_page("d1", "sec:method")
+    assert page["index"] == "substring"
+    assert "[" in page["results"][0]["snippet"]
+    with pytest.raises(ValueError):
+        store.search_page("d1", "\\S", mode="substring")
+
+    store.patch_files("d1", {"intro.tex": {"type": "file", "content": "\\label{sec:background}"}}, ["method.tex"])
+    assert paths("sec:") == ["intro.tex"]
+    assert paths("sec:intro") == []
+
+
+def test_trigram_index_is_backfilled_on_upgrade(tmp_path):
+    db = tmp_path / "t.sqlite3"
+    store = DocStore(db_path=db)
+    store.create(DocCreateRequest(id="d1", title="t", content=_ws({"a.tex": "\\ref{fig:plot}"})))
+    with store._pool.write() as conn:
+        conn.execute("DROP TABLE doc_files_trigram")
+        conn.execute("UPDATE schema_versions SET version = 4 WHERE namespace = 'docs'")
+
+    reopened = DocStore(db_path=db)
+    assert [r["path"] for r in reopened.search("d1", "{fig:p")] == ["a.tex"]
+
+
+def test_compile_query_quotes_everything_and_expands_the_last_word():
+    assert compile_query("sec:intro") == '"sec intro"'
+    assert compile_query('foo AND "bar* baz" NOT -x') == '"foo" "AND" "bar baz" "NOT" "x"'
+    assert compile_query("intr", prefix=True) == '"intr" *'
+    assert compile_query("intro ", prefix=True) == '"intro"'
+    assert compile_query('"a b"', prefix=True) == '"a b"'
+    assert compile_query('"a b', prefix=True) == '"a b" *'
+    assert compile_query(":-\\") is None
+
+
+def test_word_search_is_safe_prefixable_and_cached(tmp_path):
+    store = DocStore(db_path=tmp_path / "t.sqlite3")
+    store.create(DocCreateRequest(id="d1", title="t", content=_ws({"a.tex": "see section: introduction"})))
+
+    # Punctuation that used to be FTS5 syntax errors.
+    for query in ['section:', '"intro', "NOT", "a-b", "(x", "*"]:
+        store.search_page("d1", query, mode="words")
+    assert [r["path"] for r in store.search_page("d1", "intro", mode="words", prefix=True)["results"]] == ["a.tex"]
+    assert store.search_page("d1", "intro ", mode="words", prefix=True)["results"] == []
+
+    before = store.stats()["search_cache"]
+    store.search_page("d1", "introduction")
+    store.search_page("d1", "introduction  ")
+    store.search_page(None, "introduction")
+    store.search_page(None, "introduction")
+    after = store.stats()["search_cache"]
+    assert (after["hits"] - before["hits"], after["misses"] - before["misses"]) == (2, 2)
+
+    # A reindex changes the generation, so the cached results are not reused.
+    store.update("d1", "t", _ws({"a.tex": "conclusion"}), {})
+    assert store.search_page("d1", "introduction")["results"] == []
+    assert store.search_page(None, "introduction")["results"] == []
+    store.create(DocCreateRequest(id="d2", title="t", content=_ws({"b.tex": "conclusion"})))
+    assert store.search_page(None, "conclusion")["total"] == 2
@@ -0,0 +1,94 @@
+import json
+
+import pytest
+
+from app.persistence.engine import ShardedEngine, StorageEngine
+from app.persistence.models import DocCreateRequest
+from app.persistence.store import DocStore
+
+
+def _workspace(text: str) -> str:
+    return json.dumps({"entries": {"main.tex": {"type": "file", "content": text}}})
+
+
+def test_sharded_store_routes_documents_and_fans_out(tmp_path):
+    engine = ShardedEngine(tmp_path, 4)
+    store = DocStore(db_path=tmp_path / "verta.sqlite3", engine=engine)
+    ids = [f"doc-{i}" for i in range(20)]
+    for i, doc_id in enumerate(ids):
+        store.create(DocCreateRequest(id=doc_id, title="t", content=_workspace(f"needle{i % 2} body")))
+    assert len({engine.shard_index(doc_id) for doc_id in ids}) > 1
+
+    for doc_id in ids:
+        with engine.pool_for(doc_id).read() as conn:
+            assert conn.execute("SELECT 1 FROM docs WHERE id = ?", (doc_id,)).fetchone()
+        with engine.global_pool.read() as conn:
+            assert conn.execute("SELECT 1 FROM docs WHERE id = ?", (doc_id,)).fetchone() is None
+
+    store.update("doc-3", title="t", content=_workspace("changed"), settings={})
+    assert json.loads(store.get("doc-3").content)["entries"]["main.tex"]["content"] == "changed"
+    assert len(store.list_revisions("doc-3")) == 1
+    assert sorted(d.id for d in store.list()) == sorted(ids)
+    assert sorted(hit["doc_id"] for hit in store.search(None, "needle0")) == sorted(ids[0::2])
+    assert [hit["doc_id"] for hit in store.search("doc-5", "needle1")] == ["doc-5"]
+
+    seen, cursor = [], None
+    while True:
+        items, cursor = store.list_summaries(limit=3, cursor=cursor)
+        seen.extend(item["id"] for item in items)
+        if cursor is None:
+            break
+    assert len(seen) == len(ids)
+    assert seen[0] == "doc-3"
+    assert sorted(seen) == sorted(ids)
+    with pytest.raises(ValueError):
+        store.list_summaries(cursor="0:9:0")
+
+
+def test_global_records_resolve_across_shards(tmp_path):
+    store = DocStore(db_path=tmp_path / "verta.sqlite3", engine=ShardedEngine(tmp_path, 3))
+    store.create(DocCreateRequest(id="d1", title="t", content="x"))
+    token = store.create_share("d1")
+    assert store.get_share(token)["doc_id"] == "d1"
+    user = store.create_user("alice", "pw")
+    session = store.create_session(user["id"])
+    assert store.get_user_by_token(session)["username"] == "alice"
+
+
+def test_shard_count_cannot_change(tmp_path):
+    ShardedEngine(tmp_path, 2)
+    with pytest.raises(ValueError):
+        ShardedEngine(tmp_path, 4)
+
+
+def test_sharding_refuses_a_populated_single_file_database(tmp_path):
+    store = DocStore(db_path=tmp_path / "verta.sqlite3")
+    for i in range(5):
+        store.create(DocCreateRequest(id=f"d{i}", title="t", content="x"))
+    with pytest.raises(ValueError, match="already holds documents"):
+        ShardedEngine(tmp_path, 4)
+    # The documents are still there for the single-file layout.
+    assert len(DocStore(db_path=tmp_path / "verta.sqlite3").list()) == 5
+
+
+def test_single_file_refuses_a_sharded_database(tmp_path):
+    store = DocStore(db_path=tmp_path / "verta.sqlite3", engine=ShardedEngine(tmp_path, 2))
+    store.create(DocCreateRequest(id="d1", title="t", content="x"))
+    with pytest.raises(ValueError, match="2 shard"):
+        DocStore(db_path=tmp_path / "verta.sqlite3")
+
+
+def test_empty_single_file_database_can_become_sharded(tmp_path):
+    DocStore(db_path=tmp_path / "verta.sqlite3")
+    store = DocStore(db_path=tmp_path / "verta.sqlite3", engine=ShardedEngine(tmp_path, 3))
+    store.create(DocCreateRequest(id="d1", title="t", content="x"))
+    assert store.get("d1").content == "x"
+
+
+def test_engine_missing_a_member_fails_when_created():
+    class Partial(StorageEngine):
+        def shards(self):
+            return []
+
+    with pytest.raises(TypeError):
+        Partial()
@@ -0,0 +1,113 @@
+import json
+
+from fastapi.testclient import TestClient
+
+from app.context.symbols import extract_symbols
+from app.main import app
+from app.persistence.models import DocCreateRequest
+from app.persistence.store import DocStore
+from app.wiring import get_doc_store
+
+
+def _ws(files: dict[str, str]) -> str:
+    return json.dumps({"active": "main.tex", "entries": {p: {"type": "file", "content": c} for p, c in files.items()}})
+
+
+MAIN = (
+    "\\newcommand{\\R}{\\mathbb{R}}\n"
+    "\\section*{Intro \\emph{here}}\\label{sec:intro}\n"
+    "See \\cref{sec:intro,eq:one} and \\cite[p.~2]{knuth84, missing}.\n"
+    "% \\label{commented}\n"
+    "$x \\in \\R$ \\ref{nowhere}\n"
+)
+BIB = "@book{knuth84,\n  title = {TAOCP}\n}\n@string{acm = {ACM}}\n"
+
+
+def test_extract_symbols_records_kind_role_span_and_line():
+    symbols = extract_symbols(MAIN, "main.tex")
+    found = {(s.kind, s.name, s.role, s.line) for s in symbols}
+    assert {
+        ("macro", "R", "def", 1),
+        ("section", "Intro \\emph{here}", "def", 2),
+        ("label", "sec:intro", "def", 2),
+        ("label", "sec:intro", "use", 3),
+        ("label", "eq:one", "use", 3),
+        ("cite", "knuth84", "use", 3),
+        ("cite", "missing", "use", 3),
+        ("macro", "R", "use", 5),
+        ("label", "nowhere", "use", 5),
+    } <= found
+    assert ("label", "commented", "def", 4) not in found
+    # Only the project's own macros are recorded as used, not built-ins like \emph or \in.
+    assert {s.name for s in symbols if s.kind == "macro" and s.role == "use"} == {"R"}
+    assert all(MAIN[s.start:s.end] == s.name for s in symbols if s.kind != "section")
+    assert [(s.kind, s.name, s.role) for s in extract_symbols(BIB, "refs.bib")] == [("cite", "knuth84", "def")]
+
+
+def test_symbols_follow_saves_file_by_file(tmp_path):
+    store = DocStore(db_path=tmp_path / "t.sqlite3")
+    store.create(DocCreateRequest(id="d1", title="t", content=_ws({"main.tex": MAIN, "refs.bib": BIB})))
+    undefined = {(r["kind"], r["name"]) for r in store.undefined_references("d1")}
+    assert undefined == {("label", "eq:one"), ("cite", "missing"), ("label", "nowhere")}
+
+    store.patch_files("d1", {"eq.tex": {"type": "file", "content": "\\begin{equation}\\label{eq:one}\\end{equation}"}}, [])
+    assert [r["path"] for r in store.find_symbols("d1", "label", "eq:one", "def")] == ["eq.tex"]
+    store.update("d1", "t", _ws({"main.tex": MAIN, "eq.tex": ""}), {})
+    # refs.bib is gone, so knuth84 is now undefined too; eq.tex no longer defines eq:one.
+    undefined = {(r["kind"], r["name"]) for r in store.undefined_references("d1")}
+    assert undefined == {("label", "eq:one"), ("cite", "knuth84"), ("cite", "missing"), ("label", "nowhere")}
+    assert store.find_symbols("missing") is None
+
+
+def test_macro_uses_follow_definitions_in_other_files(tmp_path):
+    store = DocStore(db_path=tmp_path / "t.sqlite3")
+    chapter = "Let $\\vec{x} \\in \\R^n$.\n"
+    store.create(DocCreateRequest(id="d1", title="t", content=_ws({"main.tex": "\\input{ch}\n", "ch.tex": chapter})))
+    assert store.find_symbols("d1", "macro", role="use") == []
+
+    store.patch_files("d1", {"preamble.tex": {"type": "file", "content": "\\newcommand{\\R}{\\mathbb{R}}\n"}}, [])
+    assert [(r["path"], r["name"]) for r in store.find_symbols("d1", "macro", role="use")] == [("ch.tex", "R")]
+
+    store.patch_files("d1", {}, ["preamble.tex"])
+    assert store.find_symbols("d1", "macro", role="use") == []
+
+
+def test_symbol_index_is_backfilled_on_upgrade(tmp_path):
+    db = tmp_path / "t.sqlite3"
+    store = DocStore(db_path=db)
+    store.create(DocCreateRequest(id="d1", title="t", content=_ws({"main.tex": MAIN})))
+    with store._pool.write() as conn:
+        conn.execute("DROP TABLE doc_symbols")
+        conn.execute("UPDATE schema_versions SET version = 7 WHERE namespace = 'docs'")
+
+    reopened = DocStore(db_path=db)
+    assert [r["line"] for r in reopened.find_symbols("d1", "label", "sec:intro", "def")] == [2]
+
+
+def test_definition_references_and_undefined_endpoints(tmp_path):
+    store = DocStore(db_path=tmp_path / "t.sqlite3")
+    app.dependency_overrides[get_doc_store] = lambda: store
+    try:
+        client = TestClient(app)
+        doc_id = client.post("/api/doc", json={"title": "t", "content": _ws({"main.tex": MAIN, "refs.bib": BIB})}).json()["id"]
+        use = MAIN.index("sec:intro,") + 3
+
+        res = client.get(f"/api/doc/{doc_id}/symbols/definition", params={"path": "main.tex", "offset": use}).json()
+        assert res["symbol"]["name"] == "sec:intro"
+        assert [(d["path"], d["line"]) for d in res["results"]] == [("main.tex", 2)]
+
+        res = client.get(f"/api/doc/{doc_id}/symbols/references", params={"kind": "macro", "name": "R"}).json()
+        assert [r["line"] for r in res["results"]] == [5]
+        res = client.get(f"/api/doc/{doc_id}/symbols/definition", params={"kind": "cite", "name": "knuth84"}).json()
+        assert [r["path"] for r in res["results"]] == ["refs.bib"]
+        assert client.get(f"/api/doc/{doc_id}/symbols/definition", params={"path": "main.tex", "offset": 0}).json()["results"] == []
+
+        undefined = client.get(f"/api/doc/{doc_id}/symbols/undefined").json()
+        assert [u["name"] for u in undefined] == ["eq:one", "missing", "nowhere"]
+        labels = client.get(f"/api/doc/{doc_id}/symbols", params={"kind": "label", "role": "def"}).json()
+        assert [s["name"] for s in labels] == ["sec:intro"]
+
+        assert client.get(f"/api/doc/{doc_id}/symbols/definition").status_code == 400
+        assert client.get("/api/doc/missing/symbols/undefined").status_code == 404
+    finally:
+        app.dependency_overrides.clear()
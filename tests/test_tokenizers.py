@@ -0,0 +1,73 @@
+import pytest
+from fastapi.testclient import TestClient
+
+from app.context.extract import fit_to_tokens
+from app.main import app
+from app.modeling.models import ModelConfig
+from app.modeling.tokenizers import HEURISTIC, TokenizerRegistry
+from app.wiring import get_tokenizer_registry
+
+
+class WordTokenizer:
+    name = "words"
+
+    def __init__(self):
+        self.calls = 0
+
+    def count(self, text: str) -> int:
+        self.calls += 1
+        return len(text.split())
+
+
+def test_fit_finds_longest_prefix_in_log_n_counts():
+    text = " ".join(f"w{i}" for i in range(5000))
+    tokenizer = WordTokenizer()
+    fitted = fit_to_tokens(text, 1234, tokenizer)
+    assert tokenizer.count(fitted) == 1234
+    assert tokenizer.count(text[: len(fitted) + 2]) == 1235
+    assert tokenizer.calls <= len(text).bit_length() + 3
+    assert fit_to_tokens("short", 10, tokenizer) == "short"
+    assert fit_to_tokens("x" * 41, 10) == "x" * 40
+
+
+def test_registry_loads_vocab_files_by_model_id(tmp_path):
+    tokenizers = pytest.importorskip("tokenizers")
+    vocab = {"[UNK]": 0, "alpha": 1, "beta": 2}
+    tok = tokenizers.Tokenizer(tokenizers.models.WordLevel(vocab, unk_token="[UNK]"))
+    tok.pre_tokenizer = tokenizers.pre_tokenizers.Whitespace()
+    tok.save(str(tmp_path / "tiny.json"))
+
+    registry = TokenizerRegistry(tmp_path)
+    tiny = registry.get(ModelConfig(type="local", id="tiny"))
+    assert tiny.name == "hf:tiny.json"
+    assert tiny.count("alpha beta gamma") == 3
+    assert registry.get(ModelConfig(type="local", id="tiny")) is tiny
+    assert registry.get(ModelConfig(type="api", id="other", settings={"tokenizer": "tiny"})) is tiny
+    assert registry.get(ModelConfig(type="api", id="gpt-4.1-mini")) is HEURISTIC
+    assert registry.get(ModelConfig(type="api", id="x", settings={"tokenizer": "../tiny"})) is HEURISTIC
+    assert registry.get(None) is HEURISTIC
+
+
+def test_context_build_fits_the_selected_models_tokenizer():
+    registry = TokenizerRegistry()
+    registry.register("wordy", WordTokenizer())
+    app.dependency_overrides[get_tokenizer_registry] = lambda: registry
+    try:
+        client = TestClient(app)
+        src = "\\section{Intro}\n" + "word " * 2000
+        body = {
+            "sourceLatex": src,
+            "cursorIndex": 100,
+            "maxContextChars": 8000,
+            "maxContextTokens": 300,
+            "modelConfig": {"type": "local", "provider": "echo", "id": "wordy"},
+        }
+        data = client.post("/api/context/build", json=body).json()
+        assert data["metadata"]["tokenizer"] == "words"
+        assert len(data["context"].split()) == 300
+        del body["modelConfig"]
+        data = client.post("/api/context/build", json=body).json()
+        assert data["metadata"]["tokenizer"] == "heuristic"
+        assert HEURISTIC.count(data["context"]) == 300
+    finally:
+        app.dependency_overrides.clear()
@@ -0,0 +1,108 @@
+import json
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.main import app
+from app.persistence.models import DocCreateRequest
+from app.persistence.store import DocStore
+from app.retrieval.chunking import chunk_text
+from app.retrieval.embedders import HashingEmbedder
+from app.retrieval.index import VectorIndex
+from app.wiring import get_doc_store, get_vector_index
+
+np = pytest.importorskip("numpy")
+
+
+def _ws(files: dict[str, str]) -> str:
+    return json.dumps({"active": None, "entries": {p: {"type": "file", "content": c} for p, c in files.items()}})
+
+
+def _index(tmp_path, store: DocStore, embedder=None) -> VectorIndex:
+    return VectorIndex(store, tmp_path / "t.sqlite3", tmp_path / "vectors.f32", embedder or HashingEmbedder(dim=256))
+
+
+PAPER = {
+    "intro.tex": "\\section{Introduction}\nWe study how gradient descent converges on convex losses.\n\n"
+    "Our motivation comes from training neural networks.\n",
+    "method.tex": "\\section{Method}\nThe sampler draws Markov chain proposals from a Gaussian kernel.\n\n"
+    "Acceptance follows the Metropolis rule.\n",
+    "refs.tex": "\\section{Acknowledgements}\nWe thank the reviewers and our funding agency.\n",
+}
+
+
+def test_chunks_follow_sections_and_paragraphs():
+    text = "Preamble line.\n\n\\section{A}\nFirst para.\n\nSecond para.\n\\subsection{B}\n" + "word " * 60
+    chunks = chunk_text(text, max_chars=100)
+    assert all(c.text == text[c.start:c.end] for c in chunks)
+    assert chunks[0].text == "Preamble line."
+    # Paragraphs of one section are packed together; a heading always starts a chunk.
+    assert chunks[1].text == "\\section{A}\nFirst para.\n\nSecond para."
+    assert chunks[2].text.startswith("\\subsection{B}")
+    assert all(len(c.text) <= 100 for c in chunks)
+    assert chunk_text("  \n\n  ") == []
+
+
+def test_hashing_embedder_is_deterministic_and_unit_length():
+    embedder = HashingEmbedder(dim=128)
+    a, b, c = embedder.embed(["the chain converges", "convergence of the chain", "funding agency"])
+    assert np.allclose(embedder.embed(["the chain converges"])[0], a)
+    assert np.isclose(np.linalg.norm(a), 1.0)
+    assert float(a @ b) > float(a @ c)
+
+
+class CountingEmbedder(HashingEmbedder):
+    def __init__(self):
+        super().__init__(dim=256)
+        self.texts: list[str] = []
+
+    def embed(self, texts):
+        self.texts += texts
+        return super().embed(texts)
+
+
+def test_search_finds_passages_and_reembeds_only_changed_chunks(tmp_path):
+    store = DocStore(db_path=tmp_path / "t.sqlite3")
+    store.create(DocCreateRequest(id="d1", title="t", content=_ws(PAPER)))
+    embedder = CountingEmbedder()
+    index = _index(tmp_path, store, embedder)
+
+    hits = index.search("d1", "Metropolis acceptance of Markov chain proposals", k=2)
+    assert hits[0]["path"] == "method.tex"
+    assert hits[0]["score"] >= hits[1]["score"]
+    assert hits[0]["text"] == PAPER["method.tex"][hits[0]["start"]:hits[0]["end"]]
+    first = index.embedded
+
+    files = dict(PAPER)
+    files["intro.tex"] = "A new opening paragraph.\n\n" + files["intro.tex"]
+    del files["refs.tex"]
+    store.update("d1", "t", _ws(files), {})
+    hits = index.search("d1", "gradient descent on convex losses", k=1)
+    # Only the new paragraph is embedded; the moved one keeps its vector with new offsets.
+    assert index.embedded - first == 1
+    assert hits[0]["path"] == "intro.tex"
+    assert hits[0]["text"] == files["intro.tex"][hits[0]["start"]:hits[0]["end"]]
+    assert all(h["path"] != "refs.tex" for h in index.search("d1", "reviewers funding", k=10))
+
+    # Reopening reuses the stored vectors.
+    reopened = _index(tmp_path, store, CountingEmbedder())
+    assert reopened.search("d1", "Gaussian kernel", k=1)[0]["path"] == "method.tex"
+    assert reopened.embedded == 0
+    assert reopened.search("missing", "anything") is None
+
+
+def test_semantic_search_endpoint(tmp_path):
+    store = DocStore(db_path=tmp_path / "t.sqlite3")
+    index = _index(tmp_path, store)
+    app.dependency_overrides[get_doc_store] = lambda: store
+    app.dependency_overrides[get_vector_index] = lambda: index
+    try:
+        client = TestClient(app)
+        doc_id = client.post("/api/doc", json={"title": "t", "content": _ws(PAPER)}).json()["id"]
+        res = client.get(f"/api/doc/{doc_id}/semantic", params={"q": "Markov chain sampler", "k": 1}).json()
+        assert [h["path"] for h in res["results"]] == ["method.tex"]
+        assert res["embedder"] == "hashing-256"
+        assert client.get(f"/api/doc/{doc_id}/semantic").json()["results"] == []
+        assert client.get("/api/doc/missing/semantic", params={"q": "x"}).status_code == 404
+    finally:
+        app.dependency_overrides.clear()